@@ -0,0 +1,286 @@
+import asyncio
+import math
+import os
+import time
+from collections import OrderedDict
+from typing import List, Optional, Tuple
+from starlette.responses import JSONResponse
+from starlette.routing import compile_path
+from .cache import REDIS_URL
+
+# RATE_LIMIT_BACKEND is "memory" (per process), "redis" (shared by all
+# instances), "fakeredis" (the redis store on an in-process fake, for local
+# runs; needs the fakeredis package) or "none".
+RATE_LIMIT_BACKEND = os.getenv("RATE_LIMIT_BACKEND", "memory")
+RATE_LIMIT_REDIS_URL = os.getenv("RATE_LIMIT_REDIS_URL", REDIS_URL)
+# Requests per second each client may send across all routes, and the burst it may send at once
+RATE_LIMIT_RATE = float(os.getenv("RATE_LIMIT_RATE", "50"))
+RATE_LIMIT_BURST = float(os.getenv("RATE_LIMIT_BURST", "100"))
+# Tighter budgets per client on expensive routes, comma separated
+# "METHOD /route/template/=rate:burst" entries
+RATE_LIMIT_ROUTES = os.getenv("RATE_LIMIT_ROUTES", "GET /api/products/search/=10:20,POST /api/products/import/=0.2:2")
+# Clients are told apart by their address unless this header is set. Behind
+# a proxy or load balancer every request comes from its address, so all
+# clients share one bucket until this is set to the header it forwards the
+# client address in, e.g. X-Forwarded-For.
+RATE_LIMIT_CLIENT_HEADER = os.getenv("RATE_LIMIT_CLIENT_HEADER", "")
+# Proxies in front of the service that append to RATE_LIMIT_CLIENT_HEADER. The
+# client is the entry that many hops from the right: entries further left are
+# sent by the client itself and could be changed on every request.
+RATE_LIMIT_TRUSTED_PROXIES = int(os.getenv("RATE_LIMIT_TRUSTED_PROXIES", "1"))
+RATE_LIMIT_EXEMPT_PATHS = [path for path in os.getenv("RATE_LIMIT_EXEMPT_PATHS", "/metrics,/api/diagnostics/").split(",") if path]
+# Buckets kept by the memory store, the least recently used are dropped beyond
+MAX_TRACKED_CLIENTS = int(os.getenv("MAX_TRACKED_CLIENTS", "100000"))
+# Requests handled at once by this process, 0 disables the limiter
+ADMISSION_MAX_CONCURRENCY = int(os.getenv("ADMISSION_MAX_CONCURRENCY", "64"))
+# Seconds a request may wait for a slot before it is shed with a 503
+ADMISSION_QUEUE_BUDGET = float(os.getenv("ADMISSION_QUEUE_BUDGET", "0.5"))
+# Long polls and event streams would hold their slot for their whole duration
+ADMISSION_EXEMPT_PATHS = [path for path in os.getenv("ADMISSION_EXEMPT_PATHS", "/metrics,/api/diagnostics/,/api/changes/").split(",") if path]
+
+class RateLimitStore:
+    """Token buckets keyed by client, in the GCRA form: a bucket is the time it will be full again."""
+    name = "base"
+
+    async def acquire(self, key: str, rate: float, burst: float) -> float:
+        """Take a token from the bucket of key: 0 when one was available, else the seconds until there is one."""
+        raise NotImplementedError
+
+def take_token(full_at: Optional[float], now: float, rate: float, burst: float) -> Tuple[Optional[float], float]:
+    """New full_at of the bucket and 0, or None and the seconds to wait when it is empty."""
+    interval = 1 / rate
+    full_at = max(full_at or now, now) + interval
+    excess = full_at - now - burst * interval
+    if excess > 0:
+        return None, excess
+    return full_at, 0.0
+
+class NullRateLimitStore(RateLimitStore):
+    name = "none"
+
+    async def acquire(self, key: str, rate: float, burst: float) -> float:
+        return 0.0
+
+class MemoryRateLimitStore(RateLimitStore):
+    """Buckets of this process. A dropped bucket comes back full, which only errs in the client's favour."""
+    name = "memory"
+
+    def __init__(self, max_size: int = MAX_TRACKED_CLIENTS):
+        self.max_size = max_size
+        self.buckets = OrderedDict()
+
+    async def acquire(self, key: str, rate: float, burst: float) -> float:
+        full_at, retry_after = take_token(self.buckets.get(key), time.monotonic(), rate, burst)
+        if full_at is not None:
+            self.buckets[key] = full_at
+            self.buckets.move_to_end(key)
+            if len(self.buckets) > self.max_size:
+                self.buckets.popitem(last=False)
+        return retry_after
+
+# take_token on the server, atomic and timed by the Redis clock shared by all
+# instances. Numbers are returned as strings, Lua numbers would be truncated.
+TAKE_TOKEN_SCRIPT = """
+local time = redis.call('TIME')
+local now = tonumber(time[1]) + tonumber(time[2]) / 1000000
+local interval = 1 / tonumber(ARGV[1])
+local full_at = math.max(tonumber(redis.call('GET', KEYS[1])) or now, now) + interval
+local excess = full_at - now - tonumber(ARGV[2]) * interval
+if excess > 0 then
+    return tostring(excess)
+end
+redis.call('SET', KEYS[1], tostring(full_at), 'PX', math.ceil((full_at - now) * 1000))
+return '0'
+"""
+
+class RedisRateLimitStore(RateLimitStore):
+    """Buckets on any client exposing the redis.asyncio register_script API, expiring once full again."""
+    name = "redis"
+
+    def __init__(self, client, prefix: str = "product-service:rate:"):
+        self.client = client
+        self.prefix = prefix
+        # Sent once, then run by its SHA
+        self.take_token = client.register_script(TAKE_TOKEN_SCRIPT)
+
+    async def acquire(self, key: str, rate: float, burst: float) -> float:
+        return float(await self.take_token(keys=[self.prefix + key], args=[rate, burst]))
+
+def rate_limit_store_from_env() -> RateLimitStore:
+    if RATE_LIMIT_BACKEND == "none":
+        return NullRateLimitStore()
+    if RATE_LIMIT_BACKEND == "memory":
+        return MemoryRateLimitStore()
+    if RATE_LIMIT_BACKEND == "redis":
+        try:
+            import redis.asyncio as redis
+        except ImportError:
+            raise RuntimeError("RATE_LIMIT_BACKEND=redis requires the 'redis' package")
+        return RedisRateLimitStore(redis.Redis.from_url(RATE_LIMIT_REDIS_URL))
+    if RATE_LIMIT_BACKEND == "fakeredis":
+        try:
+            from fakeredis import FakeAsyncRedis
+        except ImportError:
+            raise RuntimeError("RATE_LIMIT_BACKEND=fakeredis requires the 'fakeredis[lua]' package")
+        return RedisRateLimitStore(FakeAsyncRedis())
+    raise RuntimeError(f"Unknown RATE_LIMIT_BACKEND '{RATE_LIMIT_BACKEND}'")
+
+class RouteLimit:
+    def __init__(self, method: str, template: str, rate: float, burst: float):
+        self.method = method
+        self.template = template
+        self.pattern = compile_path(template)[0]
+        self.rate = rate
+        self.burst = burst
+
+    def matches(self, method: str, path: str) -> bool:
+        return method == self.method and self.pattern.match(path) is not None
+
+def parse_route_limits(value: str) -> List[RouteLimit]:
+    limits = []
+    for entry in filter(None, (entry.strip() for entry in value.split(","))):
+        try:
+            route, budget = entry.rsplit("=", 1)
+            method, template = route.split()
+            rate, burst = budget.split(":")
+            limits.append(RouteLimit(method.upper(), template, float(rate), float(burst)))
+        except ValueError:
+            raise RuntimeError(f"Invalid RATE_LIMIT_ROUTES entry '{entry}', expected 'METHOD /path/=rate:burst'")
+    return limits
+
+class ConcurrencyLimiter:
+    """Bounds the requests in progress, shedding those that would wait longer than the queue budget."""
+
+    def __init__(self, max_concurrency: int = ADMISSION_MAX_CONCURRENCY, queue_budget: float = ADMISSION_QUEUE_BUDGET):
+        self.max_concurrency = max_concurrency
+        self.queue_budget = queue_budget
+        self._slots = asyncio.Semaphore(max_concurrency) if max_concurrency else None
+        self.in_flight = 0
+        self.queued = 0
+        self.shed = 0
+
+    async def acquire(self) -> bool:
+        if self._slots is None:
+            return True
+        if self._slots.locked():
+            self.queued += 1
+            try:
+                await asyncio.wait_for(self._slots.acquire(), timeout=self.queue_budget)
+            except asyncio.TimeoutError:
+                self.shed += 1
+                return False
+            finally:
+                self.queued -= 1
+        else:
+            # Free slot, skip the timer
+            await self._slots.acquire()
+        self.in_flight += 1
+        return True
+
+    def release(self):
+        if self._slots is not None:
+            self.in_flight -= 1
+            self._slots.release()
+
+class Admission:
+    """Rate limits per client and per route, then the concurrency limit, in front of every request."""
+
+    def __init__(
+        self,
+        store: Optional[RateLimitStore] = None,
+        limiter: Optional[ConcurrencyLimiter] = None,
+        route_limits: Optional[List[RouteLimit]] = None,
+        rate: float = RATE_LIMIT_RATE,
+        burst: float = RATE_LIMIT_BURST,
+    ):
+        self.store = store or rate_limit_store_from_env()
+        self.limiter = limiter or ConcurrencyLimiter()
+        self.route_limits = parse_route_limits(RATE_LIMIT_ROUTES) if route_limits is None else route_limits
+        self.rate = rate
+        self.burst = burst
+        self.admitted = 0
+        self.limited_client = 0
+        self.limited_route = 0
+        self.store_errors = 0
+
+    async def retry_after(self, client: str, method: str, path: str) -> float:
+        """0 when the client has budget left for the request, else the seconds it should wait."""
+        try:
+            retry_after = await self.store.acquire(f"client:{client}", self.rate, self.burst)
+            if retry_after:
+                self.limited_client += 1
+                return retry_after
+            for limit in self.route_limits:
+                if limit.matches(method, path):
+                    retry_after = await self.store.acquire(f"route:{method} {limit.template}:{client}", limit.rate, limit.burst)
+                    if retry_after:
+                        self.limited_route += 1
+                        return retry_after
+                    break
+        except Exception as error:
+            # A store outage must not take the catalog down with it, admit the request
+            self.store_errors += 1
+            print(f"Rate limit store '{self.store.name}' failed: {error}")
+        return 0.0
+
+    def stats(self) -> dict:
+        return {
+            "backend": self.store.name,
+            "admitted": self.admitted,
+            "limited_client": self.limited_client,
+            "limited_route": self.limited_route,
+            "store_errors": self.store_errors,
+            "max_concurrency": self.limiter.max_concurrency,
+            "in_flight": self.limiter.in_flight,
+            "queued": self.limiter.queued,
+            "shed": self.limiter.shed,
+        }
+
+admission = Admission()
+
+def _client_key(scope) -> str:
+    if RATE_LIMIT_CLIENT_HEADER:
+        header = RATE_LIMIT_CLIENT_HEADER.lower().encode("latin-1")
+        # Repeated headers form one list, in order
+        entries = [
+            entry.strip()
+            for key, value in scope["headers"] if key == header
+            for entry in value.decode("latin-1").split(",") if entry.strip()
+        ]
+        if entries:
+            return entries[-min(max(RATE_LIMIT_TRUSTED_PROXIES, 1), len(entries))]
+    client = scope.get("client")
+    return client[0] if client else "unknown"
+
+class AdmissionMiddleware:
+    """Pure ASGI middleware answering 429 to clients over their rate and 503 when the service is saturated."""
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            return await self.app(scope, receive, send)
+        path = scope["path"]
+        if not path.startswith(tuple(RATE_LIMIT_EXEMPT_PATHS)):
+            retry_after = await admission.retry_after(_client_key(scope), scope["method"], path)
+            if retry_after:
+                response = JSONResponse(
+                    {"detail": "Rate limit exceeded"}, status_code=429,
+                    headers={"Retry-After": str(math.ceil(retry_after))},
+                )
+                return await response(scope, receive, send)
+        if path.startswith(tuple(ADMISSION_EXEMPT_PATHS)):
+            admission.admitted += 1
+            return await self.app(scope, receive, send)
+        if not await admission.limiter.acquire():
+            response = JSONResponse(
+                {"detail": "The service is overloaded, retry shortly"}, status_code=503,
+                headers={"Retry-After": str(max(1, math.ceil(admission.limiter.queue_budget)))},
+            )
+            return await response(scope, receive, send)
+        admission.admitted += 1
+        try:
+            await self.app(scope, receive, send)
+        finally:
+            admission.limiter.release()
@@ -0,0 +1,152 @@
+import asyncio
+import os
+import time
+from collections import OrderedDict
+from typing import Dict, Optional
+import httpx
+import jwt
+from fastapi import Header, HTTPException, Request
+from .exceptions import UnauthorizedException
+
+# Catalog writes require a bearer token issued by User-Service, verified with
+# AUTH_JWKS_URL (User-Service's /.well-known/jwks.json) or AUTH_PUBLIC_KEY
+# (a PEM public key or the path of one, for tests and local runs).
+# Tokens are verified locally, User-Service is only asked for its key set.
+AUTH_JWKS_URL = os.getenv("AUTH_JWKS_URL")
+AUTH_PUBLIC_KEY = os.getenv("AUTH_PUBLIC_KEY")
+# With neither set catalog writes are refused, unless AUTH_DISABLED=1 opts
+# out of authentication altogether (tests and local runs only)
+AUTH_DISABLED = os.getenv("AUTH_DISABLED", "false").lower() in ("1", "true")
+AUTH_ISSUER = os.getenv("AUTH_ISSUER", "user-service")
+AUTH_AUDIENCE = os.getenv("AUTH_AUDIENCE", "e-commerce")
+AUTH_ALGORITHMS = ["RS256"]
+# Seconds of clock skew tolerated on exp/iat
+AUTH_LEEWAY = float(os.getenv("AUTH_LEEWAY", "30"))
+# Role a token must carry in its "roles" claim to write. Self-registered
+# User-Service accounts are customers, so any valid token is not enough;
+# the role is granted with `python -m User-Service.manage set-role`.
+AUTH_WRITE_ROLE = os.getenv("AUTH_WRITE_ROLE") or "catalog_admin"
+AUTH_TOKEN_CACHE_SIZE = int(os.getenv("AUTH_TOKEN_CACHE_SIZE", "10000"))
+JWKS_CACHE_TTL = float(os.getenv("JWKS_CACHE_TTL", "300"))
+# Tokens with an unknown kid refetch the key set at most this often
+JWKS_MIN_REFRESH_INTERVAL = float(os.getenv("JWKS_MIN_REFRESH_INTERVAL", "30"))
+
+class TokenVerifier:
+    """Verifies RS256 access tokens against a key set, caching the claims of verified tokens.
+
+    Signature checks cost tens of microseconds, so verified tokens are kept in
+    an LRU keyed on the token until they expire; a repeated token costs a dict
+    lookup. Entries remember their key ID: tokens signed by a key that left the
+    key set are verified again, and fail.
+    """
+
+    def __init__(self, keys: Optional[Dict[str, object]] = None, jwks_url: Optional[str] = None, cache_size: int = AUTH_TOKEN_CACHE_SIZE):
+        self.keys = keys or {}
+        self.jwks_url = jwks_url
+        self.cache_size = cache_size
+        self._tokens: OrderedDict = OrderedDict()
+        self._keys_fetched_at = 0.0
+        self._refresh_lock = asyncio.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    async def verify(self, token: str) -> dict:
+        entry = self._tokens.get(token)
+        if entry is not None:
+            claims, expires_at, kid = entry
+            if time.time() < expires_at + AUTH_LEEWAY and kid in self.keys:
+                self._tokens.move_to_end(token)
+                self.hits += 1
+                return claims
+            del self._tokens[token]
+        self.misses += 1
+        claims, kid = await self._decode(token)
+        self._tokens[token] = (claims, claims["exp"], kid)
+        if len(self._tokens) > self.cache_size:
+            self._tokens.popitem(last=False)
+        return claims
+
+    async def _decode(self, token: str):
+        try:
+            header = jwt.get_unverified_header(token)
+        except jwt.InvalidTokenError:
+            raise UnauthorizedException("Malformed access token")
+        kid = header.get("kid")
+        if self.jwks_url is not None and (kid not in self.keys or self._keys_expired()):
+            await self.refresh_keys(force=kid not in self.keys)
+        if kid not in self.keys and self.jwks_url is None and len(self.keys) == 1:
+            # A single configured key verifies tokens whatever their kid
+            kid = next(iter(self.keys))
+        key = self.keys.get(kid)
+        if key is None:
+            raise UnauthorizedException("Access token signed by an unknown key")
+        try:
+            claims = jwt.decode(
+                token, key, algorithms=AUTH_ALGORITHMS, audience=AUTH_AUDIENCE, issuer=AUTH_ISSUER,
+                leeway=AUTH_LEEWAY, options={"require": ["exp", "sub"]},
+            )
+        except jwt.InvalidTokenError as error:
+            raise UnauthorizedException(f"Invalid access token: {error}")
+        return claims, kid
+
+    def _keys_expired(self) -> bool:
+        return time.monotonic() - self._keys_fetched_at >= JWKS_CACHE_TTL
+
+    async def refresh_keys(self, force: bool = False):
+        """Fetch the key set once per TTL, or sooner for an unknown key ID but at most every JWKS_MIN_REFRESH_INTERVAL."""
+        async with self._refresh_lock:
+            age = time.monotonic() - self._keys_fetched_at
+            # Another request may have refreshed while this one waited for the lock
+            if age < (JWKS_MIN_REFRESH_INTERVAL if force else JWKS_CACHE_TTL):
+                return
+            try:
+                async with httpx.AsyncClient(timeout=5) as client:
+                    response = await client.get(self.jwks_url)
+                    response.raise_for_status()
+                self.keys = keys_from_jwks(response.json())
+            except (httpx.HTTPError, ValueError, jwt.PyJWKError) as error:
+                # Keep verifying with the keys we have, User-Service may be briefly down
+                print(f"Could not refresh the JWKS from {self.jwks_url}: {error}")
+            self._keys_fetched_at = time.monotonic()
+
+def keys_from_jwks(jwks: dict) -> Dict[str, object]:
+    return {
+        jwk["kid"]: jwt.PyJWK(jwk).key
+        for jwk in jwks.get("keys", [])
+        if jwk.get("use", "sig") == "sig" and jwk.get("alg", AUTH_ALGORITHMS[0]) in AUTH_ALGORITHMS
+    }
+
+def load_public_key(value: str):
+    """A PEM public key, or the path of a file holding one."""
+    from cryptography.hazmat.primitives.serialization import load_pem_public_key
+    if not value.lstrip().startswith("-----BEGIN"):
+        with open(value, "rb") as file:
+            value = file.read().decode()
+    return load_pem_public_key(value.encode())
+
+def verifier_from_env() -> Optional[TokenVerifier]:
+    if AUTH_JWKS_URL:
+        return TokenVerifier(jwks_url=AUTH_JWKS_URL)
+    if AUTH_PUBLIC_KEY:
+        return TokenVerifier(keys={"local": load_public_key(AUTH_PUBLIC_KEY)})
+    return None
+
+token_verifier = verifier_from_env()
+
+async def require_writer(request: Request, authorization: Optional[str] = Header(None)) -> Optional[dict]:
+    """Dependency of catalog writes: the claims of the bearer token, None when auth is disabled."""
+    if token_verifier is None:
+        if AUTH_DISABLED:
+            return None
+        raise HTTPException(status_code=503, detail="Catalog writes are unavailable, no token verification key is configured")
+    scheme, _, token = (authorization or "").partition(" ")
+    if scheme.lower() != "bearer" or not token:
+        raise HTTPException(status_code=401, detail="Missing bearer token", headers={"WWW-Authenticate": "Bearer"})
+    try:
+        claims = await token_verifier.verify(token.strip())
+    except UnauthorizedException as error:
+        raise HTTPException(status_code=401, detail=str(error), headers={"WWW-Authenticate": 'Bearer error="invalid_token"'})
+    if AUTH_WRITE_ROLE not in claims.get("roles", ()):
+        raise HTTPException(status_code=403, detail=f"The '{AUTH_WRITE_ROLE}' role is required")
+    request.state.claims = claims
+    return claims
@@ -0,0 +1,23 @@
+"""Benchmark harness for Product-Service.
+
+Run from the repository root, against a scratch database:
+
+    python -m Product-Service.benchmarks run --products 10000 --output before.json
+    python -m Product-Service.benchmarks compare before.json after.json
+    python -m Product-Service.benchmarks search --products 1000000 --output search.json
+
+Without --database-url the run uses a temporary SQLite file. The schema is
+created with create_all and filled by catalog.generate_catalog, so never
+point it at a database holding real data.
+
+The "coalescing" section of the report reads a single product with the cache
+off at rising concurrency, with and without single-flight, and records the
+queries run in each case. The "latency" section reads products next to a
+stream of slow queries, run on the AsyncSession and, as the handlers did
+before the async engine, on a sync Session blocking the event loop. The "pool"
+section reads products through a small connection pool at rising
+concurrency and reports checkout waits and timeouts from /api/diagnostics/pool/.
+
+The search command fills a catalog without images, a million products by
+default, and times text queries, filters and facets on it.
+"""
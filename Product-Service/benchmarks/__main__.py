@@ -0,0 +1,175 @@
+import argparse
+import asyncio
+import importlib
+import json
+import os
+import platform
+import subprocess
+import sys
+import tempfile
+from datetime import datetime, timezone
+from .stats import compare
+
+def _git_commit():
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+def _configure(args):
+    """Point the service at the scratch database, returns the temporary SQLite file to remove or None."""
+    scratch = None
+    if args.database_url:
+        os.environ["DATABASE_URL"] = args.database_url
+    else:
+        scratch = tempfile.NamedTemporaryFile(prefix="product-benchmark-", suffix=".db", delete=False)
+        scratch.close()
+        scratch = scratch.name
+        os.environ["DATABASE_URL"] = f"sqlite:///{scratch}"
+    if not args.admission:
+        # Every request comes from one client, rate limits would throttle the harness itself
+        os.environ["RATE_LIMIT_BACKEND"] = "none"
+        os.environ["ADMISSION_MAX_CONCURRENCY"] = "0"
+    # The write scenarios send no token, token verification has its own micro benchmark
+    os.environ["AUTH_DISABLED"] = "1"
+    return scratch
+
+def _import_db():
+    # The engines are created from DATABASE_URL at import time
+    package = __package__.rsplit(".", 1)[0]
+    db = importlib.import_module(f"{package}.db")
+    importlib.import_module(f"{package}.models")
+    return db
+
+def _meta(db, catalog: dict, args) -> dict:
+    return {
+        "commit": _git_commit(),
+        "started_at": datetime.now(tz=timezone.utc).isoformat(),
+        "python": platform.python_version(),
+        "dialect": db.engine.dialect.name,
+        "catalog": catalog,
+        "requests": args.requests,
+        "concurrency": args.concurrency,
+    }
+
+def run(args) -> dict:
+    scratch = _configure(args)
+    db = _import_db()
+    from .catalog import catalog_ids, generate_catalog
+    from .latency import run_latency
+    from .pool import run_pool_saturation
+    from .micro import run_micro
+    from .scenarios import SCENARIOS, run_coalescing, run_scenarios
+
+    names = args.scenarios.split(",") if args.scenarios else list(SCENARIOS)
+    unknown = set(names).difference(SCENARIOS)
+    if unknown:
+        sys.exit(f"Unknown scenario(s) {', '.join(sorted(unknown))}, expected any of {', '.join(SCENARIOS)}")
+
+    db.Base.metadata.drop_all(db.engine)
+    db.Base.metadata.create_all(db.engine)
+    catalog = generate_catalog(db.engine, categories=args.categories, products=args.products)
+    ids = catalog_ids(db.engine)
+
+    async def measure():
+        micro = await run_micro(ids, args.micro_iterations) if args.micro_iterations else {}
+        scenarios = await run_scenarios(ids, names, args.requests, args.concurrency)
+        coalescing = await run_coalescing(ids, args.requests, args.coalescing_levels) if args.coalescing_levels else {}
+        latency = await run_latency(ids, args.requests, args.latency_levels) if args.latency_levels else {}
+        pool = await run_pool_saturation(
+            ids, args.requests, args.pool_levels, pool_size=args.pool_size, max_overflow=args.pool_max_overflow, pool_timeout=args.pool_timeout,
+        ) if args.pool_levels else {}
+        await db.async_engine.dispose()
+        return micro, scenarios, coalescing, latency, pool
+
+    micro, scenarios, coalescing, latency, pool = asyncio.run(measure())
+    db.engine.dispose()
+    if scratch:
+        os.unlink(scratch)
+    return {
+        "meta": _meta(db, catalog, args),
+        "micro": micro,
+        "scenarios": scenarios,
+        "coalescing": coalescing,
+        "latency": latency,
+        "pool": pool,
+    }
+
+def run_search_benchmark(args) -> dict:
+    """Search scenarios on a catalog without images, a million products by default."""
+    scratch = _configure(args)
+    db = _import_db()
+    from .catalog import catalog_ids, generate_catalog
+    from .search import SEARCH_SCENARIOS, run_search
+
+    db.Base.metadata.drop_all(db.engine)
+    db.Base.metadata.create_all(db.engine)
+    catalog = generate_catalog(db.engine, categories=args.categories, products=args.products, max_images=0)
+    ids = catalog_ids(db.engine)
+
+    async def measure():
+        results = await run_search(ids, list(SEARCH_SCENARIOS), args.requests, args.concurrency)
+        await db.async_engine.dispose()
+        return results
+
+    scenarios = asyncio.run(measure())
+    db.engine.dispose()
+    if scratch:
+        os.unlink(scratch)
+    return {"meta": _meta(db, catalog, args), "scenarios": scenarios}
+
+def main():
+    parser = argparse.ArgumentParser(prog="python -m Product-Service.benchmarks", description="Product-Service benchmarks")
+    commands = parser.add_subparsers(dest="command", required=True)
+    run_parser = commands.add_parser("run", help="Generate a catalog and run the benchmarks against it")
+    run_parser.add_argument("--database-url", help="Scratch database, its tables are dropped and recreated (default: temporary SQLite file)")
+    run_parser.add_argument("--categories", type=int, default=50)
+    run_parser.add_argument("--products", type=int, default=10000)
+    run_parser.add_argument("--requests", type=int, default=1000, help="Requests per scenario")
+    run_parser.add_argument("--concurrency", type=int, default=16)
+    run_parser.add_argument("--scenarios", help="Comma separated scenario names (default: all)")
+    run_parser.add_argument("--admission", action="store_true", help="Keep the rate limits and concurrency limit of the environment")
+    run_parser.add_argument("--micro-iterations", type=int, default=200, help="0 skips the micro-benchmarks")
+    run_parser.add_argument(
+        "--coalescing-levels", type=lambda value: [int(level) for level in value.split(",") if level], default=[1, 8, 32, 128],
+        help="Concurrency levels of the hot product sweep, empty skips it",
+    )
+    run_parser.add_argument(
+        "--latency-levels", type=lambda value: [int(level) for level in value.split(",") if level], default=[1, 8, 32],
+        help="Concurrency levels of the reads next to slow queries, async against blocking, empty skips it",
+    )
+    run_parser.add_argument(
+        "--pool-levels", type=lambda value: [int(level) for level in value.split(",") if level], default=[4, 8, 32, 128],
+        help="Concurrency levels of the reads on a small connection pool, empty skips it",
+    )
+    run_parser.add_argument("--pool-size", type=int, default=4, help="Pool size of the saturation sweep")
+    run_parser.add_argument("--pool-max-overflow", type=int, default=4, help="Overflow of the saturation sweep")
+    run_parser.add_argument("--pool-timeout", type=float, default=1.0, help="Checkout timeout of the saturation sweep, in seconds")
+    run_parser.add_argument("--output", help="Write the JSON report here instead of stdout")
+    search_parser = commands.add_parser("search", help="Generate a large catalog and run the search scenarios against it")
+    search_parser.add_argument("--database-url", help="Scratch database, its tables are dropped and recreated (default: temporary SQLite file)")
+    search_parser.add_argument("--categories", type=int, default=200)
+    search_parser.add_argument("--products", type=int, default=1_000_000)
+    search_parser.add_argument("--requests", type=int, default=500, help="Requests per scenario")
+    search_parser.add_argument("--concurrency", type=int, default=16)
+    search_parser.add_argument("--admission", action="store_true", help="Keep the rate limits and concurrency limit of the environment")
+    search_parser.add_argument("--output", help="Write the JSON report here instead of stdout")
+    compare_parser = commands.add_parser("compare", help="Compare two JSON reports")
+    compare_parser.add_argument("before")
+    compare_parser.add_argument("after")
+    args = parser.parse_args()
+
+    if args.command == "compare":
+        with open(args.before) as before, open(args.after) as after:
+            print("\n".join(compare(json.load(before), json.load(after))))
+        return
+    report = json.dumps(run(args) if args.command == "run" else run_search_benchmark(args), indent=2)
+    if args.output:
+        with open(args.output, "w") as output:
+            output.write(report + "\n")
+    else:
+        print(report)
+
+# Guarded: the image pool spawns workers that import the main module
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,83 @@
+import random
+from sqlalchemy import insert, select, text
+from ..models import Category, Product, ProductImage, utc_now
+
+# Rows per executemany batch while generating
+INSERT_BATCH_SIZE = 5000
+
+def generate_catalog(engine, categories: int = 50, products: int = 10000, max_images: int = 5, seed: int = 42) -> dict:
+    """Fill an empty schema with a synthetic category tree, products and images.
+
+    A fifth of the categories are roots, the others hang below a random earlier
+    category. Paths and subtree product counts are set as the services maintain them.
+    """
+    rng = random.Random(seed)
+    now = utc_now()
+    with engine.begin() as connection:
+        paths = {}
+        category_rows = []
+        for category_id in range(1, categories + 1):
+            parent_id = None if category_id <= max(1, categories // 5) else rng.randint(1, category_id - 1)
+            paths[category_id] = f"{paths[parent_id] if parent_id else '/'}{category_id}/"
+            category_rows.append({
+                "category_id": category_id,
+                "category_title": f"Category {category_id}",
+                "parent_id": parent_id,
+                "path": paths[category_id],
+                "product_count": 0,
+                "created_at": now,
+                "updated_at": now,
+                "version": 1,
+            })
+        counts = dict.fromkeys(paths, 0)
+        product_rows = []
+        for product_id in range(1, products + 1):
+            category_id = rng.randint(1, categories)
+            for ancestor_id in paths[category_id].strip("/").split("/"):
+                counts[int(ancestor_id)] += 1
+            product_rows.append({
+                "product_id": product_id,
+                "product_title": f"{rng.choice(ADJECTIVES)} {rng.choice(NOUNS)} {product_id}",
+                "product_description": " ".join(rng.choices(WORDS, k=12)),
+                "category_id": category_id,
+                "price": round(rng.uniform(1, 500), 2),
+                "quantity": rng.randint(0, 100),
+                "created_at": now,
+                "updated_at": now,
+                "version": 1,
+            })
+        for row in category_rows:
+            row["product_count"] = counts[row["category_id"]]
+        connection.execute(insert(Category), category_rows)
+        image_count = 0
+        for start in range(0, len(product_rows), INSERT_BATCH_SIZE):
+            batch = product_rows[start:start + INSERT_BATCH_SIZE]
+            connection.execute(insert(Product), batch)
+            images = [
+                {"product_id": row["product_id"], "image_url": f"https://cdn.example.com/{row['product_id']}/{index}.jpg"}
+                for row in batch
+                for index in range(rng.randint(0, max_images))
+            ]
+            if images:
+                connection.execute(insert(ProductImage), images)
+            image_count += len(images)
+        if connection.dialect.name == "postgresql":
+            # Rows were inserted with explicit IDs, move the sequences past them
+            for table, column in (("categories", "category_id"), ("products", "product_id")):
+                connection.execute(text(f"SELECT setval(pg_get_serial_sequence('{table}', '{column}'), (SELECT MAX({column}) FROM {table}))"))
+    return {"categories": categories, "products": products, "images": image_count}
+
+def catalog_ids(engine) -> dict:
+    with engine.connect() as connection:
+        return {
+            "product_ids": connection.execute(select(Product.product_id)).scalars().all(),
+            "category_titles": connection.execute(select(Category.category_title)).scalars().all(),
+        }
+
+ADJECTIVES = ["Compact", "Wireless", "Premium", "Classic", "Portable", "Smart", "Ergonomic", "Vintage", "Eco", "Pro"]
+NOUNS = ["Headphones", "Keyboard", "Lamp", "Backpack", "Camera", "Chair", "Speaker", "Watch", "Kettle", "Monitor"]
+WORDS = [
+    "durable", "lightweight", "stainless", "steel", "cotton", "battery", "bluetooth", "waterproof", "adjustable",
+    "rechargeable", "wooden", "leather", "ceramic", "digital", "foldable", "travel", "office", "kitchen", "outdoor",
+    "gaming", "studio", "minimal", "warranty", "energy", "efficient", "quiet", "fast", "charging", "handmade",
+]
@@ -0,0 +1,69 @@
+"""Tail latency of reads while slow queries run, on the AsyncSession and on a blocking sync Session."""
+import asyncio
+from typing import List
+import httpx
+from sqlalchemy import text
+from .. import services
+from ..cache import NullCache
+from ..db import AsyncSessionLocal, SessionLocal
+from ..main import app
+from .scenarios import Scenario, run_scenario
+
+# Rows counted by the slow query, about 70ms on SQLite
+SLOW_QUERY_ROWS = 200000
+SLOW_QUERY = text(
+    "WITH RECURSIVE counter(n) AS (SELECT 1 UNION ALL SELECT n + 1 FROM counter WHERE n < :rows) "
+    "SELECT count(*) FROM counter"
+)
+# Seconds between two slow queries of the stream
+SLOW_QUERY_PAUSE = 0.1
+
+async def _slow_async():
+    async with AsyncSessionLocal() as db:
+        await db.execute(SLOW_QUERY, {"rows": SLOW_QUERY_ROWS})
+
+async def _slow_blocking():
+    # What every handler did before the async engine: a sync Session called
+    # from the event loop, which stalls all other requests meanwhile
+    with SessionLocal() as db:
+        db.execute(SLOW_QUERY, {"rows": SLOW_QUERY_ROWS})
+
+async def run_latency(ids: dict, requests: int, levels: List[int]) -> dict:
+    """p99 of uncached product reads at each concurrency level next to a steady stream of slow queries.
+
+    "async" runs the slow queries on the AsyncSession like the handlers do,
+    "blocking" on the sync Session in the event loop. Reads only wait for
+    the slow queries in the second case.
+    """
+    product_ids = ids["product_ids"]
+    read = Scenario("read", lambda index: ("GET", f"/api/product/{product_ids[index % len(product_ids)]}/", None))
+    original_cache = services.cache
+    results = {}
+    transport = httpx.ASGITransport(app=app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://benchmark") as client:
+        services.cache = NullCache()
+        try:
+            for concurrency in levels:
+                level = {}
+                for mode, slow in (("async", _slow_async), ("blocking", _slow_blocking)):
+                    done = asyncio.Event()
+                    slow_queries = 0
+
+                    async def slow_stream():
+                        nonlocal slow_queries
+                        while not done.is_set():
+                            await slow()
+                            slow_queries += 1
+                            await asyncio.sleep(SLOW_QUERY_PAUSE)
+
+                    stream = asyncio.ensure_future(slow_stream())
+                    try:
+                        level[mode] = await run_scenario(client, read, requests, concurrency)
+                    finally:
+                        done.set()
+                        await stream
+                    level[mode]["slow_queries"] = slow_queries
+                results[str(concurrency)] = level
+        finally:
+            services.cache = original_cache
+    return results
@@ -0,0 +1,73 @@
+"""Micro-benchmarks of service functions, called directly on a session without the HTTP stack."""
+import random
+import time
+from typing import Awaitable, Callable, Dict, List
+import jwt
+from cryptography.hazmat.primitives.asymmetric import rsa
+from pydantic import TypeAdapter
+from ..auth import AUTH_AUDIENCE, AUTH_ISSUER, TokenVerifier
+from ..db import AsyncSessionLocal
+from ..schemas import Product as ProductSchema
+from ..serializers import product_list_adapter
+from ..services import retrieve_product_rows, retrieve_products, retrieve_products_by_ids, search_products
+from .stats import latency_summary
+
+# The response_model path: ORM objects validated from attributes, then dumped
+product_schema_list_adapter = TypeAdapter(List[ProductSchema])
+
+async def _time(call: Callable[[], Awaitable[object]], iterations: int) -> dict:
+    # One untimed call warms up statement compilation caches
+    await call()
+    latencies = []
+    for _ in range(iterations):
+        started_at = time.perf_counter()
+        await call()
+        latencies.append(time.perf_counter() - started_at)
+    return {"iterations": iterations, "latency_ms": latency_summary(latencies)}
+
+async def run_micro(ids: dict, iterations: int, seed: int = 42) -> Dict[str, dict]:
+    rng = random.Random(seed)
+    product_ids = ids["product_ids"]
+
+    async def list_orm():
+        async with AsyncSessionLocal() as db:
+            products = await retrieve_products(db, limit=50)
+            return product_schema_list_adapter.dump_json(product_schema_list_adapter.validate_python(products, from_attributes=True))
+
+    async def list_rows():
+        async with AsyncSessionLocal() as db:
+            return product_list_adapter.dump_json(await retrieve_product_rows(db, limit=50))
+
+    async def by_ids():
+        async with AsyncSessionLocal() as db:
+            return await retrieve_products_by_ids(rng.sample(product_ids, min(100, len(product_ids))), db)
+
+    async def search():
+        async with AsyncSessionLocal() as db:
+            return await search_products(db, text=rng.choice(["wireless", "lamp", "steel"]), limit=20)
+
+    # Tokens signed with a throwaway key pair, as User-Service would sign them
+    private_key = rsa.generate_private_key(public_exponent=65537, key_size=2048)
+    now = int(time.time())
+    token = jwt.encode(
+        {"iss": AUTH_ISSUER, "aud": AUTH_AUDIENCE, "sub": "1", "iat": now, "exp": now + 3600},
+        private_key, algorithm="RS256", headers={"kid": "benchmark"},
+    )
+    cached_verifier = TokenVerifier(keys={"benchmark": private_key.public_key()})
+    uncached_verifier = TokenVerifier(keys={"benchmark": private_key.public_key()}, cache_size=0)
+
+    async def verify_cached():
+        return await cached_verifier.verify(token)
+
+    async def verify_uncached():
+        return await uncached_verifier.verify(token)
+
+    calls = {
+        "list_orm_serialize": list_orm,
+        "list_rows_serialize": list_rows,
+        "retrieve_products_by_ids": by_ids,
+        "search_products": search,
+        "verify_token_cached": verify_cached,
+        "verify_token_uncached": verify_uncached,
+    }
+    return {name: await _time(call, iterations) for name, call in calls.items()}
@@ -0,0 +1,73 @@
+"""Connection pool saturation: more concurrent requests than connections, read back from /api/diagnostics/pool/."""
+from typing import List
+import httpx
+from sqlalchemy import event
+from sqlalchemy.ext.asyncio import create_async_engine
+from .. import db, services
+from ..cache import NullCache
+from ..main import app
+from .scenarios import Scenario, run_scenario
+
+async def run_pool_saturation(
+    ids: dict,
+    requests: int,
+    levels: List[int],
+    pool_size: int = 4,
+    max_overflow: int = 4,
+    pool_timeout: float = 1.0,
+) -> dict:
+    """Uncached product reads on a deliberately small pool, at each concurrency level.
+
+    Past pool_size + max_overflow concurrent requests, checkouts queue: the
+    report shows how long they waited and how many gave up after pool_timeout
+    (those requests fail with a 500 and count as errors).
+    """
+    product_ids = ids["product_ids"]
+    read = Scenario("read", lambda index: ("GET", f"/api/product/{product_ids[index % len(product_ids)]}/", None))
+    original_cache, original_engine = services.cache, db.async_engine
+    results = {}
+    transport = httpx.ASGITransport(app=app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://benchmark") as client:
+        services.cache = NullCache()
+        try:
+            for concurrency in levels:
+                # A fresh pool and fresh wait statistics per level
+                engine = create_async_engine(
+                    db.ASYNC_DATABASE_URL, poolclass=db.InstrumentedAsyncQueuePool,
+                    pool_size=pool_size, max_overflow=max_overflow, pool_timeout=pool_timeout,
+                )
+                db.async_engine = engine
+                db.AsyncSessionLocal.configure(bind=engine)
+                db.pool_wait_stats.__init__()
+                checked_out = {"now": 0, "peak": 0}
+
+                def on_checkout(*args):
+                    checked_out["now"] += 1
+                    checked_out["peak"] = max(checked_out["peak"], checked_out["now"])
+
+                def on_checkin(*args):
+                    checked_out["now"] -= 1
+
+                event.listen(engine.sync_engine.pool, "checkout", on_checkout)
+                event.listen(engine.sync_engine.pool, "checkin", on_checkin)
+                try:
+                    result = await run_scenario(client, read, requests, concurrency)
+                    status = (await client.get("/api/diagnostics/pool/")).json()
+                finally:
+                    await engine.dispose()
+                result["pool"] = {
+                    "size": pool_size,
+                    "max_overflow": max_overflow,
+                    "timeout_s": pool_timeout,
+                    "peak_checked_out": checked_out["peak"],
+                    "checkouts": status["waits"],
+                    "wait_ms_mean": round(status["wait_seconds_total"] / status["waits"] * 1000, 3) if status["waits"] else 0.0,
+                    "wait_ms_max": round(status["max_wait_seconds"] * 1000, 3),
+                    "timeouts": status["timeouts"],
+                }
+                results[str(concurrency)] = result
+        finally:
+            services.cache, db.async_engine = original_cache, original_engine
+            db.AsyncSessionLocal.configure(bind=original_engine)
+            db.pool_wait_stats.__init__()
+    return results
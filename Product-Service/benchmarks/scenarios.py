@@ -0,0 +1,236 @@
+"""In-process load scenarios: requests go through the ASGI app with httpx, no server or network involved."""
+import asyncio
+import random
+import time
+from typing import Awaitable, Callable, Dict, List, Optional, Tuple
+import httpx
+from .. import services
+from ..cache import NullCache
+from ..main import app
+from ..metrics import metrics
+from ..pagination import encode_cursor
+from ..singleflight import flights
+from .stats import latency_summary
+
+Request = Tuple[str, str, Optional[dict]]
+
+class Scenario:
+    """A named request pattern, `request(i)` returns the method, URL and JSON body of the i-th request.
+
+    `setup` and `teardown` run around the timed requests, `check` may add
+    fields to the result (e.g. consistency checks after concurrent writes).
+    Statuses listed in `expected` are not counted as errors.
+    """
+
+    def __init__(
+        self,
+        name: str,
+        request: Callable[[int], Request],
+        setup: Optional[Callable[[httpx.AsyncClient], Awaitable[None]]] = None,
+        teardown: Optional[Callable[[], None]] = None,
+        check: Optional[Callable[[httpx.AsyncClient, dict], Awaitable[None]]] = None,
+        on_response: Optional[Callable[[httpx.Response], None]] = None,
+        expected: Tuple[int, ...] = (),
+    ):
+        self.name = name
+        self.request = request
+        self.setup = setup
+        self.teardown = teardown
+        self.check = check
+        self.on_response = on_response
+        self.expected = expected
+
+async def run_scenario(client: httpx.AsyncClient, scenario: Scenario, requests: int, concurrency: int) -> dict:
+    if scenario.setup is not None:
+        await scenario.setup(client)
+    latencies: List[float] = []
+    statuses: Dict[int, int] = {}
+    errors = 0
+    indexes = iter(range(requests))
+    statements_before = metrics.statements_per_request.sum
+    observed_before = metrics.statements_per_request.count
+
+    async def worker():
+        nonlocal errors
+        # Workers share one iterator, so each index is requested exactly once
+        for index in indexes:
+            method, url, body = scenario.request(index)
+            started_at = time.perf_counter()
+            response = await client.request(method, url, json=body)
+            latencies.append(time.perf_counter() - started_at)
+            statuses[response.status_code] = statuses.get(response.status_code, 0) + 1
+            if response.status_code >= 400 and response.status_code not in scenario.expected:
+                errors += 1
+            if scenario.on_response is not None:
+                scenario.on_response(response)
+
+    try:
+        started_at = time.perf_counter()
+        await asyncio.gather(*(worker() for _ in range(concurrency)))
+        elapsed = time.perf_counter() - started_at
+    finally:
+        if scenario.teardown is not None:
+            scenario.teardown()
+    observed = metrics.statements_per_request.count - observed_before
+    statements = metrics.statements_per_request.sum - statements_before
+    result = {
+        "requests": requests,
+        "concurrency": concurrency,
+        "errors": errors,
+        "statuses": {str(status): count for status, count in sorted(statuses.items())},
+        "throughput_rps": round(requests / elapsed, 1),
+        "latency_ms": latency_summary(latencies),
+        "queries": int(statements),
+        "queries_per_request": round(statements / observed, 2) if observed else None,
+    }
+    if scenario.check is not None:
+        await scenario.check(client, result)
+    return result
+
+def build_scenarios(ids: dict, seed: int = 42) -> Dict[str, Scenario]:
+    rng = random.Random(seed)
+    product_ids = ids["product_ids"]
+    category_titles = ids["category_titles"]
+    deep_offset = max(len(product_ids) - 20, 0)
+    deep_cursor = encode_cursor(product_ids[deep_offset - 1] if deep_offset else 0)
+    terms = ["wireless", "lamp", "steel", "camera", "quiet"]
+
+    def create(index: int) -> Request:
+        return "POST", "/api/product/create/", {
+            "product_title": f"Benchmark product {index}",
+            "product_description": "Created by the benchmark harness",
+            "price": 19.99,
+            "quantity": 10,
+            "category_title": rng.choice(category_titles),
+            "images": [{"image_url": f"https://cdn.example.com/new/{index}/{n}.jpg"} for n in range(index % 6)],
+        }
+
+    def update(index: int) -> Request:
+        return "PATCH", f"/api/product/{rng.choice(product_ids)}/", {
+            "product_title": f"Updated product {index}",
+            "product_description": "Updated by the benchmark harness",
+            "price": 24.99,
+            "quantity": 20,
+        }
+
+    def bulk_update(index: int) -> Request:
+        # A repricing batch: new prices for some products, unchanged stock for others
+        sample = rng.sample(product_ids, min(500, len(product_ids)))
+        return "PATCH", "/api/products/bulk/", {
+            str(product_id): {"price": round(rng.uniform(1, 500), 2)} if position % 2 else {"quantity": 20}
+            for position, product_id in enumerate(sample)
+        }
+
+    # Odd requests delete an image added by an earlier even one
+    added_images: List[Tuple[int, int]] = []
+
+    def image_mutation(index: int) -> Request:
+        if index % 2 == 1 and added_images:
+            product_id, image_id = added_images.pop()
+            return "DELETE", f"/api/product/{product_id}/image/{image_id}/", None
+        return "POST", f"/api/product/{rng.choice(product_ids)}/image/", {"image_url": f"https://cdn.example.com/bench/{index}.jpg"}
+
+    def record_image(response: httpx.Response):
+        if response.request.method == "POST" and response.status_code == 201:
+            image = response.json()
+            added_images.append((image["product_id"], image["image_id"]))
+
+    # Every worker reserves one unit of the same product: the 409s once it is
+    # sold out are expected, selling more than the stock is not
+    hot_product_id = product_ids[0]
+    stock = {}
+
+    async def read_stock(client: httpx.AsyncClient) -> int:
+        # The batch endpoint reads around the cache
+        response = await client.get(f"/api/products/batch/?ids={hot_product_id}")
+        return response.json()["products"][0]["quantity"]
+
+    async def before_reservations(client: httpx.AsyncClient):
+        stock["before"] = await read_stock(client)
+
+    async def check_reservations(client: httpx.AsyncClient, result: dict):
+        reserved = result["statuses"].get("201", 0)
+        remaining = await read_stock(client)
+        result["stock"] = {"before": stock["before"], "reserved": reserved, "after": remaining}
+        result["oversold"] = reserved > stock["before"] or remaining != stock["before"] - reserved
+
+    def without_cache():
+        original = services.cache
+
+        async def setup(client: httpx.AsyncClient):
+            services.cache = NullCache()
+
+        def teardown():
+            services.cache = original
+        return setup, teardown
+
+    uncached_setup, uncached_teardown = without_cache()
+    return {
+        "list": Scenario("list", lambda index: ("GET", "/api/products/?limit=20", None)),
+        "list_sparse": Scenario("list_sparse", lambda index: ("GET", "/api/products/?limit=20&fields=product_title,price&include=", None)),
+        "list_deep_offset": Scenario("list_deep_offset", lambda index: ("GET", f"/api/products/?limit=20&skip={deep_offset}", None)),
+        "list_deep_cursor": Scenario("list_deep_cursor", lambda index: ("GET", f"/api/products/?limit=20&cursor={deep_cursor}", None)),
+        "get_by_id": Scenario("get_by_id", lambda index: ("GET", f"/api/product/{rng.choice(product_ids)}/", None)),
+        "get_by_id_uncached": Scenario(
+            "get_by_id_uncached",
+            lambda index: ("GET", f"/api/product/{rng.choice(product_ids)}/", None),
+            setup=uncached_setup,
+            teardown=uncached_teardown,
+        ),
+        "batch": Scenario(
+            "batch",
+            lambda index: ("GET", "/api/products/batch/?" + "&".join(f"ids={product_id}" for product_id in rng.sample(product_ids, min(50, len(product_ids)))), None),
+        ),
+        "search": Scenario("search", lambda index: ("GET", f"/api/products/search/?q={rng.choice(terms)}&limit=20", None)),
+        "category_tree": Scenario("category_tree", lambda index: ("GET", "/api/categories/tree/", None)),
+        "create": Scenario("create", create),
+        "update": Scenario("update", update),
+        "bulk_update": Scenario("bulk_update", bulk_update),
+        "image_mutations": Scenario("image_mutations", image_mutation, on_response=record_image, expected=(422,)),
+        "reservations": Scenario(
+            "reservations",
+            lambda index: ("POST", "/api/inventory/reservations/", {"items": [{"product_id": hot_product_id, "quantity": 1}]}),
+            setup=before_reservations,
+            check=check_reservations,
+            expected=(409,),
+        ),
+    }
+
+# Read scenarios first so that they run against the generated catalog
+SCENARIOS = (
+    "list", "list_sparse", "list_deep_offset", "list_deep_cursor", "get_by_id", "get_by_id_uncached",
+    "batch", "search", "category_tree", "create", "update", "bulk_update", "image_mutations", "reservations",
+)
+
+async def run_scenarios(ids: dict, names: List[str], requests: int, concurrency: int) -> dict:
+    scenarios = build_scenarios(ids)
+    results = {}
+    transport = httpx.ASGITransport(app=app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://benchmark") as client:
+        for name in names:
+            results[name] = await run_scenario(client, scenarios[name], requests, concurrency)
+    return results
+
+async def run_coalescing(ids: dict, requests: int, levels: List[int]) -> dict:
+    """Reads of one product with the cache off, with and without single-flight, at each concurrency level.
+
+    Without coalescing the query count grows with the requests, with it the
+    count stays near one fetch per wave of concurrent requests.
+    """
+    hot_product_id = ids["product_ids"][0]
+    original_cache, original_enabled = services.cache, flights.enabled
+    hot = Scenario("hot_product", lambda index: ("GET", f"/api/product/{hot_product_id}/", None))
+    results = {}
+    transport = httpx.ASGITransport(app=app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://benchmark") as client:
+        services.cache = NullCache()
+        try:
+            for concurrency in levels:
+                level = {}
+                for mode, enabled in (("single_flight", True), ("uncoalesced", False)):
+                    flights.enabled = enabled
+                    level[mode] = await run_scenario(client, hot, requests, concurrency)
+                results[str(concurrency)] = level
+        finally:
+            services.cache, flights.enabled = original_cache, original_enabled
+    return results
@@ -0,0 +1,46 @@
+"""Search latency on a large generated catalog, per kind of query."""
+import random
+from typing import Dict, List
+import httpx
+from ..main import app
+from .catalog import ADJECTIVES, NOUNS, WORDS
+from .scenarios import Scenario, run_scenario
+
+def build_search_scenarios(ids: dict, seed: int = 42) -> Dict[str, Scenario]:
+    rng = random.Random(seed)
+    category_titles = ids["category_titles"]
+    terms = [word.lower() for word in ADJECTIVES + NOUNS] + WORDS
+
+    def url(**params) -> str:
+        return "/api/products/search/?" + "&".join(f"{name}={value}" for name, value in params.items()) + "&limit=20"
+
+    def price_range() -> dict:
+        low = round(rng.uniform(1, 400), 2)
+        return {"min_price": low, "max_price": round(low + 50, 2)}
+
+    return {
+        # A common word matches a large share of the catalog
+        "search_term": Scenario("search_term", lambda index: ("GET", url(q=rng.choice(terms)), None)),
+        "search_two_terms": Scenario("search_two_terms", lambda index: ("GET", url(q=f"{rng.choice(terms)}+{rng.choice(terms)}"), None)),
+        "search_term_category": Scenario(
+            "search_term_category", lambda index: ("GET", url(q=rng.choice(terms), category=rng.choice(category_titles)), None),
+        ),
+        "search_term_price_in_stock": Scenario(
+            "search_term_price_in_stock", lambda index: ("GET", url(q=rng.choice(terms), in_stock="true", **price_range()), None),
+        ),
+        # No text: the filters and facets alone
+        "search_filters_only": Scenario(
+            "search_filters_only", lambda index: ("GET", url(category=rng.choice(category_titles), in_stock="true", **price_range()), None),
+        ),
+    }
+
+SEARCH_SCENARIOS = ("search_term", "search_two_terms", "search_term_category", "search_term_price_in_stock", "search_filters_only")
+
+async def run_search(ids: dict, names: List[str], requests: int, concurrency: int) -> dict:
+    scenarios = build_search_scenarios(ids)
+    results = {}
+    transport = httpx.ASGITransport(app=app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://benchmark") as client:
+        for name in names:
+            results[name] = await run_scenario(client, scenarios[name], requests, concurrency)
+    return results
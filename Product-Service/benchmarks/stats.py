@@ -0,0 +1,54 @@
+import statistics
+from typing import Dict, List
+
+def latency_summary(latencies: List[float]) -> Dict[str, float]:
+    """Latency percentiles in milliseconds."""
+    if not latencies:
+        return {}
+    milliseconds = sorted(latency * 1000 for latency in latencies)
+    if len(milliseconds) > 1:
+        cuts = statistics.quantiles(milliseconds, n=100, method="inclusive")
+        p50, p95, p99 = cuts[49], cuts[94], cuts[98]
+    else:
+        p50 = p95 = p99 = milliseconds[0]
+    return {
+        "mean": round(statistics.fmean(milliseconds), 3),
+        "p50": round(p50, 3),
+        "p95": round(p95, 3),
+        "p99": round(p99, 3),
+        "max": round(milliseconds[-1], 3),
+    }
+
+# Metrics compared between runs, higher is better for throughput only
+COMPARED_METRICS = (
+    ("throughput_rps", True),
+    ("latency_ms.p50", False),
+    ("latency_ms.p95", False),
+    ("latency_ms.p99", False),
+    ("queries_per_request", False),
+)
+
+def _lookup(result: dict, path: str):
+    for key in path.split("."):
+        if not isinstance(result, dict) or key not in result:
+            return None
+        result = result[key]
+    return result
+
+def compare(before: dict, after: dict) -> List[str]:
+    """One line per scenario and metric present in both reports, with the relative change."""
+    lines = []
+    for section in ("scenarios", "micro"):
+        for name, result in after.get(section, {}).items():
+            previous = before.get(section, {}).get(name)
+            if previous is None:
+                continue
+            for metric, higher_is_better in COMPARED_METRICS:
+                old, new = _lookup(previous, metric), _lookup(result, metric)
+                if old is None or new is None:
+                    continue
+                change = (new - old) / old * 100 if old else 0.0
+                better = change > 0 if higher_is_better else change < 0
+                marker = "" if abs(change) < 5 else (" (better)" if better else " (worse)")
+                lines.append(f"{section}/{name} {metric}: {old} -> {new} ({change:+.1f}%){marker}")
+    return lines
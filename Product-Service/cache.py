@@ -0,0 +1,160 @@
+import os
+import time
+from collections import OrderedDict
+from typing import Awaitable, Callable, Iterable, List, Optional
+from .singleflight import flights
+
+# CACHE_BACKEND is "memory" (per process), "redis" or "none". The in-process
+# cache is only invalidated by writes served by the same process, so
+# deployments running several workers should use the redis backend.
+CACHE_BACKEND = os.getenv("CACHE_BACKEND", "memory")
+CACHE_TTL = float(os.getenv("CACHE_TTL", "60"))
+CACHE_MAX_SIZE = int(os.getenv("CACHE_MAX_SIZE", "10000"))
+REDIS_URL = os.getenv("REDIS_URL", "redis://localhost:6379/0")
+
+# Keys deleted per round trip when invalidating many entries at once
+DELETE_BATCH_SIZE = 1000
+
+def product_key(product_id: int) -> str:
+    return f"product:{product_id}"
+
+def category_key(category_title: str) -> str:
+    return f"category:{category_title}"
+
+class CacheBackend:
+    name = "base"
+
+    def __init__(self):
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    async def get(self, key: str) -> Optional[bytes]:
+        raise NotImplementedError
+
+    async def set(self, key: str, value: bytes):
+        raise NotImplementedError
+
+    async def delete(self, keys: Iterable[str]):
+        keys = list(keys)
+        # Reads in flight for these keys may have loaded the values before the write
+        flights.forget(keys)
+        await self._delete(keys)
+
+    async def _delete(self, keys: List[str]):
+        raise NotImplementedError
+
+    async def stats(self) -> dict:
+        return {
+            "backend": self.name,
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+        }
+
+    async def read_through(self, key: str, loader: Callable[[], Awaitable[bytes]]) -> bytes:
+        value = await self.get(key)
+        if value is not None:
+            self.hits += 1
+            return value
+        self.misses += 1
+
+        async def fill():
+            flight = flights.current(key)
+            value = await loader()
+            # Not cached when a write invalidated the key during the load, the value may predate the write
+            if flight is None or not flight.forgotten:
+                await self.set(key, value)
+            return value
+        # Concurrent misses of the key share one load
+        return await flights.do(key, fill)
+
+class NullCache(CacheBackend):
+    name = "none"
+
+    async def get(self, key: str) -> Optional[bytes]:
+        return None
+
+    async def set(self, key: str, value: bytes):
+        pass
+
+    async def _delete(self, keys: List[str]):
+        pass
+
+class LRUCache(CacheBackend):
+    """In-process cache bounded by entry count, entries expire after ttl seconds."""
+    name = "memory"
+
+    def __init__(self, max_size: int = CACHE_MAX_SIZE, ttl: float = CACHE_TTL):
+        super().__init__()
+        self.max_size = max_size
+        self.ttl = ttl
+        self.entries = OrderedDict()
+
+    async def get(self, key: str) -> Optional[bytes]:
+        entry = self.entries.get(key)
+        if entry is None:
+            return None
+        expires_at, value = entry
+        if expires_at <= time.monotonic():
+            del self.entries[key]
+            self.evictions += 1
+            return None
+        self.entries.move_to_end(key)
+        return value
+
+    async def set(self, key: str, value: bytes):
+        self.entries[key] = (time.monotonic() + self.ttl, value)
+        self.entries.move_to_end(key)
+        while len(self.entries) > self.max_size:
+            self.entries.popitem(last=False)
+            self.evictions += 1
+
+    async def _delete(self, keys: List[str]):
+        for key in keys:
+            self.entries.pop(key, None)
+
+    async def stats(self) -> dict:
+        return {**await super().stats(), "size": len(self.entries), "max_size": self.max_size}
+
+class RedisCache(CacheBackend):
+    """Cache on any client exposing the redis.asyncio get/set/delete/info API."""
+    name = "redis"
+
+    def __init__(self, client, ttl: float = CACHE_TTL, prefix: str = "product-service:"):
+        super().__init__()
+        self.client = client
+        self.ttl = ttl
+        self.prefix = prefix
+
+    async def get(self, key: str) -> Optional[bytes]:
+        return await self.client.get(self.prefix + key)
+
+    async def set(self, key: str, value: bytes):
+        await self.client.set(self.prefix + key, value, px=int(self.ttl * 1000))
+
+    async def _delete(self, keys: List[str]):
+        keys = [self.prefix + key for key in keys]
+        for start in range(0, len(keys), DELETE_BATCH_SIZE):
+            await self.client.delete(*keys[start:start + DELETE_BATCH_SIZE])
+
+    async def stats(self) -> dict:
+        # Redis evicts on its own, report the server-wide counter
+        info = await self.client.info("stats")
+        self.evictions = int(info.get("evicted_keys", 0)) + int(info.get("expired_keys", 0))
+        return await super().stats()
+
+def cache_from_env() -> CacheBackend:
+    if CACHE_BACKEND == "none":
+        return NullCache()
+    if CACHE_BACKEND == "memory":
+        return LRUCache()
+    if CACHE_BACKEND == "redis":
+        try:
+            import redis.asyncio as redis
+        except ImportError:
+            raise RuntimeError("CACHE_BACKEND=redis requires the 'redis' package")
+        return RedisCache(redis.Redis.from_url(REDIS_URL))
+    raise RuntimeError(f"Unknown CACHE_BACKEND '{CACHE_BACKEND}'")
+
+cache = cache_from_env()
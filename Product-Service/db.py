@@ -1,16 +1,95 @@
 import os
+import time
+import uuid
 import dotenv
 import sqlalchemy as _sql
+import sqlalchemy.ext.asyncio as _asyncio
 import sqlalchemy.ext.declarative as _declarative
 import sqlalchemy.orm as _orm
+import sqlalchemy.pool as _pool
 
 dotenv.load_dotenv()
 DATABASE_URL = os.getenv("DATABASE_URL")
 
-engine = _sql.create_engine(DATABASE_URL)
+# Async drivers used when ASYNC_DATABASE_URL is not set explicitly
+ASYNC_DRIVERS = {
+    "postgresql": "postgresql+asyncpg",
+    "postgresql+psycopg2": "postgresql+asyncpg",
+    "sqlite": "sqlite+aiosqlite",
+}
+
+def to_async_url(url: str) -> str:
+    scheme, separator, rest = url.partition("://")
+    return ASYNC_DRIVERS.get(scheme, scheme) + separator + rest
+
+ASYNC_DATABASE_URL = os.getenv("ASYNC_DATABASE_URL") or to_async_url(DATABASE_URL)
+
+# Connection pool settings, ignored for SQLite which uses SQLAlchemy's defaults
+DB_POOL_SIZE = int(os.getenv("DB_POOL_SIZE", "5"))
+DB_MAX_OVERFLOW = int(os.getenv("DB_MAX_OVERFLOW", "10"))
+DB_POOL_TIMEOUT = float(os.getenv("DB_POOL_TIMEOUT", "30"))
+DB_POOL_RECYCLE = int(os.getenv("DB_POOL_RECYCLE", "1800"))
+DB_POOL_PRE_PING = os.getenv("DB_POOL_PRE_PING", "true").lower() == "true"
+# PgBouncer in transaction mode: no client-side pool, no reused prepared statements
+DB_PGBOUNCER = os.getenv("DB_PGBOUNCER", "false").lower() == "true"
+
+class PoolWaitStats:
+    def __init__(self):
+        self.waits = 0
+        self.wait_seconds = 0.0
+        self.max_wait_seconds = 0.0
+        self.timeouts = 0
+
+pool_wait_stats = PoolWaitStats()
+
+class InstrumentedAsyncQueuePool(_pool.AsyncAdaptedQueuePool):
+    """AsyncAdaptedQueuePool measuring how long checkouts wait for a connection."""
+
+    def _do_get(self):
+        started_at = time.perf_counter()
+        try:
+            return super()._do_get()
+        except _sql.exc.TimeoutError:
+            pool_wait_stats.timeouts += 1
+            raise
+        finally:
+            waited = time.perf_counter() - started_at
+            pool_wait_stats.waits += 1
+            pool_wait_stats.wait_seconds += waited
+            pool_wait_stats.max_wait_seconds = max(pool_wait_stats.max_wait_seconds, waited)
+
+def engine_options(url: str, is_async: bool = False) -> dict:
+    if url.startswith("sqlite"):
+        return {}
+    if DB_PGBOUNCER:
+        options = {"poolclass": _pool.NullPool}
+        if is_async:
+            options["connect_args"] = {
+                "statement_cache_size": 0,
+                "prepared_statement_cache_size": 0,
+                "prepared_statement_name_func": lambda: f"__asyncpg_{uuid.uuid4()}__",
+            }
+        return options
+    options = {
+        "pool_size": DB_POOL_SIZE,
+        "max_overflow": DB_MAX_OVERFLOW,
+        "pool_timeout": DB_POOL_TIMEOUT,
+        "pool_recycle": DB_POOL_RECYCLE,
+        "pool_pre_ping": DB_POOL_PRE_PING,
+    }
+    if is_async:
+        options["poolclass"] = InstrumentedAsyncQueuePool
+    return options
+
+engine = _sql.create_engine(DATABASE_URL, **engine_options(DATABASE_URL))
 
 SessionLocal = _orm.sessionmaker(autocommit=False, autoflush=False, bind=engine)
 
+async_engine = _asyncio.create_async_engine(ASYNC_DATABASE_URL, **engine_options(ASYNC_DATABASE_URL, is_async=True))
+
+# Objects stay usable after commit; reloading them would need implicit IO
+AsyncSessionLocal = _asyncio.async_sessionmaker(bind=async_engine, autoflush=False, expire_on_commit=False)
+
 Base = _declarative.declarative_base()
 
 def get_db():
@@ -19,4 +98,27 @@ def get_db():
         db = SessionLocal()
         yield db
     finally:
-        db.close()
\ No newline at end of file
+        db.close()
+
+async def get_async_db():
+    async with AsyncSessionLocal() as db:
+        yield db
+
+def pool_status() -> dict:
+    pool = async_engine.pool
+    status = {"pool_class": type(pool).__name__}
+    if isinstance(pool, _pool.QueuePool):
+        status.update(
+            size=pool.size(),
+            checked_out=pool.checkedout(),
+            checked_in=pool.checkedin(),
+            overflow=max(pool.overflow(), 0),
+            max_overflow=pool._max_overflow,
+        )
+    status.update(
+        waits=pool_wait_stats.waits,
+        wait_seconds_total=pool_wait_stats.wait_seconds,
+        max_wait_seconds=pool_wait_stats.max_wait_seconds,
+        timeouts=pool_wait_stats.timeouts,
+    )
+    return status
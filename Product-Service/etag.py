@@ -0,0 +1,22 @@
+import hashlib
+from typing import Optional, Tuple
+
+def make_etag(*parts) -> str:
+    digest = hashlib.sha1("|".join(map(str, parts)).encode()).hexdigest()
+    return f'"{digest}"'
+
+def etag_matches(if_none_match: Optional[str], etag: str) -> bool:
+    if not if_none_match:
+        return False
+    if if_none_match.strip() == "*":
+        return True
+    # If-None-Match uses weak comparison, W/ prefixes are ignored
+    return any(tag.strip().removeprefix("W/") == etag for tag in if_none_match.split(","))
+
+# Cached payloads keep their ETag on the first line so a hit can answer 304
+def pack(etag: str, body: bytes) -> bytes:
+    return etag.encode() + b"\n" + body
+
+def unpack(entry: bytes) -> Tuple[str, bytes]:
+    etag, _, body = entry.partition(b"\n")
+    return etag.decode(), body
@@ -17,3 +17,33 @@ class BadRequestException(Exception):
     def __init__(self, message: str ="The server cannot or will not process the request due to something that is perceived to be a client error"):
         self.message = message
         super().__init__(self.message)
+
+class UnsupportedMediaTypeException(Exception):
+    def __init__(self, message: str ="The request payload format is not supported"):
+        self.message = message
+        super().__init__(self.message)
+
+class InsufficientStockException(Exception):
+    def __init__(self, message: str ="Not enough stock to fulfil the request"):
+        self.message = message
+        super().__init__(self.message)
+
+class ReservationStateException(Exception):
+    def __init__(self, message: str ="The reservation is no longer pending"):
+        self.message = message
+        super().__init__(self.message)
+
+class IdempotencyKeyConflictException(Exception):
+    def __init__(self, message: str ="The Idempotency-Key was already used with a different request"):
+        self.message = message
+        super().__init__(self.message)
+
+class UnauthorizedException(Exception):
+    def __init__(self, message: str ="Authentication is required"):
+        self.message = message
+        super().__init__(self.message)
+
+class FetchTimeoutException(Exception):
+    def __init__(self, message: str ="The read did not complete in time"):
+        self.message = message
+        super().__init__(self.message)
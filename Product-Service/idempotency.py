@@ -0,0 +1,47 @@
+import hashlib
+from datetime import timedelta
+from typing import Optional, Tuple
+from sqlalchemy import delete, select
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.ext.asyncio import AsyncSession
+from .models import IdempotencyKey, utc_now
+from .exceptions import IdempotencyKeyConflictException
+
+# Create endpoints accept an Idempotency-Key header. The key is stored with the
+# response in the transaction that creates the resource, so a retry either sees
+# the committed key and gets the same response back, or races it and loses on
+# the primary key, rolling its own writes back.
+IDEMPOTENT_REPLAYED_HEADER = "Idempotent-Replayed"
+
+def fingerprint(*parts) -> str:
+    """Hash of the request a key was first used with, reuse with another request is rejected."""
+    return hashlib.sha256("|".join(map(str, parts)).encode()).hexdigest()
+
+async def replay_idempotent(scope: str, key: str, request_hash: str, db: AsyncSession) -> Optional[bytes]:
+    stored = await db.scalar(select(IdempotencyKey).filter(IdempotencyKey.scope == scope, IdempotencyKey.key == key))
+    if stored is None:
+        return None
+    if stored.request_hash != request_hash:
+        raise IdempotencyKeyConflictException(f"Idempotency-Key '{key}' was already used with a different request")
+    return stored.response
+
+async def commit_idempotent(scope: str, key: Optional[str], request_hash: str, response: bytes, db: AsyncSession) -> Tuple[bytes, bool]:
+    """Commit the pending writes with the key, or replay the response of a retry that committed first."""
+    if key is None:
+        await db.commit()
+        return response, False
+    db.add(IdempotencyKey(scope=scope, key=key, request_hash=request_hash, response=response))
+    try:
+        await db.commit()
+    except IntegrityError:
+        await db.rollback()
+        stored = await replay_idempotent(scope, key, request_hash, db)
+        if stored is None:
+            raise
+        return stored, True
+    return response, False
+
+async def delete_expired_idempotency_keys(db: AsyncSession, max_age: timedelta) -> int:
+    result = await db.execute(delete(IdempotencyKey).filter(IdempotencyKey.created_at < utc_now() - max_age))
+    await db.commit()
+    return result.rowcount
@@ -0,0 +1,112 @@
+import asyncio
+import io
+import multiprocessing
+import os
+import warnings
+from concurrent.futures import ProcessPoolExecutor
+from typing import List, Optional, Sequence, Tuple
+
+# Resizing and encoding is CPU bound, it runs in a process pool so it neither
+# blocks the event loop nor holds the GIL of the serving process. This module
+# is imported by the pool workers, keep it free of database and app imports.
+
+# Upload media types and the file extension their originals are stored with
+IMAGE_CONTENT_TYPES = {"image/jpeg": "jpg", "image/png": "png", "image/webp": "webp", "image/gif": "gif"}
+# Extension of each variant format
+VARIANT_EXTENSIONS = {"webp": "webp", "jpeg": "jpg", "png": "png"}
+# Widths of the resized variants, originals are never upscaled
+VARIANT_WIDTHS = tuple(int(width) for width in os.getenv("IMAGE_VARIANT_WIDTHS", "160,480,1024").split(","))
+IMAGE_WORKERS = int(os.getenv("IMAGE_WORKERS", "2"))
+WEBP_QUALITY = int(os.getenv("IMAGE_WEBP_QUALITY", "80"))
+JPEG_QUALITY = int(os.getenv("IMAGE_JPEG_QUALITY", "85"))
+# Decompression bomb guard, uploads above this many pixels are rejected
+MAX_IMAGE_PIXELS = int(os.getenv("MAX_IMAGE_PIXELS", str(40_000_000)))
+
+# (width, height, format, encoded bytes)
+RenderedVariant = Tuple[int, int, str, bytes]
+
+def render_variants(data: bytes, widths: Sequence[int] = VARIANT_WIDTHS) -> List[RenderedVariant]:
+    """Resize an image to each width below its own and encode every size as WebP.
+
+    Sizes below the original also get a JPEG (PNG when the image has
+    transparency) for clients without WebP support, which can use the original.
+    """
+    from PIL import Image, ImageOps
+
+    with _open_image(data) as original:
+        image = ImageOps.exif_transpose(original)
+        has_alpha = image.mode in ("RGBA", "LA", "PA") or "transparency" in image.info
+        image = image.convert("RGBA" if has_alpha else "RGB")
+    fallback = "png" if has_alpha else "jpeg"
+    variants = []
+    for width in sorted({width for width in widths if width < image.width} | {image.width}):
+        height = max(1, round(image.height * width / image.width))
+        resized = image if width == image.width else image.resize((width, height), Image.LANCZOS)
+        formats = ("webp",) if width == image.width else ("webp", fallback)
+        for format in formats:
+            buffer = io.BytesIO()
+            if format == "webp":
+                resized.save(buffer, "WEBP", quality=WEBP_QUALITY, method=4)
+            elif format == "jpeg":
+                resized.save(buffer, "JPEG", quality=JPEG_QUALITY, optimize=True, progressive=True)
+            else:
+                resized.save(buffer, "PNG", optimize=True)
+            variants.append((width, height, format, buffer.getvalue()))
+    return variants
+
+def _open_image(data: bytes):
+    from PIL import Image
+
+    Image.MAX_IMAGE_PIXELS = MAX_IMAGE_PIXELS
+    # Pillow only refuses images above twice the limit and warns below that
+    with warnings.catch_warnings():
+        warnings.simplefilter("error", Image.DecompressionBombWarning)
+        return Image.open(io.BytesIO(data))
+
+def inspect_image(data: bytes) -> str:
+    """Media type of a complete image within the pixel limit, else raises ValueError."""
+    from PIL import Image
+
+    try:
+        with _open_image(data) as image:
+            image.verify()
+            # Camera JPEGs carrying preview images open as MPO
+            return Image.MIME.get("JPEG" if image.format == "MPO" else image.format, "")
+    except (Image.DecompressionBombWarning, Image.DecompressionBombError):
+        raise ValueError(f"Images can have at most {MAX_IMAGE_PIXELS} pixels")
+    except Exception:
+        raise ValueError("The image is truncated or not in a supported format")
+
+_pool: Optional[ProcessPoolExecutor] = None
+
+def image_pool() -> ProcessPoolExecutor:
+    global _pool
+    if _pool is None:
+        # Forking a process running an event loop and driver threads is unsafe
+        _pool = ProcessPoolExecutor(max_workers=IMAGE_WORKERS, mp_context=multiprocessing.get_context("spawn"))
+    return _pool
+
+def shutdown_image_pool():
+    global _pool
+    if _pool is not None:
+        _pool.shutdown(wait=False, cancel_futures=True)
+        _pool = None
+
+async def inspect_image_in_pool(data: bytes) -> str:
+    return await asyncio.get_running_loop().run_in_executor(image_pool(), inspect_image, data)
+
+async def render_variants_in_pool(data: bytes) -> List[RenderedVariant]:
+    return await asyncio.get_running_loop().run_in_executor(image_pool(), render_variants, data, VARIANT_WIDTHS)
+
+def choose_variant(variants: Sequence, width: Optional[int], accepts_webp: bool):
+    """Smallest variant at least `width` wide (the largest without a width) in a format the client accepts.
+
+    Returns None when the original is the best fit: the fallback format has no
+    full size variant.
+    """
+    candidates = sorted((variant for variant in variants if (variant.format == "webp") == accepts_webp), key=lambda variant: variant.width)
+    if width is not None:
+        fitting = next((variant for variant in candidates if variant.width >= width), None)
+        if fitting is not None:
+            return fitting
+    return candidates[-1] if accepts_webp and candidates else None
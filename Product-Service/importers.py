@@ -0,0 +1,81 @@
+import csv
+import json
+from typing import AsyncIterator, Tuple, Union
+from .exceptions import BadRequestException, UnsupportedMediaTypeException
+
+# Separator of image URLs inside the CSV "images" column
+CSV_IMAGE_SEPARATOR = "|"
+
+ImportRow = Tuple[int, Union[dict, BadRequestException]]
+
+async def iter_lines(stream: AsyncIterator[bytes]) -> AsyncIterator[str]:
+    buffer = b""
+    async for chunk in stream:
+        buffer += chunk
+        *lines, buffer = buffer.split(b"\n")
+        for line in lines:
+            yield line.decode("utf-8").rstrip("\r")
+    if buffer:
+        yield buffer.decode("utf-8").rstrip("\r")
+
+async def parse_json_array(stream: AsyncIterator[bytes]) -> AsyncIterator[ImportRow]:
+    body = b"".join([chunk async for chunk in stream])
+    try:
+        rows = json.loads(body)
+    except ValueError:
+        raise BadRequestException("Request body is not valid JSON")
+    if not isinstance(rows, list):
+        raise BadRequestException("Request body must be a JSON array of products")
+    for row_number, row in enumerate(rows, start=1):
+        yield row_number, row
+
+async def parse_ndjson(stream: AsyncIterator[bytes]) -> AsyncIterator[ImportRow]:
+    row_number = 0
+    async for line in iter_lines(stream):
+        if not line.strip():
+            continue
+        row_number += 1
+        try:
+            yield row_number, json.loads(line)
+        except ValueError:
+            yield row_number, BadRequestException("Line is not valid JSON")
+
+async def parse_csv(stream: AsyncIterator[bytes]) -> AsyncIterator[ImportRow]:
+    header = None
+    row_number = 0
+    record = ""
+    async for line in iter_lines(stream):
+        record = f"{record}\n{line}" if record else line
+        # A quoted field may contain newlines: wait until every quote is closed
+        if record.count('"') % 2:
+            continue
+        values, record = next(csv.reader([record])), ""
+        if header is None:
+            header = values
+            continue
+        if not any(values):
+            continue
+        row_number += 1
+        if len(values) != len(header):
+            yield row_number, BadRequestException(f"Expected {len(header)} columns, got {len(values)}")
+            continue
+        row = dict(zip(header, values))
+        images = row.pop("images", "")
+        row["images"] = [{"image_url": url} for url in images.split(CSV_IMAGE_SEPARATOR) if url]
+        yield row_number, row
+    if record:
+        yield row_number + 1, BadRequestException("Unterminated quoted field")
+
+PARSERS = {
+    "application/json": parse_json_array,
+    "application/x-ndjson": parse_ndjson,
+    "application/ndjson": parse_ndjson,
+    "text/csv": parse_csv,
+}
+
+def parse_import_stream(content_type: str, stream: AsyncIterator[bytes]) -> AsyncIterator[ImportRow]:
+    media_type = (content_type or "").split(";")[0].strip().lower()
+    parser = PARSERS.get(media_type)
+    if parser is None:
+        raise UnsupportedMediaTypeException(f"Unsupported import format '{media_type}', use one of: {', '.join(PARSERS)}")
+    return parser(stream)
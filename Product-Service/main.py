@@ -1,10 +1,46 @@
+import asyncio
+from contextlib import asynccontextmanager
 from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.staticfiles import StaticFiles
 from .routers.product_router import product_router
 from .routers.category_router import category_router
 from .routers.product_image_router import product_image_router
-from .db import Base, engine
+from .routers.inventory_router import inventory_router
+from .routers.diagnostics_router import diagnostics_router, metrics_router
+from .routers.changes_router import changes_router
+from .admission import AdmissionMiddleware
+from .db import async_engine
+from .metrics import MetricsMiddleware, instrument_engine
+from .replicas import ReadYourWritesMiddleware, replica_router
+from .pagination import NEXT_CURSOR_HEADER
+from .idempotency import IDEMPOTENT_REPLAYED_HEADER
+from .imaging import shutdown_image_pool
+from .serializers import PydanticJSONResponse
+from .storage import IMAGE_BASE_URL, LocalFileStore, image_store
+from .tasks import (
+    check_replicas,
+    relay_catalog_events,
+    sweep_expired_idempotency_keys,
+    sweep_expired_reservations,
+    sweep_old_catalog_events,
+)
+
 
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    sweepers = [
+        asyncio.create_task(sweep_expired_reservations()),
+        asyncio.create_task(sweep_expired_idempotency_keys()),
+        asyncio.create_task(sweep_old_catalog_events()),
+        asyncio.create_task(relay_catalog_events()),
+    ]
+    if replica_router.replicas:
+        sweepers.append(asyncio.create_task(check_replicas()))
+    yield
+    for sweeper in sweepers:
+        sweeper.cancel()
+    shutdown_image_pool()
 
 app = FastAPI(
     title = "Product Service",
@@ -14,22 +50,43 @@ app = FastAPI(
         "name": "API Support",
         "url": "https://github.com/AlifHossain27/E-commerce-Microservices",
         "email": "alifh044@gmail.com"
-    }
+    },
+    lifespan=lifespan,
+    # Same bytes as the fast serialization path of the read endpoints
+    default_response_class=PydanticJSONResponse,
 )
 
-Base.metadata.create_all(bind=engine)
+# The schema is managed by Alembic: run `alembic upgrade head` before starting
+instrument_engine(async_engine.sync_engine)
+for replica in replica_router.replicas:
+    instrument_engine(replica.engine.sync_engine)
 
+# Innermost, so that rejections are cheap yet still carry CORS headers and are counted in the metrics
+app.add_middleware(AdmissionMiddleware)
 app.add_middleware(
     CORSMiddleware,
     allow_origins=["*"],
     allow_methods=["*"],
     allow_headers=["*"],
     allow_credentials=True,
+    expose_headers=[NEXT_CURSOR_HEADER, IDEMPOTENT_REPLAYED_HEADER, "ETag"],
 )
+app.add_middleware(MetricsMiddleware)
+app.add_middleware(ReadYourWritesMiddleware)
 
 # Category router
 app.include_router(category_router, tags=["Categories"], prefix="/api")
 # Product router
 app.include_router(product_router, tags=["Products"], prefix="/api")
 # Product Image router
-app.include_router(product_image_router, tags=["Product Image"], prefix="/api")
\ No newline at end of file
+app.include_router(product_image_router, tags=["Product Image"], prefix="/api")
+# Inventory router
+app.include_router(inventory_router, tags=["Inventory"], prefix="/api")
+app.include_router(changes_router, tags=["Changes"], prefix="/api")
+# Diagnostics router
+app.include_router(diagnostics_router, tags=["Diagnostics"], prefix="/api")
+# Prometheus scrape endpoint
+app.include_router(metrics_router, tags=["Diagnostics"])
+# Uploaded images, unless a CDN or web server in front serves IMAGE_BASE_URL
+if isinstance(image_store, LocalFileStore) and IMAGE_BASE_URL.startswith("/"):
+    app.mount(IMAGE_BASE_URL.rstrip("/"), StaticFiles(directory=image_store.root, check_dir=False), name="media")
\ No newline at end of file
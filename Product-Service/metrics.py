@@ -0,0 +1,142 @@
+import bisect
+import logging
+import os
+import time
+from contextvars import ContextVar
+from typing import Dict, Optional, Sequence, Tuple
+from sqlalchemy import event
+
+# Statements slower than this are logged, 0 turns the slow query log off
+SLOW_QUERY_THRESHOLD_MS = float(os.getenv("SLOW_QUERY_THRESHOLD_MS", "0"))
+
+LATENCY_BUCKETS = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+STATEMENT_COUNT_BUCKETS = (0, 1, 2, 3, 5, 10, 20, 50, 100)
+
+slow_query_logger = logging.getLogger("product_service.slow_query")
+
+class Histogram:
+    def __init__(self, buckets: Sequence[float] = LATENCY_BUCKETS):
+        self.buckets = tuple(buckets)
+        self.counts = [0] * (len(self.buckets) + 1)
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value: float):
+        self.counts[bisect.bisect_left(self.buckets, value)] += 1
+        self.sum += value
+        self.count += 1
+
+    def render(self, name: str, labels: str = "") -> list:
+        prefix = labels + "," if labels else ""
+        lines = []
+        cumulative = 0
+        for bound, count in zip(self.buckets, self.counts):
+            cumulative += count
+            lines.append(f'{name}_bucket{{{prefix}le="{bound}"}} {cumulative}')
+        lines.append(f'{name}_bucket{{{prefix}le="+Inf"}} {self.count}')
+        suffix = f"{{{labels}}}" if labels else ""
+        lines.append(f"{name}_sum{suffix} {self.sum}")
+        lines.append(f"{name}_count{suffix} {self.count}")
+        return lines
+
+class RequestStats:
+    __slots__ = ("scope", "statements", "db_time")
+
+    def __init__(self, scope: dict):
+        self.scope = scope
+        self.statements = 0
+        self.db_time = 0.0
+
+    @property
+    def route(self) -> str:
+        route = self.scope.get("route")
+        # Raw paths of unmatched requests would make label cardinality unbounded
+        return route.path if route is not None else "unmatched"
+
+current_request: ContextVar[Optional[RequestStats]] = ContextVar("current_request", default=None)
+
+class Metrics:
+    def __init__(self):
+        self.request_latency: Dict[Tuple[str, str], Histogram] = {}
+        self.request_status: Dict[Tuple[str, str, int], int] = {}
+        self.statements_per_request = Histogram(STATEMENT_COUNT_BUCKETS)
+        self.statement_latency = Histogram()
+        self.slow_statements = 0
+
+    def observe_request(self, method: str, route: str, status: int, elapsed: float, stats: RequestStats):
+        key = (method, route)
+        histogram = self.request_latency.get(key)
+        if histogram is None:
+            histogram = self.request_latency[key] = Histogram()
+        histogram.observe(elapsed)
+        status_key = (method, route, status)
+        self.request_status[status_key] = self.request_status.get(status_key, 0) + 1
+        self.statements_per_request.observe(stats.statements)
+
+    def observe_statement(self, statement: str, elapsed: float):
+        self.statement_latency.observe(elapsed)
+        stats = current_request.get()
+        if stats is not None:
+            stats.statements += 1
+            stats.db_time += elapsed
+        if SLOW_QUERY_THRESHOLD_MS and elapsed * 1000 >= SLOW_QUERY_THRESHOLD_MS:
+            self.slow_statements += 1
+            slow_query_logger.warning(
+                "Slow query (%.1f ms) on %s: %s", elapsed * 1000, stats.route if stats else "-", statement
+            )
+
+    def render(self) -> str:
+        lines = [
+            "# HELP http_request_duration_seconds Request latency by route",
+            "# TYPE http_request_duration_seconds histogram",
+        ]
+        for (method, route), histogram in self.request_latency.items():
+            lines += histogram.render("http_request_duration_seconds", f'method="{method}",route="{route}"')
+        lines += ["# HELP http_requests_total Responses by route and status", "# TYPE http_requests_total counter"]
+        for (method, route, status), count in self.request_status.items():
+            lines.append(f'http_requests_total{{method="{method}",route="{route}",status="{status}"}} {count}')
+        lines += ["# HELP db_statements_per_request SQL statements executed per request", "# TYPE db_statements_per_request histogram"]
+        lines += self.statements_per_request.render("db_statements_per_request")
+        lines += ["# HELP db_statement_duration_seconds SQL statement latency", "# TYPE db_statement_duration_seconds histogram"]
+        lines += self.statement_latency.render("db_statement_duration_seconds")
+        lines += ["# HELP db_slow_statements_total Statements over SLOW_QUERY_THRESHOLD_MS", "# TYPE db_slow_statements_total counter"]
+        lines.append(f"db_slow_statements_total {self.slow_statements}")
+        return "\n".join(lines) + "\n"
+
+metrics = Metrics()
+
+def instrument_engine(engine):
+    """Time every statement run on a sync Engine (pass AsyncEngine.sync_engine)."""
+    @event.listens_for(engine, "before_cursor_execute")
+    def before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+        context._query_started_at = time.perf_counter()
+
+    @event.listens_for(engine, "after_cursor_execute")
+    def after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+        metrics.observe_statement(statement, time.perf_counter() - context._query_started_at)
+
+class MetricsMiddleware:
+    """Pure ASGI middleware recording latency and status per route template."""
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            return await self.app(scope, receive, send)
+        stats = RequestStats(scope)
+        token = current_request.set(stats)
+        status = 500
+        started_at = time.perf_counter()
+
+        async def send_with_status(message):
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = message["status"]
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_with_status)
+        finally:
+            metrics.observe_request(scope["method"], stats.route, status, time.perf_counter() - started_at, stats)
+            current_request.reset(token)
@@ -0,0 +1,57 @@
+import importlib
+import sys
+from logging.config import fileConfig
+from pathlib import Path
+from alembic import context
+
+# The service is imported as a package (its modules use relative imports)
+SERVICE_DIR = Path(__file__).resolve().parents[1]
+sys.path.insert(0, str(SERVICE_DIR.parent))
+db = importlib.import_module(f"{SERVICE_DIR.name}.db")
+importlib.import_module(f"{SERVICE_DIR.name}.models")
+
+config = context.config
+if config.config_file_name is not None:
+    fileConfig(config.config_file_name)
+
+target_metadata = db.Base.metadata
+
+# Full-text search structures are created by raw DDL, not by the models
+SEARCH_TABLE_PREFIX = "products_fts"
+SEARCH_COLUMNS = {("products", "search_vector")}
+
+def include_object(object, name, type_, reflected, compare_to):
+    if type_ == "table" and name.startswith(SEARCH_TABLE_PREFIX):
+        return False
+    if type_ == "column" and (object.table.name, name) in SEARCH_COLUMNS:
+        return False
+    if type_ == "index" and name == "ix_products_search_vector":
+        return False
+    return True
+
+def run_migrations_offline():
+    context.configure(
+        url=db.DATABASE_URL,
+        target_metadata=target_metadata,
+        include_object=include_object,
+        literal_binds=True,
+        dialect_opts={"paramstyle": "named"},
+    )
+    with context.begin_transaction():
+        context.run_migrations()
+
+def run_migrations_online():
+    with db.engine.connect() as connection:
+        context.configure(
+            connection=connection,
+            target_metadata=target_metadata,
+            include_object=include_object,
+            render_as_batch=connection.dialect.name == "sqlite",
+        )
+        with context.begin_transaction():
+            context.run_migrations()
+
+if context.is_offline_mode():
+    run_migrations_offline()
+else:
+    run_migrations_online()
@@ -0,0 +1,58 @@
+"""Initial schema, as created by Base.metadata.create_all before migrations
+
+Databases created by the old create_all startup path already have this
+schema: mark them with `alembic stamp 0001` before upgrading.
+
+Revision ID: 0001
+Revises:
+Create Date: 2026-10-18 12:00:00
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+revision = "0001"
+down_revision = None
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table(
+        "categories",
+        sa.Column("category_id", sa.Integer(), primary_key=True),
+        sa.Column("category_title", sa.String(length=60)),
+        sa.Column("created_at", sa.DateTime()),
+        sa.Column("updated_at", sa.DateTime()),
+    )
+    op.create_index("ix_categories_category_id", "categories", ["category_id"])
+    op.create_index("ix_categories_category_title", "categories", ["category_title"], unique=True)
+
+    op.create_table(
+        "products",
+        sa.Column("product_id", sa.Integer(), primary_key=True),
+        sa.Column("product_title", sa.String(length=150)),
+        sa.Column("category_id", sa.Integer(), sa.ForeignKey("categories.category_id")),
+        sa.Column("product_description", sa.String(length=225)),
+        sa.Column("price", sa.Float()),
+        sa.Column("quantity", sa.Integer()),
+        sa.Column("created_at", sa.DateTime()),
+        sa.Column("updated_at", sa.DateTime()),
+    )
+    op.create_index("ix_products_product_id", "products", ["product_id"])
+    op.create_index("ix_products_product_title", "products", ["product_title"])
+
+    op.create_table(
+        "product_images",
+        sa.Column("image_id", sa.Integer(), primary_key=True),
+        sa.Column("product_id", sa.Integer(), sa.ForeignKey("products.product_id")),
+        sa.Column("image_url", sa.String()),
+    )
+    op.create_index("ix_product_images_image_id", "product_images", ["image_id"])
+
+
+def downgrade():
+    op.drop_table("product_images")
+    op.drop_table("products")
+    op.drop_table("categories")
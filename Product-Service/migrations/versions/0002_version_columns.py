@@ -0,0 +1,27 @@
+"""Version counters on categories and products, used for ETags
+
+Revision ID: 0002
+Revises: 0001
+Create Date: 2026-10-18 12:00:00
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+revision = "0002"
+down_revision = "0001"
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.add_column("categories", sa.Column("version", sa.Integer(), nullable=False, server_default="1"))
+    op.add_column("products", sa.Column("version", sa.Integer(), nullable=False, server_default="1"))
+
+
+def downgrade():
+    with op.batch_alter_table("products") as batch_op:
+        batch_op.drop_column("version")
+    with op.batch_alter_table("categories") as batch_op:
+        batch_op.drop_column("version")
@@ -0,0 +1,67 @@
+"""Full-text search index over product title and description
+
+Postgres gets a generated tsvector column with a GIN index, SQLite an FTS5
+table kept in sync by triggers (the same DDL as models.SEARCH_DDL).
+
+Revision ID: 0003
+Revises: 0002
+Create Date: 2026-10-18 12:00:00
+
+"""
+from alembic import op
+
+
+revision = "0003"
+down_revision = "0002"
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    dialect = op.get_bind().dialect.name
+    if dialect == "postgresql":
+        op.execute(
+            """ALTER TABLE products ADD COLUMN search_vector tsvector GENERATED ALWAYS AS (
+                to_tsvector('english', coalesce(product_title, '') || ' ' || coalesce(product_description, ''))
+            ) STORED"""
+        )
+        op.execute("CREATE INDEX ix_products_search_vector ON products USING GIN (search_vector)")
+    elif dialect == "sqlite":
+        op.execute(
+            """CREATE VIRTUAL TABLE products_fts USING fts5(
+                product_title, product_description, content='products', content_rowid='product_id'
+            )"""
+        )
+        op.execute(
+            """CREATE TRIGGER products_fts_insert AFTER INSERT ON products BEGIN
+                INSERT INTO products_fts(rowid, product_title, product_description)
+                VALUES (new.product_id, new.product_title, new.product_description);
+            END"""
+        )
+        op.execute(
+            """CREATE TRIGGER products_fts_delete AFTER DELETE ON products BEGIN
+                INSERT INTO products_fts(products_fts, rowid, product_title, product_description)
+                VALUES ('delete', old.product_id, old.product_title, old.product_description);
+            END"""
+        )
+        op.execute(
+            """CREATE TRIGGER products_fts_update AFTER UPDATE OF product_title, product_description ON products BEGIN
+                INSERT INTO products_fts(products_fts, rowid, product_title, product_description)
+                VALUES ('delete', old.product_id, old.product_title, old.product_description);
+                INSERT INTO products_fts(rowid, product_title, product_description)
+                VALUES (new.product_id, new.product_title, new.product_description);
+            END"""
+        )
+        # Index the rows that existed before the triggers
+        op.execute("INSERT INTO products_fts(products_fts) VALUES ('rebuild')")
+
+
+def downgrade():
+    dialect = op.get_bind().dialect.name
+    if dialect == "postgresql":
+        op.execute("DROP INDEX ix_products_search_vector")
+        op.execute("ALTER TABLE products DROP COLUMN search_vector")
+    elif dialect == "sqlite":
+        for trigger in ("products_fts_insert", "products_fts_delete", "products_fts_update"):
+            op.execute(f"DROP TRIGGER {trigger}")
+        op.execute("DROP TABLE products_fts")
@@ -0,0 +1,36 @@
+"""Indexes for foreign key lookups and the listing and search sort orders
+
+Each composite index leads with the foreign key, so it also serves plain
+lookups by products.category_id and product_images.product_id. On Postgres
+they are built CONCURRENTLY to avoid locking writes on large tables.
+
+Revision ID: 0004
+Revises: 0003
+Create Date: 2026-10-18 12:00:00
+
+"""
+from alembic import op
+
+
+revision = "0004"
+down_revision = "0003"
+branch_labels = None
+depends_on = None
+
+INDEXES = [
+    ("ix_products_category_id_product_id", "products", ["category_id", "product_id"]),
+    ("ix_products_category_id_price", "products", ["category_id", "price"]),
+    ("ix_product_images_product_id_image_id", "product_images", ["product_id", "image_id"]),
+]
+
+
+def upgrade():
+    with op.get_context().autocommit_block():
+        for name, table, columns in INDEXES:
+            op.create_index(name, table, columns, postgresql_concurrently=True)
+
+
+def downgrade():
+    with op.get_context().autocommit_block():
+        for name, table, _ in INDEXES:
+            op.drop_index(name, table_name=table, postgresql_concurrently=True)
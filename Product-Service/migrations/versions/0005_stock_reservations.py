@@ -0,0 +1,37 @@
+"""Stock reservations for the inventory API
+
+Revision ID: 0005
+Revises: 0004
+Create Date: 2026-10-18 12:00:00
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+revision = "0005"
+down_revision = "0004"
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table(
+        "stock_reservations",
+        sa.Column("reservation_id", sa.String(length=36), primary_key=True),
+        sa.Column("status", sa.String(length=16), nullable=False),
+        sa.Column("created_at", sa.DateTime()),
+        sa.Column("expires_at", sa.DateTime(), nullable=False),
+    )
+    op.create_index("ix_stock_reservations_status_expires_at", "stock_reservations", ["status", "expires_at"])
+    op.create_table(
+        "stock_reservation_items",
+        sa.Column("reservation_id", sa.String(length=36), sa.ForeignKey("stock_reservations.reservation_id"), primary_key=True),
+        sa.Column("product_id", sa.Integer(), sa.ForeignKey("products.product_id", ondelete="CASCADE"), primary_key=True),
+        sa.Column("quantity", sa.Integer(), nullable=False),
+    )
+
+
+def downgrade():
+    op.drop_table("stock_reservation_items")
+    op.drop_table("stock_reservations")
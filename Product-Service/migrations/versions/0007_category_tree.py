@@ -0,0 +1,43 @@
+"""Category tree with materialized paths and subtree product counts
+
+Revision ID: 0007
+Revises: 0006
+Create Date: 2026-10-18 14:00:00
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+revision = "0007"
+down_revision = "0006"
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    with op.batch_alter_table("categories") as batch_op:
+        batch_op.add_column(sa.Column("parent_id", sa.Integer(), nullable=True))
+        batch_op.add_column(sa.Column("path", sa.String(length=512), nullable=True))
+        batch_op.add_column(sa.Column("product_count", sa.Integer(), nullable=False, server_default="0"))
+        batch_op.create_foreign_key("fk_categories_parent_id", "categories", ["parent_id"], ["category_id"])
+    # Existing categories become roots, counting their own products
+    op.execute("UPDATE categories SET path = '/' || CAST(category_id AS VARCHAR(20)) || '/'")
+    op.execute(
+        "UPDATE categories SET product_count = "
+        "(SELECT COUNT(*) FROM products WHERE products.category_id = categories.category_id)"
+    )
+    with op.batch_alter_table("categories") as batch_op:
+        batch_op.alter_column("path", existing_type=sa.String(length=512), nullable=False)
+    op.create_index("ix_categories_parent_id", "categories", ["parent_id"])
+    op.create_index("ix_categories_path", "categories", ["path"], postgresql_ops={"path": "varchar_pattern_ops"})
+
+
+def downgrade():
+    op.drop_index("ix_categories_path", table_name="categories")
+    op.drop_index("ix_categories_parent_id", table_name="categories")
+    with op.batch_alter_table("categories") as batch_op:
+        batch_op.drop_constraint("fk_categories_parent_id", type_="foreignkey")
+        batch_op.drop_column("product_count")
+        batch_op.drop_column("path")
+        batch_op.drop_column("parent_id")
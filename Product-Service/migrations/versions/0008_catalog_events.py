@@ -0,0 +1,33 @@
+"""Catalog events outbox for the change feed
+
+Revision ID: 0008
+Revises: 0007
+Create Date: 2026-10-18 15:00:00
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+revision = "0008"
+down_revision = "0007"
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table(
+        "catalog_events",
+        sa.Column("seq", sa.BigInteger().with_variant(sa.Integer(), "sqlite"), primary_key=True),
+        sa.Column("entity", sa.String(length=16), nullable=False),
+        sa.Column("entity_id", sa.Integer(), nullable=False),
+        sa.Column("action", sa.String(length=16), nullable=False),
+        sa.Column("product_id", sa.Integer()),
+        sa.Column("created_at", sa.DateTime()),
+        sqlite_autoincrement=True,
+    )
+    op.create_index("ix_catalog_events_created_at", "catalog_events", ["created_at"])
+
+
+def downgrade():
+    op.drop_table("catalog_events")
@@ -0,0 +1,39 @@
+"""Uploaded product images and their generated variants
+
+Revision ID: 0009
+Revises: 0008
+Create Date: 2026-10-18 21:00:00
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+revision = "0009"
+down_revision = "0008"
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    with op.batch_alter_table("product_images") as batch_op:
+        batch_op.add_column(sa.Column("storage_key", sa.String(length=255), nullable=True))
+    # The unique constraint leads with image_id, it also serves lookups by image
+    op.create_table(
+        "product_image_variants",
+        sa.Column("variant_id", sa.Integer(), primary_key=True),
+        sa.Column("image_id", sa.Integer(), sa.ForeignKey("product_images.image_id", ondelete="CASCADE"), nullable=False),
+        sa.Column("width", sa.Integer(), nullable=False),
+        sa.Column("height", sa.Integer(), nullable=False),
+        sa.Column("format", sa.String(length=8), nullable=False),
+        sa.Column("storage_key", sa.String(length=255), nullable=False),
+        sa.Column("url", sa.String(), nullable=False),
+        sa.Column("size", sa.Integer(), nullable=False),
+        sa.UniqueConstraint("image_id", "width", "format", name="uq_product_image_variants_image_id_width_format"),
+    )
+
+
+def downgrade():
+    op.drop_table("product_image_variants")
+    with op.batch_alter_table("product_images") as batch_op:
+        batch_op.drop_column("storage_key")
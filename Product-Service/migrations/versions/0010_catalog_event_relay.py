@@ -0,0 +1,39 @@
+"""Catalog events are numbered by a relay after they commit
+
+Revision ID: 0010
+Revises: 0009
+Create Date: 2026-10-19 10:00:00
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+revision = "0010"
+down_revision = "0009"
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    # The old sequence number becomes the row ID, existing events keep it as their feed position
+    with op.batch_alter_table("catalog_events", table_kwargs={"sqlite_autoincrement": True}) as batch_op:
+        batch_op.alter_column(
+            "seq", new_column_name="event_id",
+            existing_type=sa.BigInteger().with_variant(sa.Integer(), "sqlite"), existing_nullable=False,
+        )
+    op.add_column("catalog_events", sa.Column("seq", sa.BigInteger(), nullable=True))
+    op.execute("UPDATE catalog_events SET seq = event_id")
+    op.create_index("ix_catalog_events_seq", "catalog_events", ["seq"], unique=True)
+
+
+def downgrade():
+    # Feed positions fall back to the row IDs, consumers should resume from the start
+    op.drop_index("ix_catalog_events_seq", table_name="catalog_events")
+    with op.batch_alter_table("catalog_events") as batch_op:
+        batch_op.drop_column("seq")
+    with op.batch_alter_table("catalog_events", table_kwargs={"sqlite_autoincrement": True}) as batch_op:
+        batch_op.alter_column(
+            "event_id", new_column_name="seq",
+            existing_type=sa.BigInteger().with_variant(sa.Integer(), "sqlite"), existing_nullable=False,
+        )
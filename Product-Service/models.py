@@ -1,38 +1,182 @@
-from sqlalchemy import Column, Integer, String, Float, ForeignKey, DateTime
+from sqlalchemy import BigInteger, Column, Integer, String, Float, ForeignKey, DateTime, DDL, Index, LargeBinary, UniqueConstraint, event
 from sqlalchemy.orm import relationship
 from .db import Base
 from datetime import datetime, timezone
 
 
+def utc_now():
+    # Columns are TIMESTAMP WITHOUT TIME ZONE holding UTC; asyncpg rejects aware values for them
+    return datetime.now(tz=timezone.utc).replace(tzinfo=None)
+
+
 class Category(Base):
     __tablename__ = 'categories'
+    # Subtrees are read with a prefix match on the path, which needs a pattern
+    # operator class on Postgres unless the database collation is C
+    __table_args__ = (
+        Index("ix_categories_path", "path", postgresql_ops={"path": "varchar_pattern_ops"}),
+    )
     category_id = Column(Integer, primary_key=True, index=True)
     category_title = Column(String(60), index=True, unique=True)
-    created_at = Column(DateTime, default=datetime.now(tz=timezone.utc))
-    updated_at = Column(DateTime, default=datetime.now(tz=timezone.utc))
+    parent_id = Column(Integer, ForeignKey("categories.category_id"), index=True)
+    # Materialized path of IDs from the root down to this category, e.g. "/1/4/9/"
+    path = Column(String(512), nullable=False, default="/")
+    # Products in this category and all of its descendants, kept up to date by
+    # every write that adds, removes or moves products or categories
+    product_count = Column(Integer, nullable=False, default=0)
+    created_at = Column(DateTime, default=utc_now)
+    updated_at = Column(DateTime, default=utc_now)
+    # Bumped on every change, part of the category and product ETags
+    version = Column(Integer, nullable=False, default=1)
 
     product = relationship("Product", back_populates="category")
 
 class Product(Base):
     __tablename__ = 'products'
+    # Lead with the foreign key: they also serve lookups by category_id
+    __table_args__ = (
+        Index("ix_products_category_id_product_id", "category_id", "product_id"),
+        Index("ix_products_category_id_price", "category_id", "price"),
+    )
     product_id = Column(Integer, primary_key=True, index=True)
     product_title = Column(String(150), index=True)
     category_id = Column(Integer, ForeignKey("categories.category_id"))
     product_description = Column(String(225))
     price = Column(Float)
     quantity = Column(Integer)
-    created_at = Column(DateTime, default=datetime.now(tz=timezone.utc))
-    updated_at = Column(DateTime, default=datetime.now(tz=timezone.utc))
+    created_at = Column(DateTime, default=utc_now)
+    updated_at = Column(DateTime, default=utc_now)
+    # Bumped on every change to the product or its images, part of its ETags
+    version = Column(Integer, nullable=False, default=1)
 
-    category = relationship("Category", back_populates="product")
-    images = relationship("ProductImage", back_populates="product")
+    # Never lazy loaded: read paths request them with services.PRODUCT_LOAD_OPTIONS
+    category = relationship("Category", back_populates="product", lazy="raise")
+    images = relationship("ProductImage", back_populates="product", lazy="raise", order_by="ProductImage.image_id")
 
 class ProductImage(Base):
     __tablename__ = "product_images"
+    __table_args__ = (
+        Index("ix_product_images_product_id_image_id", "product_id", "image_id"),
+    )
     image_id = Column(Integer, primary_key=True, index=True)
     product_id = Column(Integer, ForeignKey("products.product_id"))
     image_url = Column(String)
+    # Object store key of an uploaded original, None for images given by URL
+    storage_key = Column(String(255))
 
     product = relationship("Product", back_populates="images")
+    variants = relationship(
+        "ProductImageVariant", back_populates="image", lazy="raise", passive_deletes=True,
+        order_by="[ProductImageVariant.width, ProductImageVariant.format]",
+    )
+
+class ProductImageVariant(Base):
+    """Resized or re-encoded copy of an uploaded image, generated in the background."""
+    __tablename__ = "product_image_variants"
+    __table_args__ = (
+        UniqueConstraint("image_id", "width", "format", name="uq_product_image_variants_image_id_width_format"),
+    )
+    variant_id = Column(Integer, primary_key=True)
+    image_id = Column(Integer, ForeignKey("product_images.image_id", ondelete="CASCADE"), nullable=False)
+    width = Column(Integer, nullable=False)
+    height = Column(Integer, nullable=False)
+    # webp, jpeg or png
+    format = Column(String(8), nullable=False)
+    storage_key = Column(String(255), nullable=False)
+    url = Column(String, nullable=False)
+    size = Column(Integer, nullable=False)
+
+    image = relationship("ProductImage", back_populates="variants")
+
+
+class StockReservation(Base):
+    __tablename__ = "stock_reservations"
+    # The expiry sweep scans pending reservations by expiry time
+    __table_args__ = (
+        Index("ix_stock_reservations_status_expires_at", "status", "expires_at"),
+    )
+    reservation_id = Column(String(36), primary_key=True)
+    # pending -> committed | released | expired
+    status = Column(String(16), nullable=False, default="pending")
+    created_at = Column(DateTime, default=utc_now)
+    expires_at = Column(DateTime, nullable=False)
+
+    items = relationship("StockReservationItem", back_populates="reservation", lazy="raise")
+
+class StockReservationItem(Base):
+    __tablename__ = "stock_reservation_items"
+    reservation_id = Column(String(36), ForeignKey("stock_reservations.reservation_id"), primary_key=True)
+    product_id = Column(Integer, ForeignKey("products.product_id", ondelete="CASCADE"), primary_key=True)
+    quantity = Column(Integer, nullable=False)
+
+    reservation = relationship("StockReservation", back_populates="items")
+
+class IdempotencyKey(Base):
+    """Response of a create request, replayed when a client retries with the same Idempotency-Key."""
+    __tablename__ = "idempotency_keys"
+    __table_args__ = (
+        Index("ix_idempotency_keys_created_at", "created_at"),
+    )
+    # The endpoint the key was used on, keys are only unique per endpoint
+    scope = Column(String(32), primary_key=True)
+    key = Column(String(255), primary_key=True)
+    request_hash = Column(String(64), nullable=False)
+    response = Column(LargeBinary, nullable=False)
+    created_at = Column(DateTime, default=utc_now)
+
+class CatalogEvent(Base):
+    """Outbox row written in the transaction of every catalog mutation, read by the change feed."""
+    __tablename__ = "catalog_events"
+    # Without AUTOINCREMENT SQLite may hand out the ID of a pruned row again
+    __table_args__ = (
+        Index("ix_catalog_events_created_at", "created_at"),
+        Index("ix_catalog_events_seq", "seq", unique=True),
+        {"sqlite_autoincrement": True},
+    )
+    event_id = Column(BigInteger().with_variant(Integer, "sqlite"), primary_key=True)
+    # Feed position, NULL until the relay numbers the committed event (see outbox.py)
+    seq = Column(BigInteger)
+    # category, product or product_image
+    entity = Column(String(16), nullable=False)
+    entity_id = Column(Integer, nullable=False)
+    # created, updated or deleted
+    action = Column(String(16), nullable=False)
+    # The product an image event belongs to
+    product_id = Column(Integer)
+    created_at = Column(DateTime, default=utc_now)
 
+# Full-text index over title and description, see search.py for the queries.
+# Postgres keeps a generated tsvector column with a GIN index, SQLite (tests,
+# local runs) an external-content FTS5 table kept in sync by triggers.
+SEARCH_DDL = {
+    "postgresql": [
+        """ALTER TABLE products ADD COLUMN search_vector tsvector GENERATED ALWAYS AS (
+            to_tsvector('english', coalesce(product_title, '') || ' ' || coalesce(product_description, ''))
+        ) STORED""",
+        "CREATE INDEX ix_products_search_vector ON products USING GIN (search_vector)",
+    ],
+    "sqlite": [
+        """CREATE VIRTUAL TABLE products_fts USING fts5(
+            product_title, product_description, content='products', content_rowid='product_id'
+        )""",
+        """CREATE TRIGGER products_fts_insert AFTER INSERT ON products BEGIN
+            INSERT INTO products_fts(rowid, product_title, product_description)
+            VALUES (new.product_id, new.product_title, new.product_description);
+        END""",
+        """CREATE TRIGGER products_fts_delete AFTER DELETE ON products BEGIN
+            INSERT INTO products_fts(products_fts, rowid, product_title, product_description)
+            VALUES ('delete', old.product_id, old.product_title, old.product_description);
+        END""",
+        """CREATE TRIGGER products_fts_update AFTER UPDATE OF product_title, product_description ON products BEGIN
+            INSERT INTO products_fts(products_fts, rowid, product_title, product_description)
+            VALUES ('delete', old.product_id, old.product_title, old.product_description);
+            INSERT INTO products_fts(rowid, product_title, product_description)
+            VALUES (new.product_id, new.product_title, new.product_description);
+        END""",
+    ],
+}
 
+for dialect, statements in SEARCH_DDL.items():
+    for statement in statements:
+        event.listen(Product.__table__, "after_create", DDL(statement).execute_if(dialect=dialect))
+event.listen(Product.__table__, "before_drop", DDL("DROP TABLE IF EXISTS products_fts").execute_if(dialect="sqlite"))
@@ -0,0 +1,118 @@
+import asyncio
+from datetime import timedelta
+from typing import Iterable, List, Optional
+from sqlalchemy import delete, event, func, insert, select, update
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import Session
+from .models import CatalogEvent, utc_now
+
+# Change feed: every catalog mutation records CatalogEvent rows in its own
+# transaction, readers page through them by sequence number. Writers insert
+# their events unnumbered and take no lock, so catalog writes and stock
+# reservations commit concurrently. A relay (tasks.relay_catalog_events)
+# numbers committed events afterwards, in short transactions that serialize
+# on an advisory lock on Postgres (SQLite already serializes writers). Each
+# relay transaction hands out numbers above every number committed before it,
+# so a reader that saw seq 11 can never miss a seq 10 committed later.
+# Events are thin: consumers fetch the current state with /products/batch/.
+OUTBOX_LOCK_KEY = 0x6f7574626f78
+
+def catalog_event(entity: str, entity_id: int, action: str, product_id: Optional[int] = None) -> dict:
+    return {"entity": entity, "entity_id": entity_id, "action": action, "product_id": product_id}
+
+async def record_events(db: AsyncSession, events: Iterable[dict]):
+    """Insert events into the current transaction, the relay numbers them once it commits."""
+    events = list(events)
+    if not events:
+        return
+    await db.execute(insert(CatalogEvent), events)
+    db.sync_session.info["catalog_events"] = True
+
+async def sequence_events(db: AsyncSession, limit: int) -> int:
+    """Number up to `limit` committed events in the order they were recorded, returns how many."""
+    if db.bind.dialect.name == "postgresql":
+        # Relays of all instances take turns, the lock is released on commit
+        await db.execute(select(func.pg_advisory_xact_lock(OUTBOX_LOCK_KEY)))
+    event_ids = (await db.scalars(
+        select(CatalogEvent.event_id).filter(CatalogEvent.seq.is_(None)).order_by(CatalogEvent.event_id).limit(limit)
+    )).all()
+    if not event_ids:
+        await db.rollback()
+        return 0
+    last_seq = await db.scalar(select(func.coalesce(func.max(CatalogEvent.seq), 0)))
+    await db.execute(
+        update(CatalogEvent),
+        [{"event_id": event_id, "seq": last_seq + position} for position, event_id in enumerate(event_ids, 1)],
+    )
+    db.sync_session.info["sequenced_events"] = True
+    await db.commit()
+    return len(event_ids)
+
+async def retrieve_events(db: AsyncSession, after: Optional[int], limit: int) -> List[CatalogEvent]:
+    query = select(CatalogEvent).filter(CatalogEvent.seq.is_not(None)).order_by(CatalogEvent.seq).limit(limit)
+    if after is not None:
+        query = query.filter(CatalogEvent.seq > after)
+    return (await db.scalars(query)).all()
+
+async def delete_old_events(db: AsyncSession, max_age: timedelta) -> int:
+    # The last numbered event stays, the relay continues from its number
+    last_seq = select(func.max(CatalogEvent.seq)).scalar_subquery()
+    result = await db.execute(
+        delete(CatalogEvent).filter(CatalogEvent.created_at < utc_now() - max_age, CatalogEvent.seq < last_seq)
+    )
+    await db.commit()
+    return result.rowcount
+
+class ChangeNotifier:
+    """Wakes the waiters of this process when a transaction with events commits.
+
+    Writes served by other processes are picked up by the waiters' polling.
+    """
+
+    def __init__(self):
+        self.waiters = set()
+        # Bumped on every notification, lets a waiter notice one it was not yet waiting for
+        self.notifications = 0
+
+    def notify(self):
+        self.notifications += 1
+        waiters, self.waiters = self.waiters, set()
+        for waiter in waiters:
+            try:
+                waiter.get_loop().call_soon_threadsafe(_wake, waiter)
+            except RuntimeError:
+                # The waiter's event loop is already closed
+                pass
+
+    async def wait(self, timeout: float, seen: Optional[int] = None):
+        """Wait for a notification, returns at once if there were any since `seen`."""
+        if seen is not None and seen != self.notifications:
+            return
+        waiter = asyncio.get_running_loop().create_future()
+        self.waiters.add(waiter)
+        try:
+            await asyncio.wait_for(waiter, timeout)
+        except asyncio.TimeoutError:
+            pass
+        finally:
+            self.waiters.discard(waiter)
+
+def _wake(waiter: asyncio.Future):
+    if not waiter.done():
+        waiter.set_result(None)
+
+# Recorded events wake the relay, numbered events the feed readers
+recorded_notifier = ChangeNotifier()
+change_notifier = ChangeNotifier()
+
+@event.listens_for(Session, "after_commit")
+def after_commit(session):
+    if session.info.pop("catalog_events", False):
+        recorded_notifier.notify()
+    if session.info.pop("sequenced_events", False):
+        change_notifier.notify()
+
+@event.listens_for(Session, "after_rollback")
+def after_rollback(session):
+    session.info.pop("catalog_events", None)
+    session.info.pop("sequenced_events", None)
@@ -0,0 +1,24 @@
+import base64
+import binascii
+import json
+import os
+from .exceptions import BadRequestException
+
+# Response header carrying the cursor of the next keyset page
+NEXT_CURSOR_HEADER = "X-Next-Cursor"
+# Largest page the list endpoints serve, larger limits are rejected with a 422
+MAX_PAGE_SIZE = int(os.getenv("MAX_PAGE_SIZE", "100"))
+
+def encode_cursor(last_id: int) -> str:
+    payload = json.dumps({"after": last_id}, separators=(",", ":")).encode()
+    return base64.urlsafe_b64encode(payload).rstrip(b"=").decode()
+
+def decode_cursor(cursor: str) -> int:
+    try:
+        padded = cursor + "=" * (-len(cursor) % 4)
+        last_id = json.loads(base64.urlsafe_b64decode(padded))["after"]
+    except (binascii.Error, ValueError, TypeError, KeyError):
+        raise BadRequestException("Invalid pagination cursor")
+    if not isinstance(last_id, int):
+        raise BadRequestException("Invalid pagination cursor")
+    return last_id
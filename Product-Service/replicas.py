@@ -0,0 +1,145 @@
+import asyncio
+import itertools
+import os
+import time
+from typing import List, Optional
+from fastapi import Request
+from sqlalchemy import event, make_url, text
+from sqlalchemy.ext.asyncio import async_sessionmaker, create_async_engine
+from .db import AsyncSessionLocal, engine_options, to_async_url
+
+# Comma separated replica URLs; without any, every read goes to the primary
+DATABASE_REPLICA_URLS = [url.strip() for url in os.getenv("DATABASE_REPLICA_URLS", "").split(",") if url.strip()]
+REPLICA_HEALTH_CHECK_INTERVAL = float(os.getenv("REPLICA_HEALTH_CHECK_INTERVAL", "5"))
+REPLICA_HEALTH_CHECK_TIMEOUT = float(os.getenv("REPLICA_HEALTH_CHECK_TIMEOUT", "2"))
+# Replicas lagging further behind (Postgres only) are taken out of rotation
+REPLICA_MAX_LAG = float(os.getenv("REPLICA_MAX_LAG", "30"))
+# Reads of a client that wrote within this many seconds go to the primary
+READ_YOUR_WRITES_WINDOW = float(os.getenv("READ_YOUR_WRITES_WINDOW", "5"))
+
+# Clients are told apart by this header, falling back to their address. Browsers
+# also get a cookie, which keeps them on the primary whichever worker serves them.
+CLIENT_ID_HEADER = "X-Client-ID"
+READ_PRIMARY_COOKIE = "read_primary_until"
+# Upper bound on tracked writers, expired entries are dropped past it
+MAX_TRACKED_WRITERS = 10000
+
+# Zero when the replica has replayed everything it received, so an idle
+# primary does not make its replicas look like they are lagging
+REPLICA_LAG_QUERY = text(
+    "SELECT CASE WHEN pg_last_wal_receive_lsn() = pg_last_wal_replay_lsn() THEN 0 "
+    "ELSE EXTRACT(EPOCH FROM now() - pg_last_xact_replay_timestamp()) END"
+)
+
+class Replica:
+    def __init__(self, url: str):
+        async_url = to_async_url(url)
+        self.name = make_url(async_url).render_as_string(hide_password=True)
+        self.engine = create_async_engine(async_url, **engine_options(async_url, is_async=True))
+        self.sessionmaker = async_sessionmaker(bind=self.engine, autoflush=False, expire_on_commit=False)
+        self.healthy = True
+        self.lag = None
+        event.listen(self.engine.sync_engine, "handle_error", self.on_error)
+
+    def on_error(self, context):
+        # A lost connection takes the replica out of rotation until its next successful check
+        if context.is_disconnect:
+            self.healthy = False
+
+    async def _measure_lag(self) -> Optional[float]:
+        async with self.engine.connect() as connection:
+            if self.engine.dialect.name != "postgresql":
+                await connection.execute(text("SELECT 1"))
+                return None
+            lag = await connection.scalar(REPLICA_LAG_QUERY)
+            return None if lag is None else float(lag)
+
+    async def check(self):
+        try:
+            self.lag = await asyncio.wait_for(self._measure_lag(), REPLICA_HEALTH_CHECK_TIMEOUT)
+            self.healthy = self.lag is None or self.lag <= REPLICA_MAX_LAG
+        except Exception as e:
+            print(f"Replica {self.name} failed its health check: {e!r}")
+            self.healthy = False
+
+class ReplicaRouter:
+    """Round-robin over the replicas that passed their last health check."""
+
+    def __init__(self, urls: List[str]):
+        self.replicas = [Replica(url) for url in urls]
+        self.counter = itertools.count()
+
+    def choose(self) -> Optional[Replica]:
+        healthy = [replica for replica in self.replicas if replica.healthy]
+        if not healthy:
+            return None
+        return healthy[next(self.counter) % len(healthy)]
+
+    async def check(self):
+        await asyncio.gather(*(replica.check() for replica in self.replicas))
+
+    def status(self) -> list:
+        return [{"replica": replica.name, "healthy": replica.healthy, "lag_seconds": replica.lag} for replica in self.replicas]
+
+replica_router = ReplicaRouter(DATABASE_REPLICA_URLS)
+
+class RecentWriters:
+    """Clients that wrote within the read-your-writes window, kept in memory per process."""
+
+    def __init__(self, window: float = READ_YOUR_WRITES_WINDOW):
+        self.window = window
+        self.until = {}
+
+    def record(self, client: str):
+        now = time.monotonic()
+        if len(self.until) >= MAX_TRACKED_WRITERS:
+            self.until = {key: until for key, until in self.until.items() if until > now}
+        self.until[client] = now + self.window
+
+    def wrote_recently(self, client: str) -> bool:
+        until = self.until.get(client)
+        return until is not None and until > time.monotonic()
+
+recent_writers = RecentWriters()
+
+def _client_key(headers: dict, client) -> str:
+    return headers.get(CLIENT_ID_HEADER.lower()) or (client[0] if client else "unknown")
+
+def reads_from_primary(request: Request) -> bool:
+    if recent_writers.wrote_recently(_client_key(request.headers, request.client)):
+        return True
+    try:
+        return float(request.cookies.get(READ_PRIMARY_COOKIE, 0)) > time.time()
+    except ValueError:
+        return False
+
+async def get_read_db(request: Request):
+    """Session for read-only routes: a healthy replica, or the primary right after the client wrote."""
+    replica = None if reads_from_primary(request) else replica_router.choose()
+    sessionmaker = replica.sessionmaker if replica is not None else AsyncSessionLocal
+    async with sessionmaker() as db:
+        yield db
+
+class ReadYourWritesMiddleware:
+    """Pure ASGI middleware remembering clients whose writes succeeded."""
+
+    SAFE_METHODS = ("GET", "HEAD", "OPTIONS")
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or scope["method"] in self.SAFE_METHODS or not replica_router.replicas:
+            return await self.app(scope, receive, send)
+        headers = {key.decode("latin-1"): value.decode("latin-1") for key, value in scope["headers"]}
+        client = _client_key(headers, scope.get("client"))
+
+        async def send_recording_writes(message):
+            if message["type"] == "http.response.start" and message["status"] < 400:
+                recent_writers.record(client)
+                until = time.time() + READ_YOUR_WRITES_WINDOW
+                cookie = f"{READ_PRIMARY_COOKIE}={until:.3f}; Max-Age={int(READ_YOUR_WRITES_WINDOW) + 1}; Path=/; HttpOnly; SameSite=Lax"
+                message = {**message, "headers": [*message.get("headers", []), (b"set-cookie", cookie.encode("latin-1"))]}
+            await send(message)
+
+        await self.app(scope, receive, send_recording_writes)
@@ -1,76 +1,154 @@
 import traceback
-from typing import List
-from sqlalchemy.orm import Session
-from fastapi import APIRouter, Depends, HTTPException
-from ..db import get_db
+from typing import List, Optional
+from sqlalchemy.ext.asyncio import AsyncSession
+from fastapi import APIRouter, Depends, Header, HTTPException, Query, Response
+from ..db import get_async_db
+from ..auth import require_writer
+from ..replicas import get_read_db
+from ..etag import etag_matches
+from ..pagination import MAX_PAGE_SIZE, NEXT_CURSOR_HEADER, encode_cursor, decode_cursor
+from ..serializers import category_adapter_for, category_fieldset, product_adapter_for, product_fieldset
 from ..schemas import (
     Category,
-    CategoryCreate
+    CategoryCreate,
+    CategoryNode,
+    Product
 )
 from ..services import (
     create_category,
-    retrieve_categories,
-    retrieve_category_by_name,
+    retrieve_category_rows,
+    retrieve_category_payload,
+    retrieve_category_tree,
+    retrieve_category_product_rows,
     update_category,
     delete_category
 )
 from ..exceptions import (
     NotFoundException,
     CategoryAlreadyTakenException,
-    BadRequestException
+    BadRequestException,
+    FetchTimeoutException
 )
 
 category_router = APIRouter()
 
 # Category endpoints
 @category_router.get("/categories/", response_model=List[Category], status_code=200)
-async def get_categories_route(skip: int = 0, limit: int = 10, db: Session = Depends(get_db)):
+async def get_categories_route(skip: int = Query(0, ge=0), limit: int = Query(10, ge=1, le=MAX_PAGE_SIZE), cursor: Optional[str] = None, fields: Optional[str] = None, db: AsyncSession = Depends(get_read_db)):
     try:
-        return retrieve_categories(db=db, skip=skip, limit=limit)
+        after_id = decode_cursor(cursor) if cursor else None
+        fieldset = category_fieldset(fields=fields)
+        categories = await retrieve_category_rows(db=db, skip=skip, limit=limit, after_id=after_id, fieldset=fieldset)
+        headers = {}
+        if categories and len(categories) == limit:
+            headers[NEXT_CURSOR_HEADER] = encode_cursor(categories[-1]["category_id"])
+        content = category_adapter_for(fieldset, many=True).dump_json(categories)
+        return Response(content=content, media_type="application/json", headers=headers)
+    except BadRequestException as error:
+        raise HTTPException(status_code=400, detail=str(error))
     except Exception as e:
         print(e)
         print(traceback.format_exc())
         raise HTTPException(status_code=500, detail="Internal Server Error")
     
+@category_router.get("/categories/tree/", response_model=List[CategoryNode], status_code=200)
+async def get_category_tree_route(root: Optional[str] = None, db: AsyncSession = Depends(get_read_db)):
+    """Navigation tree with subtree product counts, optionally only below the `root` category."""
+    try:
+        return await retrieve_category_tree(root_title=root, db=db)
+    except NotFoundException as error:
+        raise HTTPException(status_code=404, detail=str(error))
+    except Exception as e:
+        print(e)
+        print(traceback.format_exc())
+        raise HTTPException(status_code=500, detail="Internal Server Error")
+
+@category_router.get("/category/{category_title}/products/", response_model=List[Product], status_code=200)
+async def get_category_products_route(
+    category_title: str,
+    skip: int = Query(0, ge=0),
+    limit: int = Query(10, ge=1, le=MAX_PAGE_SIZE),
+    cursor: Optional[str] = None,
+    fields: Optional[str] = None,
+    include: Optional[str] = None,
+    db: AsyncSession = Depends(get_read_db),
+):
+    """Products of the category and all of its subcategories."""
+    try:
+        after_id = decode_cursor(cursor) if cursor else None
+        fieldset = product_fieldset(fields=fields, include=include)
+        products = await retrieve_category_product_rows(
+            category_name=category_title, skip=skip, limit=limit, after_id=after_id, fieldset=fieldset, db=db,
+        )
+        headers = {}
+        if products and len(products) == limit:
+            headers[NEXT_CURSOR_HEADER] = encode_cursor(products[-1]["product_id"])
+        content = product_adapter_for(fieldset, many=True).dump_json(products)
+        return Response(content=content, media_type="application/json", headers=headers)
+    except NotFoundException as error:
+        raise HTTPException(status_code=404, detail=str(error))
+    except BadRequestException as error:
+        raise HTTPException(status_code=400, detail=str(error))
+    except Exception as e:
+        print(e)
+        print(traceback.format_exc())
+        raise HTTPException(status_code=500, detail="Internal Server Error")
+
+# Stays on the primary: misses fill the shared cache, which a lagging replica
+# could refill with data older than the write that invalidated it
 @category_router.get("/category/{category_title}/", response_model=Category, status_code=200)
-async def get_category_by_name_route(category_title: str, db: Session = Depends(get_db)):
+async def get_category_by_name_route(category_title: str, fields: Optional[str] = None, if_none_match: Optional[str] = Header(None), db: AsyncSession = Depends(get_async_db)):
     try:
-        return retrieve_category_by_name(category_name=category_title, db=db)
+        fieldset = category_fieldset(fields=fields)
+        etag, payload = await retrieve_category_payload(category_name=category_title, fieldset=fieldset, db=db)
+        if etag_matches(if_none_match, etag):
+            return Response(status_code=304, headers={"ETag": etag})
+        return Response(content=payload, media_type="application/json", headers={"ETag": etag})
     except NotFoundException as error:
         raise HTTPException(status_code=404, detail=str(error))
+    except BadRequestException as error:
+        raise HTTPException(status_code=400, detail=str(error))
+    except FetchTimeoutException as error:
+        raise HTTPException(status_code=503, detail=str(error), headers={"Retry-After": "1"})
     except Exception as e:
         print(e)
         print(traceback.format_exc())
         raise HTTPException(status_code=500, detail="Internal Server Error")
 
 
-@category_router.post("/category/create/", response_model=Category, status_code=201)
-async def create_category_route(category: CategoryCreate, db: Session = Depends(get_db)):
+@category_router.post("/category/create/", response_model=Category, status_code=201, dependencies=[Depends(require_writer)])
+async def create_category_route(category: CategoryCreate, db: AsyncSession = Depends(get_async_db)):
     try:
-        return create_category(category=category, db=db)
+        return await create_category(category=category, db=db)
     except CategoryAlreadyTakenException as error:
         raise HTTPException(status_code=409, detail=str(error))
+    except NotFoundException as error:
+        raise HTTPException(status_code=404, detail=str(error))
     except Exception as e:
         print(e)
         print(traceback.format_exc())
         raise HTTPException(status_code=500, detail="Internal Server Error")
     
-@category_router.patch("/category/{category_id}/", response_model=Category, status_code=200)
-async def update_category_route(category_id: int, category: CategoryCreate, db: Session = Depends(get_db)):
+@category_router.patch("/category/{category_id}/", response_model=Category, status_code=200, dependencies=[Depends(require_writer)])
+async def update_category_route(category_id: int, category: CategoryCreate, db: AsyncSession = Depends(get_async_db)):
     try:
-        return update_category(category_id=category_id, updated_attributes=category, db=db)
+        return await update_category(category_id=category_id, updated_attributes=category, db=db)
+    except CategoryAlreadyTakenException as error:
+        raise HTTPException(status_code=409, detail=str(error))
     except NotFoundException as error:
         raise HTTPException(status_code=404, detail=str(error))
+    except BadRequestException as error:
+        raise HTTPException(status_code=400, detail=str(error))
     except Exception as e:
         print(e)
         print(traceback.format_exc())
         raise HTTPException(status_code=500, detail="Internal Server Error")
     
     
-@category_router.delete("/category/{category_id}/", status_code=204)
-async def delete_category_route(category_id: int, db: Session = Depends(get_db)):
+@category_router.delete("/category/{category_id}/", status_code=204, dependencies=[Depends(require_writer)])
+async def delete_category_route(category_id: int, db: AsyncSession = Depends(get_async_db)):
     try:
-        delete_category(category_id=category_id, db=db)
+        await delete_category(category_id=category_id, db=db)
         return {"detail": "Category deleted successfully"}
     except NotFoundException as error:
         raise HTTPException(status_code=404, detail=str(error))
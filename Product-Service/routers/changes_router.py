@@ -0,0 +1,76 @@
+import asyncio
+import os
+import time
+import traceback
+from typing import Optional
+from fastapi import APIRouter, Header, HTTPException, Query, Request
+from fastapi.responses import StreamingResponse
+from ..db import AsyncSessionLocal
+from ..outbox import change_notifier, retrieve_events
+from ..schemas import CatalogEvent, CatalogEventBatch
+
+# Seconds between database polls while waiting, bounds the delay for changes
+# committed by other processes
+CHANGE_FEED_POLL_INTERVAL = float(os.getenv("CHANGE_FEED_POLL_INTERVAL", "1"))
+# Comment line sent on idle event streams so proxies keep the connection open
+CHANGE_FEED_HEARTBEAT_INTERVAL = float(os.getenv("CHANGE_FEED_HEARTBEAT_INTERVAL", "15"))
+
+changes_router = APIRouter()
+
+# Both endpoints open a short session per read instead of depending on
+# get_async_db, which would hold a pooled connection while the client waits.
+async def _read_events(after: Optional[int], limit: int):
+    async with AsyncSessionLocal() as db:
+        return await retrieve_events(db=db, after=after, limit=limit)
+
+# Change feed endpoints
+@changes_router.get("/changes/", response_model=CatalogEventBatch, status_code=200)
+async def get_changes_route(
+    after: Optional[int] = None,
+    limit: int = Query(100, ge=1, le=1000),
+    wait: float = Query(0, ge=0, le=30),
+):
+    """Catalog events after the `after` sequence number, waiting up to `wait` seconds for new ones."""
+    try:
+        deadline = time.monotonic() + wait
+        while True:
+            events = await _read_events(after, limit)
+            remaining = deadline - time.monotonic()
+            if events or remaining <= 0:
+                break
+            await change_notifier.wait(min(remaining, CHANGE_FEED_POLL_INTERVAL))
+        return {"events": events, "last_seq": events[-1].seq if events else after}
+    except Exception as e:
+        print(e)
+        print(traceback.format_exc())
+        raise HTTPException(status_code=500, detail="Internal Server Error")
+
+@changes_router.get("/changes/stream/", status_code=200)
+async def stream_changes_route(
+    request: Request,
+    after: Optional[int] = None,
+    limit: int = Query(100, ge=1, le=1000),
+    last_event_id: Optional[int] = Header(None),
+):
+    """Server-sent events stream of catalog events. Reconnecting clients resume from Last-Event-ID."""
+    async def stream():
+        seq = last_event_id if last_event_id is not None else after
+        idle_since = time.monotonic()
+        while not await request.is_disconnected():
+            events = await _read_events(seq, limit)
+            if events:
+                # One write per batch, each event carries its seq as the SSE id
+                yield "".join(
+                    f"id: {event.seq}\nevent: change\ndata: {CatalogEvent.model_validate(event).model_dump_json()}\n\n"
+                    for event in events
+                )
+                seq = events[-1].seq
+                idle_since = time.monotonic()
+                if len(events) == limit:
+                    continue
+            elif time.monotonic() - idle_since >= CHANGE_FEED_HEARTBEAT_INTERVAL:
+                yield ": heartbeat\n\n"
+                idle_since = time.monotonic()
+            await change_notifier.wait(CHANGE_FEED_POLL_INTERVAL)
+
+    return StreamingResponse(stream(), media_type="text/event-stream", headers={"Cache-Control": "no-cache"})
@@ -0,0 +1,51 @@
+from fastapi import APIRouter, Response
+from .. import admission
+from ..cache import cache
+from ..db import pool_status
+from ..metrics import metrics
+from ..replicas import replica_router
+from ..singleflight import flights
+
+diagnostics_router = APIRouter()
+metrics_router = APIRouter()
+
+# Diagnostics endpoints
+@diagnostics_router.get("/cache/stats/", status_code=200)
+async def get_cache_stats_route():
+    return await cache.stats()
+
+@diagnostics_router.get("/diagnostics/pool/", status_code=200)
+async def get_pool_status_route():
+    return pool_status()
+
+@diagnostics_router.get("/diagnostics/replicas/", status_code=200)
+async def get_replica_status_route():
+    return replica_router.status()
+
+@diagnostics_router.get("/diagnostics/single-flight/", status_code=200)
+async def get_single_flight_stats_route():
+    return flights.stats()
+
+@diagnostics_router.get("/diagnostics/admission/", status_code=200)
+async def get_admission_stats_route():
+    return admission.admission.stats()
+
+@metrics_router.get("/metrics", include_in_schema=False)
+async def get_metrics_route():
+    cache_stats = await cache.stats()
+    lines = [metrics.render()]
+    for counter in ("hits", "misses", "evictions"):
+        lines.append(f"# TYPE cache_{counter}_total counter\ncache_{counter}_total {cache_stats[counter]}\n")
+    flight_stats = flights.stats()
+    for counter in ("leaders", "shared", "errors", "timeouts"):
+        lines.append(f"# TYPE single_flight_{counter}_total counter\nsingle_flight_{counter}_total {flight_stats[counter]}\n")
+    lines.append(f"# TYPE single_flight_in_flight gauge\nsingle_flight_in_flight {flight_stats['in_flight']}\n")
+    admission_stats = admission.admission.stats()
+    for counter in ("admitted", "limited_client", "limited_route", "store_errors", "shed"):
+        lines.append(f"# TYPE admission_{counter}_total counter\nadmission_{counter}_total {admission_stats[counter]}\n")
+    for gauge in ("in_flight", "queued"):
+        lines.append(f"# TYPE admission_{gauge} gauge\nadmission_{gauge} {admission_stats[gauge]}\n")
+    for name, value in pool_status().items():
+        if name != "pool_class":
+            lines.append(f"# TYPE db_pool_{name} gauge\ndb_pool_{name} {value}\n")
+    return Response(content="".join(lines), media_type="text/plain; version=0.0.4")
@@ -0,0 +1,73 @@
+import traceback
+from sqlalchemy.ext.asyncio import AsyncSession
+from fastapi import APIRouter, Depends, HTTPException
+from ..db import get_async_db
+from ..auth import require_writer
+from ..schemas import (
+    StockReservation,
+    StockReservationCreate
+)
+from ..services import (
+    reserve_stock,
+    retrieve_reservation,
+    commit_reservation,
+    release_reservation
+)
+from ..exceptions import (
+    NotFoundException,
+    InsufficientStockException,
+    ReservationStateException
+)
+
+inventory_router = APIRouter()
+
+# Inventory endpoints
+@inventory_router.post("/inventory/reservations/", response_model=StockReservation, status_code=201, dependencies=[Depends(require_writer)])
+async def reserve_stock_route(reservation: StockReservationCreate, db: AsyncSession = Depends(get_async_db)):
+    try:
+        return await reserve_stock(reservation=reservation, db=db)
+    except NotFoundException as error:
+        raise HTTPException(status_code=404, detail=str(error))
+    except InsufficientStockException as error:
+        raise HTTPException(status_code=409, detail=str(error))
+    except Exception as e:
+        print(e)
+        print(traceback.format_exc())
+        raise HTTPException(status_code=500, detail="Internal Server Error")
+
+@inventory_router.get("/inventory/reservations/{reservation_id}/", response_model=StockReservation, status_code=200)
+async def get_reservation_route(reservation_id: str, db: AsyncSession = Depends(get_async_db)):
+    try:
+        return await retrieve_reservation(reservation_id=reservation_id, db=db)
+    except NotFoundException as error:
+        raise HTTPException(status_code=404, detail=str(error))
+    except Exception as e:
+        print(e)
+        print(traceback.format_exc())
+        raise HTTPException(status_code=500, detail="Internal Server Error")
+
+@inventory_router.post("/inventory/reservations/{reservation_id}/commit/", response_model=StockReservation, status_code=200, dependencies=[Depends(require_writer)])
+async def commit_reservation_route(reservation_id: str, db: AsyncSession = Depends(get_async_db)):
+    try:
+        return await commit_reservation(reservation_id=reservation_id, db=db)
+    except NotFoundException as error:
+        raise HTTPException(status_code=404, detail=str(error))
+    except ReservationStateException as error:
+        raise HTTPException(status_code=409, detail=str(error))
+    except Exception as e:
+        print(e)
+        print(traceback.format_exc())
+        raise HTTPException(status_code=500, detail="Internal Server Error")
+
+@inventory_router.post("/inventory/reservations/{reservation_id}/release/", response_model=StockReservation, status_code=200, dependencies=[Depends(require_writer)])
+async def release_reservation_route(reservation_id: str, db: AsyncSession = Depends(get_async_db)):
+    try:
+        return await release_reservation(reservation_id=reservation_id, db=db)
+    except NotFoundException as error:
+        raise HTTPException(status_code=404, detail=str(error))
+    except ReservationStateException as error:
+        raise HTTPException(status_code=409, detail=str(error))
+    except Exception as e:
+        print(e)
+        print(traceback.format_exc())
+        raise HTTPException(status_code=500, detail="Internal Server Error")
@@ -1,11 +1,20 @@
 import traceback
-from typing import List
-from sqlalchemy.orm import Session
-from fastapi import APIRouter, Depends, HTTPException
-from ..db import get_db
+from typing import List, Optional
+from sqlalchemy.ext.asyncio import AsyncSession
+from fastapi import APIRouter, BackgroundTasks, Depends, Header, HTTPException, Query, Request, Response
+from fastapi.responses import RedirectResponse
+from ..db import get_async_db
+from ..auth import require_writer
+from ..replicas import get_read_db
+from ..etag import etag_matches
+from ..idempotency import IDEMPOTENT_REPLAYED_HEADER
+from ..tasks import process_uploaded_image
 from ..exceptions import (
     NotFoundException, 
-    EntityTooLargeException
+    EntityTooLargeException,
+    IdempotencyKeyConflictException,
+    BadRequestException,
+    UnsupportedMediaTypeException
 )
 from ..schemas import (
     ProductImage,
@@ -13,8 +22,11 @@ from ..schemas import (
 )
 from ..services import (
     retrieve_product_images,
+    retrieve_product_images_etag,
     retrieve_product_image,
+    retrieve_product_image_url,
     create_product_image,
+    upload_product_image,
     update_product_image,
     delete_product_image
 )
@@ -23,9 +35,14 @@ product_image_router = APIRouter()
 
 # Product Image Endpoints 
 @product_image_router.get("/product/{product_id}/images/", response_model=List[ProductImage], status_code=200)
-async def get_product_images_route(product_id: int, db: Session = Depends(get_db)):
+async def get_product_images_route(response: Response, product_id: int, if_none_match: Optional[str] = Header(None), db: AsyncSession = Depends(get_read_db)):
     try:
-        return retrieve_product_images(product_id=product_id, db=db)
+        etag = await retrieve_product_images_etag(product_id=product_id, db=db)
+        if etag is not None:
+            if etag_matches(if_none_match, etag):
+                return Response(status_code=304, headers={"ETag": etag})
+            response.headers["ETag"] = etag
+        return await retrieve_product_images(product_id=product_id, db=db)
     except NotFoundException as error:
         raise HTTPException(status_code=404, detail=str(error))
     except Exception as e:
@@ -34,9 +51,9 @@ async def get_product_images_route(product_id: int, db: Session = Depends(get_db
         raise HTTPException(status_code=500, detail="Internal Server Error")
     
 @product_image_router.get("/product/{product_id}/image/{image_id}/", response_model=ProductImage, status_code=200)
-def get_product_image_route(product_id: int, image_id: int, db: Session = Depends(get_db)):
+async def get_product_image_route(product_id: int, image_id: int, db: AsyncSession = Depends(get_read_db)):
     try:
-        return retrieve_product_image(product_id=product_id, image_id=image_id, db=db)
+        return await retrieve_product_image(product_id=product_id, image_id=image_id, db=db)
     except NotFoundException as error:
         raise HTTPException(status_code=404, detail=str(error))
     except Exception as e:
@@ -44,23 +61,73 @@ def get_product_image_route(product_id: int, image_id: int, db: Session = Depend
         print(traceback.format_exc())
         raise HTTPException(status_code=500, detail="Internal Server Error")
     
-@product_image_router.post("/product/{product_id}/image/", response_model=ProductImage, status_code=201)
-async def create_product_image_route(product_id: int, image: ProductImageCreate, db: Session = Depends(get_db)):
+@product_image_router.get("/product/{product_id}/image/{image_id}/content/", status_code=307)
+async def get_product_image_content_route(
+    product_id: int,
+    image_id: int,
+    width: Optional[int] = Query(None, gt=0),
+    accept: Optional[str] = Header(None),
+    db: AsyncSession = Depends(get_read_db),
+):
+    """Redirect to the variant closest to the requested width, WebP when the client accepts it."""
     try:
-        return create_product_image(product_id=product_id, product_image=image, db=db)
+        url = await retrieve_product_image_url(
+            product_id=product_id, image_id=image_id, width=width, accepts_webp="image/webp" in (accept or ""), db=db
+        )
+        return RedirectResponse(url, status_code=307, headers={"Vary": "Accept"})
     except NotFoundException as error:
         raise HTTPException(status_code=404, detail=str(error))
+    except Exception as e:
+        print(e)
+        print(traceback.format_exc())
+        raise HTTPException(status_code=500, detail="Internal Server Error")
+
+@product_image_router.post("/product/{product_id}/image/upload/", response_model=ProductImage, status_code=201, dependencies=[Depends(require_writer)])
+async def upload_product_image_route(product_id: int, request: Request, background_tasks: BackgroundTasks, db: AsyncSession = Depends(get_async_db)):
+    """Upload the raw image bytes as the request body, resized and WebP variants are added in the background."""
+    try:
+        image = await upload_product_image(
+            product_id=product_id, content_type=request.headers.get("content-type"), stream=request.stream(), db=db
+        )
+        background_tasks.add_task(process_uploaded_image, image.image_id)
+        return image
+    except NotFoundException as error:
+        raise HTTPException(status_code=404, detail=str(error))
+    except BadRequestException as error:
+        raise HTTPException(status_code=400, detail=str(error))
     except EntityTooLargeException as error:
+        raise HTTPException(status_code=413, detail=str(error))
+    except UnsupportedMediaTypeException as error:
+        raise HTTPException(status_code=415, detail=str(error))
+    except Exception as e:
+        print(e)
+        print(traceback.format_exc())
+        raise HTTPException(status_code=500, detail="Internal Server Error")
+
+@product_image_router.post("/product/{product_id}/image/", response_model=ProductImage, status_code=201, dependencies=[Depends(require_writer)])
+async def create_product_image_route(
+    product_id: int,
+    image: ProductImageCreate,
+    idempotency_key: Optional[str] = Header(None, max_length=255),
+    db: AsyncSession = Depends(get_async_db),
+):
+    try:
+        payload, replayed = await create_product_image(product_id=product_id, product_image=image, idempotency_key=idempotency_key, db=db)
+        headers = {IDEMPOTENT_REPLAYED_HEADER: "true"} if replayed else None
+        return Response(content=payload, status_code=201, media_type="application/json", headers=headers)
+    except NotFoundException as error:
+        raise HTTPException(status_code=404, detail=str(error))
+    except (EntityTooLargeException, IdempotencyKeyConflictException) as error:
         raise HTTPException(status_code=422, detail=str(error))
     except Exception as e:
         print(e)
         print(traceback.format_exc())
         raise HTTPException(status_code=500, detail="Internal Server Error")
 
-@product_image_router.patch("/product/{product_id}/image/{image_id}/", response_model=ProductImage, status_code=200)
-async def update_product_image_route(product_id: int, image_id: int, image: ProductImageCreate, db: Session = Depends(get_db)):
+@product_image_router.patch("/product/{product_id}/image/{image_id}/", response_model=ProductImage, status_code=200, dependencies=[Depends(require_writer)])
+async def update_product_image_route(product_id: int, image_id: int, image: ProductImageCreate, db: AsyncSession = Depends(get_async_db)):
     try:
-        return update_product_image(product_id=product_id, image_id=image_id, updated_attributes=image, db=db)
+        return await update_product_image(product_id=product_id, image_id=image_id, updated_attributes=image, db=db)
     except NotFoundException as error:
         raise HTTPException(status_code=404, detail=str(error))
     except Exception as e:
@@ -68,10 +135,10 @@ async def update_product_image_route(product_id: int, image_id: int, image: Prod
         print(traceback.format_exc())
         raise HTTPException(status_code=500, detail="Internal Server Error")
     
-@product_image_router.delete("/product/{product_id}/image/{image_id}/", status_code=204)
-async def delete_product_image_route(product_id: int, image_id: int, db: Session = Depends(get_db)):
+@product_image_router.delete("/product/{product_id}/image/{image_id}/", status_code=204, dependencies=[Depends(require_writer)])
+async def delete_product_image_route(product_id: int, image_id: int, db: AsyncSession = Depends(get_async_db)):
     try:
-        return delete_product_image(product_id=product_id, image_id=image_id, db=db)
+        return await delete_product_image(product_id=product_id, image_id=image_id, db=db)
     except NotFoundException as error:
         raise HTTPException(status_code=404, detail=str(error))
     except Exception as e:
@@ -1,65 +1,187 @@
 import traceback
-from typing import List
-from sqlalchemy.orm import Session
-from fastapi import APIRouter, Depends, HTTPException
-from ..db import get_db
+from typing import Dict, List, Optional
+from sqlalchemy.ext.asyncio import AsyncSession
+from fastapi import APIRouter, Body, Depends, Header, HTTPException, Query, Request, Response
+from ..db import get_async_db
+from ..auth import require_writer
+from ..replicas import get_read_db
+from ..pagination import MAX_PAGE_SIZE, NEXT_CURSOR_HEADER, encode_cursor, decode_cursor
+from ..importers import parse_import_stream
+from ..idempotency import IDEMPOTENT_REPLAYED_HEADER
+from ..etag import etag_matches
+from ..serializers import product_adapter_for, product_batch_adapter, product_fieldset
 from ..schemas import (
     Product,
     ProductCreate,
-    ProductUpdate
+    ProductUpdate,
+    ProductImportResult,
+    ProductSearchResult,
+    ProductBatch,
+    ProductBulkUpdateItem,
+    ProductBulkUpdateResult
 )
 from ..services import (
     create_product,
     update_product,
-    retrieve_products,
-    retrieve_product_by_id,
-    delete_product
+    retrieve_product_rows,
+    retrieve_products_etag,
+    retrieve_product_payload,
+    retrieve_products_by_ids,
+    delete_product,
+    import_products,
+    bulk_update_products,
+    search_products
 )
 from ..exceptions import (
     NotFoundException,
-    EntityTooLargeException
+    EntityTooLargeException,
+    BadRequestException,
+    UnsupportedMediaTypeException,
+    IdempotencyKeyConflictException,
+    FetchTimeoutException
 )
 
 product_router = APIRouter()
 
 # Product endpoints
 @product_router.get("/products/", response_model=List[Product], status_code=200)
-async def get_products_route(skip: int = 0, limit: int = 10, db: Session = Depends(get_db)):
+async def get_products_route(
+    skip: int = Query(0, ge=0),
+    limit: int = Query(10, ge=1, le=MAX_PAGE_SIZE),
+    cursor: Optional[str] = None,
+    fields: Optional[str] = None,
+    include: Optional[str] = None,
+    if_none_match: Optional[str] = Header(None),
+    db: AsyncSession = Depends(get_read_db),
+):
     try:
-        return retrieve_products(skip=skip, limit=limit, db=db)
+        after_id = decode_cursor(cursor) if cursor else None
+        fieldset = product_fieldset(fields=fields, include=include)
+        etag = await retrieve_products_etag(skip=skip, limit=limit, after_id=after_id, fieldset=fieldset, db=db)
+        if etag_matches(if_none_match, etag):
+            return Response(status_code=304, headers={"ETag": etag})
+        headers = {"ETag": etag}
+        products = await retrieve_product_rows(skip=skip, limit=limit, after_id=after_id, fieldset=fieldset, db=db)
+        if products and len(products) == limit:
+            headers[NEXT_CURSOR_HEADER] = encode_cursor(products[-1]["product_id"])
+        content = product_adapter_for(fieldset, many=True).dump_json(products)
+        return Response(content=content, media_type="application/json", headers=headers)
+    except BadRequestException as error:
+        raise HTTPException(status_code=400, detail=str(error))
     except Exception as e:
         print(e)
         print(traceback.format_exc())
         raise HTTPException(status_code=500, detail="Internal Server Error")
 
-@product_router.post("/product/create/", response_model=Product, status_code=201)
-async def create_product_route(product: ProductCreate, db: Session = Depends(get_db)):
+@product_router.post("/product/create/", response_model=Product, status_code=201, dependencies=[Depends(require_writer)])
+async def create_product_route(
+    product: ProductCreate,
+    idempotency_key: Optional[str] = Header(None, max_length=255),
+    db: AsyncSession = Depends(get_async_db),
+):
     try:
-        return create_product(product=product, db=db)
+        payload, replayed = await create_product(product=product, idempotency_key=idempotency_key, db=db)
+        headers = {IDEMPOTENT_REPLAYED_HEADER: "true"} if replayed else None
+        return Response(content=payload, status_code=201, media_type="application/json", headers=headers)
     except NotFoundException as error:
         raise HTTPException(status_code=404, detail=str(error))
-    except EntityTooLargeException as error:
+    except (EntityTooLargeException, IdempotencyKeyConflictException) as error:
         raise HTTPException(status_code=422, detail=str(error))
     except Exception as e:
         print(e)
         print(traceback.format_exc())
         raise HTTPException(status_code=500, detail="Internal Server Error")   
 
+@product_router.get("/products/batch/", response_model=ProductBatch, status_code=200)
+async def get_products_batch_route(ids: List[int] = Query(...), db: AsyncSession = Depends(get_read_db)):
+    try:
+        batch = await retrieve_products_by_ids(product_ids=ids, db=db)
+        return Response(content=product_batch_adapter.dump_json(batch), media_type="application/json")
+    except EntityTooLargeException as error:
+        raise HTTPException(status_code=422, detail=str(error))
+    except Exception as e:
+        print(e)
+        print(traceback.format_exc())
+        raise HTTPException(status_code=500, detail="Internal Server Error")
+
+@product_router.get("/products/search/", response_model=ProductSearchResult, status_code=200)
+async def search_products_route(
+    q: Optional[str] = None,
+    category: Optional[str] = None,
+    min_price: Optional[float] = None,
+    max_price: Optional[float] = None,
+    in_stock: bool = False,
+    skip: int = Query(0, ge=0),
+    limit: int = Query(10, ge=1, le=MAX_PAGE_SIZE),
+    db: AsyncSession = Depends(get_read_db),
+):
+    try:
+        return await search_products(
+            db=db, text=q, category_title=category, min_price=min_price, max_price=max_price,
+            in_stock=in_stock, skip=skip, limit=limit,
+        )
+    except Exception as e:
+        print(e)
+        print(traceback.format_exc())
+        raise HTTPException(status_code=500, detail="Internal Server Error")
+
+@product_router.post("/products/import/", response_model=ProductImportResult, status_code=200, dependencies=[Depends(require_writer)])
+async def import_products_route(request: Request, db: AsyncSession = Depends(get_async_db)):
+    """Import a JSON array, NDJSON or CSV catalog, streamed and inserted in chunks."""
+    try:
+        rows = parse_import_stream(content_type=request.headers.get("content-type"), stream=request.stream())
+        return await import_products(rows=rows, db=db)
+    except BadRequestException as error:
+        raise HTTPException(status_code=400, detail=str(error))
+    except UnsupportedMediaTypeException as error:
+        raise HTTPException(status_code=415, detail=str(error))
+    except Exception as e:
+        print(e)
+        print(traceback.format_exc())
+        raise HTTPException(status_code=500, detail="Internal Server Error")
+
+@product_router.patch("/products/bulk/", response_model=ProductBulkUpdateResult, status_code=200, dependencies=[Depends(require_writer)])
+async def bulk_update_products_route(updates: Dict[int, ProductBulkUpdateItem] = Body(...), db: AsyncSession = Depends(get_async_db)):
+    """Change the price and/or stock of many products, given as {product_id: {"price": ..., "quantity": ...}}."""
+    try:
+        return await bulk_update_products(updates=updates, db=db)
+    except EntityTooLargeException as error:
+        raise HTTPException(status_code=422, detail=str(error))
+    except Exception as e:
+        print(e)
+        print(traceback.format_exc())
+        raise HTTPException(status_code=500, detail="Internal Server Error")
+
+# Stays on the primary: misses fill the shared cache, which a lagging replica
+# could refill with data older than the write that invalidated it
 @product_router.get("/product/{product_id}/", response_model=Product, status_code=200)
-async def get_product_route(product_id: int, db: Session = Depends(get_db)):
+async def get_product_route(
+    product_id: int,
+    fields: Optional[str] = None,
+    include: Optional[str] = None,
+    if_none_match: Optional[str] = Header(None),
+):
     try:
-        return retrieve_product_by_id(product_id=product_id, db=db)
+        fieldset = product_fieldset(fields=fields, include=include)
+        etag, payload = await retrieve_product_payload(product_id=product_id, fieldset=fieldset)
+        if etag_matches(if_none_match, etag):
+            return Response(status_code=304, headers={"ETag": etag})
+        return Response(content=payload, media_type="application/json", headers={"ETag": etag})
     except NotFoundException as error:
         raise HTTPException(status_code=404, detail=str(error))
+    except BadRequestException as error:
+        raise HTTPException(status_code=400, detail=str(error))
+    except FetchTimeoutException as error:
+        raise HTTPException(status_code=503, detail=str(error), headers={"Retry-After": "1"})
     except Exception as e:
         print(e)
         print(traceback.format_exc())
         raise HTTPException(status_code=500, detail="Internal Server Error")
     
-@product_router.patch("/product/{product_id}/", response_model=Product, status_code=200)
-async def update_product_route(product_id: int, product: ProductUpdate, db: Session = Depends(get_db)):
+@product_router.patch("/product/{product_id}/", response_model=Product, status_code=200, dependencies=[Depends(require_writer)])
+async def update_product_route(product_id: int, product: ProductUpdate, db: AsyncSession = Depends(get_async_db)):
     try:
-        return update_product(product_id=product_id, updated_attributes=product, db=db)
+        return await update_product(product_id=product_id, updated_attributes=product, db=db)
     except NotFoundException as error:
         raise HTTPException(status_code=404, detail=str(error))
     except Exception as e:
@@ -67,10 +189,10 @@ async def update_product_route(product_id: int, product: ProductUpdate, db: Sess
         print(traceback.format_exc())
         raise HTTPException(status_code=500, detail="Internal Server Error")
     
-@product_router.delete("/product/{product_id}/", status_code=204)
-async def delete_product_route(product_id: int, db: Session = Depends(get_db)):
+@product_router.delete("/product/{product_id}/", status_code=204, dependencies=[Depends(require_writer)])
+async def delete_product_route(product_id: int, db: AsyncSession = Depends(get_async_db)):
     try:
-        return delete_product(product_id=product_id, db=db)
+        return await delete_product(product_id=product_id, db=db)
     except NotFoundException as error:
         raise HTTPException(status_code=404, detail=str(error))
     except Exception as e:
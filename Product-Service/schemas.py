@@ -1,5 +1,5 @@
 from typing import Optional, List
-from pydantic import BaseModel, ConfigDict, field_validator
+from pydantic import BaseModel, ConfigDict, Field, field_validator
 from datetime import datetime
 from .exceptions import EntityTooLargeException
 
@@ -8,7 +8,9 @@ class CategoryBase(BaseModel):
     category_title: str
 
 class CategoryCreate(CategoryBase):
-    pass
+    # Title of the parent category, None for a root category. On update the
+    # category is only moved when the field is sent.
+    parent_title: Optional[str] = None
 
 class Category(CategoryBase):
     category_id: int
@@ -17,6 +19,13 @@ class Category(CategoryBase):
     
     model_config = ConfigDict(from_attributes=True)
 
+class CategoryNode(BaseModel):
+    category_id: int
+    category_title: str
+    # Products in the category and all of its descendants
+    product_count: int
+    children: List["CategoryNode"] = []
+
 # Product Images
 class ProductImageBase(BaseModel):
     image_url: str
@@ -24,9 +33,20 @@ class ProductImageBase(BaseModel):
 class ProductImageCreate(ProductImageBase):
     pass
 
+class ProductImageVariant(BaseModel):
+    width: int
+    height: int
+    format: str
+    url: str
+    size: int
+
+    model_config = ConfigDict(from_attributes=True)
+
 class ProductImage(ProductImageBase):
     image_id: int
     product_id: int
+    # Resized and WebP copies of uploaded images, empty until they are generated
+    variants: List[ProductImageVariant] = []
     model_config = ConfigDict(from_attributes=True)
 
 # Product Schemas
@@ -41,11 +61,42 @@ class ProductCreate(ProductBase):
     images: Optional[List[ProductImageCreate]] = []
 
 
+def _reject_null(value):
+    # Fields left out keep their value, sending null would blank them
+    if value is None:
+        raise ValueError("may be left out but not null")
+    return value
+
 class ProductUpdate(ProductBase):
-    product_title: Optional[str]
-    product_description: Optional[str]
-    price: Optional[float]
-    quantity: Optional[int]
+    # Only the fields sent are written
+    product_title: Optional[str] = None
+    product_description: Optional[str] = None
+    price: Optional[float] = None
+    quantity: Optional[int] = None
+    # Moves the product to another category when set
+    category_title: Optional[str] = None
+
+    _not_null = field_validator("product_title", "product_description", "price", "quantity")(_reject_null)
+
+class ProductBulkUpdateItem(BaseModel):
+    price: Optional[float] = Field(None, ge=0)
+    quantity: Optional[int] = Field(None, ge=0)
+
+    _not_null = field_validator("price", "quantity")(_reject_null)
+
+class ProductBulkUpdateStatus(BaseModel):
+    product_id: int
+    # "updated", "unchanged", "not_found" or "failed"
+    status: str
+    detail: Optional[str] = None
+
+class ProductBulkUpdateResult(BaseModel):
+    updated: int
+    unchanged: int
+    not_found: int
+    failed: int
+    # In the order of the request
+    results: List[ProductBulkUpdateStatus]
 
 class Product(ProductBase):
     product_id: int
@@ -55,3 +106,64 @@ class Product(ProductBase):
     updated_at: datetime
 
     model_config = ConfigDict(from_attributes=True)
+
+# Bulk import Schemas
+class ProductImportError(BaseModel):
+    row: int
+    detail: str
+
+class ProductImportResult(BaseModel):
+    created: int
+    failed: int
+    errors: List[ProductImportError] = []
+
+# Search Schemas
+class CategoryFacet(BaseModel):
+    category_title: str
+    count: int
+
+class ProductSearchResult(BaseModel):
+    total: int
+    items: List[Product]
+    facets: List[CategoryFacet]
+
+# Batch Schemas
+class ProductBatch(BaseModel):
+    products: List[Product]
+    missing: List[int]
+
+# Inventory Schemas
+class StockReservationItem(BaseModel):
+    product_id: int
+    quantity: int = Field(gt=0)
+
+    model_config = ConfigDict(from_attributes=True)
+
+class StockReservationCreate(BaseModel):
+    items: List[StockReservationItem] = Field(min_length=1, max_length=100)
+    ttl_seconds: int = Field(default=900, gt=0, le=3600)
+
+class StockReservation(BaseModel):
+    reservation_id: str
+    status: str
+    items: List[StockReservationItem]
+    created_at: datetime
+    expires_at: datetime
+
+    model_config = ConfigDict(from_attributes=True)
+
+# Change feed Schemas
+class CatalogEvent(BaseModel):
+    seq: int
+    entity: str
+    entity_id: int
+    action: str
+    product_id: Optional[int] = None
+    created_at: datetime
+
+    model_config = ConfigDict(from_attributes=True)
+
+class CatalogEventBatch(BaseModel):
+    events: List[CatalogEvent]
+    # Pass back as `after` to continue where this batch ended
+    last_seq: Optional[int]
@@ -0,0 +1,24 @@
+from sqlalchemy import column, func, literal_column, table
+from .models import Product
+
+# Full-text matching per dialect, backed by the indexes declared in models.SEARCH_DDL
+products_fts = table("products_fts", column("rowid"), column("rank"))
+
+def fts5_query(text: str) -> str:
+    # Quote every term so user input is never parsed as FTS5 query syntax
+    terms = text.split()
+    return " ".join('"' + term.replace('"', '""') + '"' for term in terms)
+
+def apply_text_search(query, dialect: str, text: str):
+    """Filter a select over Product by a full-text query and order it by relevance."""
+    if dialect == "postgresql":
+        vector = literal_column("products.search_vector")
+        ts_query = func.websearch_to_tsquery("english", text)
+        return query.filter(vector.op("@@")(ts_query)).order_by(func.ts_rank(vector, ts_query).desc())
+    if dialect == "sqlite":
+        return (
+            query.join(products_fts, products_fts.c.rowid == Product.product_id)
+            .filter(literal_column("products_fts").op("MATCH")(fts5_query(text)))
+            .order_by(products_fts.c.rank)
+        )
+    raise NotImplementedError(f"Full-text search is not available on '{dialect}'")
@@ -0,0 +1,165 @@
+from datetime import datetime
+from functools import lru_cache
+from typing import List, Optional, Tuple
+from typing_extensions import TypedDict
+import pydantic_core
+from pydantic import TypeAdapter
+from starlette.responses import JSONResponse
+from .exceptions import BadRequestException
+
+# Fast serialization path for read endpoints: rows selected as plain tuples are
+# turned into dicts mirroring the schemas (same fields, same order) and dumped
+# by serializers built once, skipping per-row from_attributes validation.
+# The output is byte-for-byte what FastAPI renders through the response_model,
+# because the app renders those with PydanticJSONResponse below.
+
+class PydanticJSONResponse(JSONResponse):
+    """JSONResponse written by pydantic-core, like the serializers of this module.
+
+    json.dumps writes some floats differently (1e+16 where pydantic-core
+    writes 1e16), so endpoints on either path would disagree on the bytes
+    of the same row.
+    """
+
+    def render(self, content) -> bytes:
+        return pydantic_core.to_json(content)
+
+class CategoryRow(TypedDict):
+    category_title: str
+    category_id: int
+    created_at: datetime
+    updated_at: datetime
+
+class ProductImageVariantRow(TypedDict):
+    width: int
+    height: int
+    format: str
+    url: str
+    size: int
+
+class ProductImageRow(TypedDict):
+    image_url: str
+    image_id: int
+    product_id: int
+    variants: List[ProductImageVariantRow]
+
+class ProductRow(TypedDict):
+    product_title: str
+    product_description: str
+    price: float
+    quantity: int
+    product_id: int
+    category: Optional[CategoryRow]
+    images: List[ProductImageRow]
+    created_at: datetime
+    updated_at: datetime
+
+class ProductBatchRow(TypedDict):
+    products: List[ProductRow]
+    missing: List[int]
+
+product_adapter = TypeAdapter(ProductRow)
+product_list_adapter = TypeAdapter(List[ProductRow])
+product_batch_adapter = TypeAdapter(ProductBatchRow)
+category_adapter = TypeAdapter(CategoryRow)
+category_list_adapter = TypeAdapter(List[CategoryRow])
+
+# Sparse fieldsets: a fieldset is the tuple of keys a response carries, in
+# schema order. `fields=` picks scalar keys, `include=` picks embedded
+# relations; the ID is always returned since cursors and ETags rely on it.
+PRODUCT_FIELDSET = tuple(ProductRow.__annotations__)
+PRODUCT_EMBEDS = ("category", "images")
+PRODUCT_FIELDS = tuple(key for key in PRODUCT_FIELDSET if key not in PRODUCT_EMBEDS)
+CATEGORY_FIELDSET = tuple(CategoryRow.__annotations__)
+
+def _parse_names(value: str, allowed: Tuple[str, ...], parameter: str) -> set:
+    names = {name.strip() for name in value.split(",") if name.strip()}
+    unknown = names.difference(allowed)
+    if unknown:
+        raise BadRequestException(
+            f"Unknown {parameter} value(s) {', '.join(sorted(unknown))}, expected any of {', '.join(allowed)}"
+        )
+    return names
+
+def product_fieldset(fields: Optional[str] = None, include: Optional[str] = None) -> Tuple[str, ...]:
+    """Keys selected by the fields/include query parameters, everything when both are omitted."""
+    selected = set(PRODUCT_FIELDS) if fields is None else _parse_names(fields, PRODUCT_FIELDS, "fields") | {"product_id"}
+    selected |= set(PRODUCT_EMBEDS) if include is None else _parse_names(include, PRODUCT_EMBEDS, "include")
+    return tuple(key for key in PRODUCT_FIELDSET if key in selected)
+
+def category_fieldset(fields: Optional[str] = None) -> Tuple[str, ...]:
+    if fields is None:
+        return CATEGORY_FIELDSET
+    selected = _parse_names(fields, CATEGORY_FIELDSET, "fields") | {"category_id"}
+    return tuple(key for key in CATEGORY_FIELDSET if key in selected)
+
+# Response types are generated once per fieldset, there are at most a few
+# hundred combinations
+@lru_cache(maxsize=None)
+def _row_type(name: str, annotations: Tuple[Tuple[str, object], ...]):
+    return TypedDict(name, dict(annotations))
+
+@lru_cache(maxsize=None)
+def product_adapter_for(fieldset: Tuple[str, ...], many: bool = False) -> TypeAdapter:
+    if fieldset == PRODUCT_FIELDSET:
+        return product_list_adapter if many else product_adapter
+    row_type = _row_type("ProductRow", tuple((key, ProductRow.__annotations__[key]) for key in fieldset))
+    return TypeAdapter(List[row_type] if many else row_type)
+
+@lru_cache(maxsize=None)
+def category_adapter_for(fieldset: Tuple[str, ...], many: bool = False) -> TypeAdapter:
+    if fieldset == CATEGORY_FIELDSET:
+        return category_list_adapter if many else category_adapter
+    row_type = _row_type("CategoryRow", tuple((key, CategoryRow.__annotations__[key]) for key in fieldset))
+    return TypeAdapter(List[row_type] if many else row_type)
+
+def image_row(row, variants: Optional[List[ProductImageVariantRow]] = None) -> ProductImageRow:
+    return {"image_url": row.image_url, "image_id": row.image_id, "product_id": row.product_id, "variants": variants or []}
+
+def variant_row(row) -> ProductImageVariantRow:
+    return {"width": row.width, "height": row.height, "format": row.format, "url": row.url, "size": row.size}
+
+def product_row(row, images: List[ProductImageRow]) -> ProductRow:
+    """Build a product dict from a services.product_rows_query() row."""
+    category = None
+    if row.category_id is not None:
+        category = {
+            "category_title": row.category_title,
+            "category_id": row.category_id,
+            "created_at": row.category_created_at,
+            "updated_at": row.category_updated_at,
+        }
+    return {
+        "product_title": row.product_title,
+        "product_description": row.product_description,
+        # Float columns may come back as int or Decimal depending on the driver
+        "price": float(row.price) if row.price is not None else None,
+        "quantity": row.quantity,
+        "product_id": row.product_id,
+        "category": category,
+        "images": images,
+        "created_at": row.created_at,
+        "updated_at": row.updated_at,
+    }
+
+def partial_product_row(row, images: Optional[List[ProductImageRow]], fieldset: Tuple[str, ...]) -> dict:
+    """product_row for a narrowed fieldset, the row only carries the selected columns."""
+    product = {}
+    for key in fieldset:
+        if key == "category":
+            product[key] = category_row(row, prefix="category_") if row.category_id is not None else None
+        elif key == "images":
+            product[key] = images
+        elif key == "price":
+            product[key] = float(row.price) if row.price is not None else None
+        else:
+            product[key] = getattr(row, key)
+    return product
+
+def category_row(row, fieldset: Tuple[str, ...] = CATEGORY_FIELDSET, prefix: str = "") -> dict:
+    """Category dict from a row; embedded categories label their timestamps with a prefix."""
+    category = {}
+    for key in fieldset:
+        column = prefix + key if key in ("created_at", "updated_at") else key
+        category[key] = getattr(row, column)
+    return category
@@ -1,171 +1,1035 @@
-from sqlalchemy.orm import Session
-from datetime import datetime, timezone
-from .models import Category, Product, ProductImage
+import os
+import uuid
+from typing import AsyncIterator, Dict, Iterable, List, Optional, Tuple
+from pydantic import ValidationError
+from sqlalchemy import Float, Integer, String, bindparam, delete, exists, func, insert, literal, select, update
+from sqlalchemy.exc import SQLAlchemyError
+from sqlalchemy.orm import joinedload, selectinload
+from sqlalchemy.orm.attributes import set_committed_value
+from sqlalchemy.ext.asyncio import AsyncSession
+from datetime import timedelta
+from .db import AsyncSessionLocal
+from .models import Category, Product, ProductImage, ProductImageVariant, StockReservation, StockReservationItem, utc_now
+from .cache import cache, category_key, product_key
+from .singleflight import flights
+from .etag import make_etag, pack, unpack
+from .idempotency import commit_idempotent, fingerprint, replay_idempotent
+from .outbox import catalog_event, record_events
+from .search import apply_text_search
+from .storage import image_store
+from .imaging import IMAGE_CONTENT_TYPES, VARIANT_EXTENSIONS, choose_variant, inspect_image_in_pool, render_variants_in_pool
+from .serializers import (
+    CATEGORY_FIELDSET,
+    PRODUCT_FIELDSET,
+    category_adapter_for,
+    category_row,
+    image_row,
+    variant_row,
+    partial_product_row,
+    product_adapter_for,
+    product_row
+)
 from .schemas import (CategoryCreate,
-                      ProductCreate, 
+                      StockReservationCreate,
+                      ProductCreate,
                       ProductUpdate,
-                      ProductImageCreate
+                      ProductBulkUpdateItem,
+                      ProductImageCreate,
+                      Category as CategorySchema,
+                      Product as ProductSchema,
+                      ProductImage as ProductImageSchema
 )
 from .exceptions import (
-    CategoryAlreadyTakenException, 
-    NotFoundException, 
+    CategoryAlreadyTakenException,
+    NotFoundException,
     EntityTooLargeException,
-    BadRequestException
+    BadRequestException,
+    InsufficientStockException,
+    ReservationStateException,
+    UnsupportedMediaTypeException
 )
 
+# Relationships embedded in schemas.Product, loaded in three statements per query
+PRODUCT_LOAD_OPTIONS = (joinedload(Product.category), selectinload(Product.images).selectinload(ProductImage.variants))
+
+def _paginate(query, id_column, skip: int, limit: int, after_id: Optional[int]):
+    query = query.order_by(id_column)
+    # Keyset mode seeks on the primary key instead of scanning past the offset
+    if after_id is not None:
+        query = query.filter(id_column > after_id)
+    else:
+        query = query.offset(skip)
+    return query.limit(limit)
+
+# Columns behind each serializers.ProductRow key, selected only when the key is requested
+PRODUCT_ROW_COLUMNS = {
+    "product_title": (Product.product_title,),
+    "product_description": (Product.product_description,),
+    "price": (Product.price,),
+    "quantity": (Product.quantity,),
+    "category": (
+        Category.category_title,
+        Category.category_id,
+        Category.created_at.label("category_created_at"),
+        Category.updated_at.label("category_updated_at"),
+        Category.version.label("category_version"),
+    ),
+    "created_at": (Product.created_at,),
+    "updated_at": (Product.updated_at,),
+}
+
+def product_rows_query(fieldset: Tuple[str, ...] = PRODUCT_FIELDSET):
+    """Columns of the fieldset (plus ID and version) as plain rows, for the fast serialization path."""
+    columns = [Product.product_id, Product.version]
+    for key in fieldset:
+        columns.extend(PRODUCT_ROW_COLUMNS.get(key, ()))
+    query = select(*columns)
+    if "category" in fieldset:
+        query = query.join(Category, Product.category_id == Category.category_id, isouter=True)
+    return query
+
+async def fetch_product_rows(query, db: AsyncSession, fieldset: Tuple[str, ...] = PRODUCT_FIELDSET) -> Tuple[list, List[dict]]:
+    """Run a product_rows_query() and, if requested, load the images of all rows with one more query."""
+    rows = (await db.execute(query)).all()
+    images = {}
+    if rows and "images" in fieldset:
+        # Variants are joined in, an image repeats once per variant
+        image_rows = await db.execute(
+            select(
+                ProductImage.image_url, ProductImage.image_id, ProductImage.product_id,
+                ProductImageVariant.width, ProductImageVariant.height, ProductImageVariant.format,
+                ProductImageVariant.url, ProductImageVariant.size,
+            )
+            .join(ProductImageVariant, ProductImageVariant.image_id == ProductImage.image_id, isouter=True)
+            .filter(ProductImage.product_id.in_([row.product_id for row in rows]))
+            .order_by(ProductImage.image_id, ProductImageVariant.width, ProductImageVariant.format)
+        )
+        image = None
+        for image_variant in image_rows:
+            if image is None or image["image_id"] != image_variant.image_id:
+                image = image_row(image_variant)
+                images.setdefault(image_variant.product_id, []).append(image)
+            if image_variant.width is not None:
+                image["variants"].append(variant_row(image_variant))
+    if fieldset == PRODUCT_FIELDSET:
+        return rows, [product_row(row, images.get(row.product_id, [])) for row in rows]
+    return rows, [partial_product_row(row, images.get(row.product_id, []), fieldset) for row in rows]
+
+def category_etag(category: Category) -> str:
+    return make_etag("category", category.category_id, category.version, category.updated_at)
+
+def product_etag(product_id: int, version: int, updated_at, category_version: Optional[int]) -> str:
+    return make_etag("product", product_id, version, updated_at, category_version)
+
 # Category services
-def create_category(category: CategoryCreate, db: Session):
-    if db.query(Category).filter(Category.category_title == category.category_title).first():
+def _path_ids(path: str) -> List[int]:
+    return [int(category_id) for category_id in path.strip("/").split("/") if category_id]
+
+def _parent_path(path: str) -> str:
+    return path.rsplit("/", 2)[0] + "/"
+
+async def _add_to_product_counts(deltas_by_path: Dict[str, int], db: AsyncSession):
+    """Add product count deltas, keyed by category path, to each category and all of its ancestors."""
+    deltas = {}
+    for path, delta in deltas_by_path.items():
+        for category_id in _path_ids(path):
+            deltas[category_id] = deltas.get(category_id, 0) + delta
+    category_ids_by_delta = {}
+    for category_id, delta in deltas.items():
+        if delta:
+            category_ids_by_delta.setdefault(delta, []).append(category_id)
+    # One statement per distinct delta, usually just one. IDs are sorted so
+    # concurrent writers lock shared ancestors in the same order.
+    for delta, category_ids in category_ids_by_delta.items():
+        await db.execute(
+            update(Category)
+            .filter(Category.category_id.in_(sorted(category_ids)))
+            .values(product_count=Category.product_count + delta)
+            .execution_options(synchronize_session=False)
+        )
+
+async def create_category(category: CategoryCreate, db: AsyncSession):
+    if await db.scalar(select(Category).filter(Category.category_title == category.category_title)):
         raise CategoryAlreadyTakenException(f"Category with title '{category.category_title}' already taken")
-    db_category = Category(**category.model_dump())
+    parent = None
+    if category.parent_title is not None:
+        parent = await retrieve_category_by_name(category_name=category.parent_title, db=db)
+    db_category = Category(category_title=category.category_title, parent_id=parent.category_id if parent else None)
 
     db.add(db_category)
-    db.commit()
-    db.refresh(db_category)
+    # The path ends with the category's own ID
+    await db.flush()
+    db_category.path = f"{parent.path if parent else '/'}{db_category.category_id}/"
+    await record_events(db, [catalog_event("category", db_category.category_id, "created")])
+    await db.commit()
+    await db.refresh(db_category)
 
     return db_category
 
-def retrieve_categories(db: Session, skip: int = 0, limit: int = 10):
-    return db.query(Category).offset(skip).limit(limit).all()
+def category_rows_query(fieldset: Tuple[str, ...] = CATEGORY_FIELDSET):
+    return select(Category.category_id, Category.version, *(getattr(Category, key) for key in fieldset if key != "category_id"))
+
+async def retrieve_category_rows(
+    db: AsyncSession,
+    skip: int = 0,
+    limit: int = 10,
+    after_id: Optional[int] = None,
+    fieldset: Tuple[str, ...] = CATEGORY_FIELDSET,
+) -> List[dict]:
+    query = _paginate(category_rows_query(fieldset), Category.category_id, skip, limit, after_id)
+    return [category_row(row, fieldset) for row in await db.execute(query)]
 
-def retrieve_category_by_name(category_name: str, db: Session):
-    category = db.query(Category).filter(Category.category_title == category_name).first()
+async def retrieve_category_by_name(category_name: str, db: AsyncSession):
+    category = await db.scalar(select(Category).filter(Category.category_title == category_name))
     if category is None:
         raise NotFoundException(f"Category with title '{category_name}' not found")
     return category
 
-def update_category(category_id: int, updated_attributes: CategoryCreate, db: Session):
-    db_category = db.query(Category).filter(Category.category_id == category_id).first()
+async def retrieve_category_payload(category_name: str, db: AsyncSession, fieldset: Tuple[str, ...] = CATEGORY_FIELDSET) -> Tuple[str, bytes]:
+    """ETag and serialized schemas.Category, read through the cache unless narrowed to a fieldset."""
+    if fieldset != CATEGORY_FIELDSET:
+        row = (await db.execute(category_rows_query(fieldset).filter(Category.category_title == category_name))).first()
+        if row is None:
+            raise NotFoundException(f"Category with title '{category_name}' not found")
+        etag = make_etag("category", row.category_id, row.version, *fieldset)
+        return etag, category_adapter_for(fieldset).dump_json(category_row(row, fieldset))
+
+    async def load():
+        # Shared by concurrent requests, see retrieve_product_payload
+        async with AsyncSessionLocal() as session:
+            category = await retrieve_category_by_name(category_name=category_name, db=session)
+        return pack(category_etag(category), CategorySchema.model_validate(category).model_dump_json().encode())
+    return unpack(await cache.read_through(category_key(category_name), load))
+
+async def retrieve_category_tree(db: AsyncSession, root_title: Optional[str] = None) -> List[dict]:
+    """Categories nested under their parents with subtree product counts, read in one query."""
+    query = select(Category.category_id, Category.category_title, Category.parent_id, Category.product_count)
+    if root_title is not None:
+        root = await retrieve_category_by_name(category_name=root_title, db=db)
+        query = query.filter(Category.path.like(root.path + "%"))
+    nodes = {}
+    roots = []
+    # A path sorts before every path it prefixes, so parents come before their children
+    for row in await db.execute(query.order_by(Category.path)):
+        node = {
+            "category_id": row.category_id,
+            "category_title": row.category_title,
+            "product_count": row.product_count,
+            "children": [],
+        }
+        nodes[row.category_id] = node
+        parent = nodes.get(row.parent_id)
+        (parent["children"] if parent is not None else roots).append(node)
+    for node in [*nodes.values(), {"children": roots}]:
+        node["children"].sort(key=lambda child: child["category_title"])
+    return roots
+
+async def retrieve_category_product_rows(
+    category_name: str,
+    db: AsyncSession,
+    skip: int = 0,
+    limit: int = 10,
+    after_id: Optional[int] = None,
+    fieldset: Tuple[str, ...] = PRODUCT_FIELDSET,
+) -> List[dict]:
+    """Products of the category and all of its descendants, as serializers.ProductRow dicts."""
+    category = await retrieve_category_by_name(category_name=category_name, db=db)
+    subtree = select(Category.category_id).filter(Category.path.like(category.path + "%"))
+    query = _paginate(product_rows_query(fieldset).filter(Product.category_id.in_(subtree)), Product.product_id, skip, limit, after_id)
+    _, products = await fetch_product_rows(query, db, fieldset)
+    return products
+
+async def _move_category(category: Category, parent_title: Optional[str], db: AsyncSession):
+    parent = None
+    if parent_title is not None:
+        parent = await retrieve_category_by_name(category_name=parent_title, db=db)
+        if parent.path.startswith(category.path):
+            raise BadRequestException("A category cannot be moved under itself or one of its subcategories")
+    if category.parent_id == (parent.category_id if parent else None):
+        return
+    old_path = category.path
+    new_path = f"{parent.path if parent else '/'}{category.category_id}/"
+    # The old ancestors lose the subtree's products and the new ones gain them,
+    # ancestors shared by both paths net to zero and are left alone
+    await _add_to_product_counts({
+        _parent_path(old_path): -category.product_count,
+        _parent_path(new_path): category.product_count,
+    }, db)
+    await db.execute(
+        update(Category)
+        .filter(Category.path.like(old_path + "%"))
+        .values(path=literal(new_path, String).concat(func.substr(Category.path, len(old_path) + 1)))
+        .execution_options(synchronize_session=False)
+    )
+    category.parent_id = parent.category_id if parent else None
+    category.path = new_path
+
+async def update_category(category_id: int, updated_attributes: CategoryCreate, db: AsyncSession):
+    db_category = await db.scalar(select(Category).filter(Category.category_id == category_id).with_for_update())
     if db_category is None:
         raise NotFoundException(f"Category with ID {category_id} not found")
+    taken = await db.scalar(select(Category.category_id).filter(
+        Category.category_title == updated_attributes.category_title, Category.category_id != category_id,
+    ))
+    if taken is not None:
+        raise CategoryAlreadyTakenException(f"Category with title '{updated_attributes.category_title}' already taken")
+    if "parent_title" in updated_attributes.model_fields_set:
+        await _move_category(db_category, updated_attributes.parent_title, db)
+    old_title = db_category.category_title
     db_category.category_title = updated_attributes.category_title
-    db_category.updated_at = datetime.now(tz=timezone.utc)
+    db_category.updated_at = utc_now()
+    db_category.version += 1
 
-    db.commit()
-    db.refresh(db_category)
+    await record_events(db, [catalog_event("category", category_id, "updated")])
+    await db.commit()
+    await db.refresh(db_category)
+
+    # Cached products embed the category, drop them along with both titles
+    product_ids = (await db.scalars(select(Product.product_id).filter(Product.category_id == category_id))).all()
+    await cache.delete([category_key(old_title), category_key(db_category.category_title), *map(product_key, product_ids)])
 
     return db_category
 
-def delete_category(category_id: int, db: Session):
-    category = db.query(Category).filter(Category.category_id == category_id).first()
+async def delete_category(category_id: int, db: AsyncSession):
+    category = await db.scalar(select(Category).filter(Category.category_id == category_id))
     if category is None:
         raise NotFoundException(f"Category with ID {category_id} not found")
-    
-    products = db.query(Product).filter(Product.category_id == category_id).all()
-    if products:
+
+    if await db.scalar(select(exists().where(Product.category_id == category_id))):
         raise BadRequestException("Cannot delete category as it has associated products")
-    
-    db.delete(category)
-    db.commit()
+    if await db.scalar(select(exists().where(Category.parent_id == category_id))):
+        raise BadRequestException("Cannot delete category as it has subcategories")
+
+    await db.delete(category)
+    await record_events(db, [catalog_event("category", category_id, "deleted")])
+    await db.commit()
+    await cache.delete([category_key(category.category_title)])
     return {"success": True, "message": f"Category with ID {category_id} deleted successfully"}
 
 # Product services
-def create_product(product: ProductCreate, db: Session):
-    category = db.query(Category).filter(Category.category_title == product.category_title).first()
+MAX_PRODUCT_IMAGES = 5
+
+async def create_product(product: ProductCreate, db: AsyncSession, idempotency_key: Optional[str] = None) -> Tuple[bytes, bool]:
+    """Serialized schemas.Product of the new product, and whether it replays an earlier request."""
+    request_hash = fingerprint(product.model_dump_json())
+    if idempotency_key is not None:
+        stored = await replay_idempotent("product", idempotency_key, request_hash, db)
+        if stored is not None:
+            return stored, True
+    category = await db.scalar(select(Category).filter(Category.category_title == product.category_title))
     if category is None:
         raise NotFoundException(f"Category with title '{product.category_title}' not found")
-    if len(product.images) > 5:
-        raise EntityTooLargeException("You can upload a maximum of 5 images")
-    # Creating a new product
+    images = product.images or []
+    if len(images) > MAX_PRODUCT_IMAGES:
+        raise EntityTooLargeException(f"You can upload a maximum of {MAX_PRODUCT_IMAGES} images")
     db_product = Product(
         product_title = product.product_title,
         product_description = product.product_description,
         category=category,
         price=product.price,
         quantity=product.quantity,
+        images=[],
     )
 
     db.add(db_product)
-    db.commit()
-    db.refresh(db_product)
-    # Adding images to the product
-    for image in product.images:
-        db_image = ProductImage(
-            image_url=image.image_url,
-            product_id=db_product.product_id
+    # Flush for the product ID, then insert every image in one multi-row statement.
+    # RETURNING rows carry their own URL, so the order the database returns them in is irrelevant.
+    await db.flush()
+    await _add_to_product_counts({category.path: 1}, db)
+    image_rows = []
+    if images:
+        result = await db.execute(
+            insert(ProductImage)
+            .values([{"product_id": db_product.product_id, "image_url": image.image_url} for image in images])
+            .returning(ProductImage.image_url, ProductImage.image_id, ProductImage.product_id)
         )
-        db.add(db_image)
-    db.commit()
-    db.refresh(db_product)
-
-    return db_product
+        image_rows = sorted(result, key=lambda row: row.image_id)
+    response = ProductSchema.model_validate(db_product).model_copy(
+        update={"images": [ProductImageSchema.model_validate(row) for row in image_rows]}
+    )
+    payload = response.model_dump_json().encode()
+    await record_events(db, [catalog_event("product", db_product.product_id, "created")])
+    return await commit_idempotent("product", idempotency_key, request_hash, payload, db)
 
-def update_product(product_id: int, updated_attributes: ProductUpdate, db: Session):
-    db_product = db.query(Product).filter(Product.product_id == product_id).first()
+async def update_product(product_id: int, updated_attributes: ProductUpdate, db: AsyncSession):
+    db_product = await db.scalar(select(Product).options(*PRODUCT_LOAD_OPTIONS).filter(Product.product_id == product_id))
     if db_product is None:
         raise NotFoundException(f"Product with ID {product_id} not found")
-    db_product.product_title = updated_attributes.product_title
-    db_product.product_description = updated_attributes.product_description
-    db_product.price = updated_attributes.price
-    db_product.quantity = updated_attributes.quantity
-    db_product.updated_at = datetime.now(tz=timezone.utc)
-    
-    db.commit()
-    db.refresh(db_product)
+    changes = updated_attributes.model_dump(exclude_unset=True, exclude={"category_title"})
+    for field, value in changes.items():
+        setattr(db_product, field, value)
+    old_category = db_product.category
+    moved = updated_attributes.category_title is not None and (old_category is None or updated_attributes.category_title != old_category.category_title)
+    if not changes and not moved:
+        return db_product
+    if moved:
+        category = await db.scalar(select(Category).filter(Category.category_title == updated_attributes.category_title))
+        if category is None:
+            raise NotFoundException(f"Category with title '{updated_attributes.category_title}' not found")
+        deltas = {category.path: 1}
+        if old_category is not None:
+            deltas[old_category.path] = -1
+        await _add_to_product_counts(deltas, db)
+        db_product.category = category
+    db_product.updated_at = utc_now()
+    db_product.version += 1
+
+    await record_events(db, [catalog_event("product", product_id, "updated")])
+    await db.commit()
+    await cache.delete([product_key(product_id)])
 
     return db_product
-    
-def retrieve_products(db: Session, skip: int = 0, limit: int = 10):
-    products = db.query(Product).offset(skip).limit(limit).all()
+
+async def retrieve_products(db: AsyncSession, skip: int = 0, limit: int = 10, after_id: Optional[int] = None):
+    query = _paginate(select(Product).options(*PRODUCT_LOAD_OPTIONS), Product.product_id, skip, limit, after_id)
+    products = (await db.scalars(query)).all()
+    return products
+
+async def retrieve_product_rows(
+    db: AsyncSession,
+    skip: int = 0,
+    limit: int = 10,
+    after_id: Optional[int] = None,
+    fieldset: Tuple[str, ...] = PRODUCT_FIELDSET,
+) -> List[dict]:
+    """retrieve_products as serializers.ProductRow dicts, narrowed to the fieldset."""
+    query = _paginate(product_rows_query(fieldset), Product.product_id, skip, limit, after_id)
+    _, products = await fetch_product_rows(query, db, fieldset)
     return products
 
-def retrieve_product_by_id(product_id: int, db: Session):
-    product = db.query(Product).filter(Product.product_id == product_id).first()
+async def retrieve_products_etag(
+    db: AsyncSession,
+    skip: int = 0,
+    limit: int = 10,
+    after_id: Optional[int] = None,
+    fieldset: Tuple[str, ...] = PRODUCT_FIELDSET,
+) -> str:
+    """ETag of a product page from version columns only, without loading the page."""
+    if "category" in fieldset:
+        query = select(Product.product_id, Product.version, Category.version).join(Category, isouter=True)
+    else:
+        query = select(Product.product_id, Product.version)
+    versions = (await db.execute(_paginate(query, Product.product_id, skip, limit, after_id))).tuples().all()
+    if fieldset == PRODUCT_FIELDSET:
+        return make_etag("products", *versions)
+    return make_etag("products", fieldset, *versions)
+
+async def retrieve_product_by_id(product_id: int, db: AsyncSession):
+    product = await db.scalar(select(Product).options(*PRODUCT_LOAD_OPTIONS).filter(Product.product_id == product_id))
     if product is None:
         raise NotFoundException(f"Product with ID {product_id} not found")
     return product
 
-def delete_product(product_id: int, db: Session):
-    product = db.query(Product).filter(Product.product_id == product_id).first()
-    if product is None:
+MAX_BATCH_SIZE = 200
+
+async def retrieve_products_by_ids(product_ids: List[int], db: AsyncSession):
+    if len(product_ids) > MAX_BATCH_SIZE:
+        raise EntityTooLargeException(f"You can request a maximum of {MAX_BATCH_SIZE} products at once")
+    unique_ids = list(dict.fromkeys(product_ids))
+    _, products = await fetch_product_rows(product_rows_query().filter(Product.product_id.in_(unique_ids)), db)
+    found = {product["product_id"]: product for product in products}
+    # Keep the requested order, report unknown IDs instead of failing the batch
+    return {
+        "products": [found[product_id] for product_id in unique_ids if product_id in found],
+        "missing": [product_id for product_id in unique_ids if product_id not in found],
+    }
+
+async def retrieve_product_payload(product_id: int, fieldset: Tuple[str, ...] = PRODUCT_FIELDSET) -> Tuple[str, bytes]:
+    """ETag and serialized schemas.Product, read through the cache unless narrowed to a fieldset."""
+    async def load():
+        # The load is shared by concurrent requests and outlives any one of
+        # them, so it reads on the primary in a session of its own
+        async with AsyncSessionLocal() as db:
+            query = product_rows_query(fieldset).filter(Product.product_id == product_id)
+            rows, products = await fetch_product_rows(query, db, fieldset)
+        if not rows:
+            raise NotFoundException(f"Product with ID {product_id} not found")
+        row = rows[0]
+        if fieldset == PRODUCT_FIELDSET:
+            etag = product_etag(row.product_id, row.version, row.updated_at, row.category_version)
+        else:
+            category_version = row.category_version if "category" in fieldset else None
+            etag = make_etag("product", row.product_id, row.version, category_version, *fieldset)
+        return pack(etag, product_adapter_for(fieldset).dump_json(products[0]))
+    # Only the full representation is cached, narrowed ones are cheap to build
+    # but still coalesced, a hot product is often read with the same fields
+    if fieldset != PRODUCT_FIELDSET:
+        return unpack(await flights.do(product_key(product_id), load, variant=fieldset))
+    return unpack(await cache.read_through(product_key(product_id), load))
+
+async def delete_product(product_id: int, db: AsyncSession):
+    row = (await db.execute(
+        select(Product, Category.path)
+        .join(Category, Product.category_id == Category.category_id, isouter=True)
+        .options(selectinload(Product.images))
+        .filter(Product.product_id == product_id)
+    )).first()
+    if row is None:
         raise NotFoundException(f"Product with ID {product_id} not found")
-    db.delete(product)
-    db.commit()
+    product, category_path = row
+    if category_path is not None:
+        await _add_to_product_counts({category_path: -1}, db)
+    stored_keys = []
+    for db_image in product.images:
+        stored_keys += await _delete_stored_image(db_image, db)
+        await db.delete(db_image)
+    await db.delete(product)
+    await record_events(db, [catalog_event("product", product_id, "deleted")])
+    await db.commit()
+    await cache.delete([product_key(product_id)])
+    await image_store.delete(stored_keys)
     return {"success": True, "message": f"Product with ID {product_id} deleted successfully"}
 
+# Product search services
+async def search_products(
+    db: AsyncSession,
+    text: Optional[str] = None,
+    category_title: Optional[str] = None,
+    min_price: Optional[float] = None,
+    max_price: Optional[float] = None,
+    in_stock: bool = False,
+    skip: int = 0,
+    limit: int = 10,
+):
+    # Blank queries search nothing, they list like a query without text
+    text = text.strip() if text else None
+    filters = []
+    if min_price is not None:
+        filters.append(Product.price >= min_price)
+    if max_price is not None:
+        filters.append(Product.price <= max_price)
+    if in_stock:
+        filters.append(Product.quantity > 0)
+    category_filter = []
+    if category_title is not None:
+        category_filter.append(Product.category_id == select(Category.category_id).filter(Category.category_title == category_title).scalar_subquery())
+
+    def matching(query):
+        query = query.filter(*filters)
+        if text:
+            query = apply_text_search(query, db.bind.dialect.name, text)
+        return query
+
+    items_query = matching(select(Product).options(*PRODUCT_LOAD_OPTIONS).filter(*category_filter))
+    items = (await db.scalars(items_query.order_by(Product.product_id).offset(skip).limit(limit))).all()
+
+    total_query = matching(select(Product.product_id).filter(*category_filter)).order_by(None)
+    total = await db.scalar(select(func.count()).select_from(total_query.subquery()))
+
+    # Facets ignore the category filter so every category shows its count
+    facets_query = matching(
+        select(Category.category_title, func.count(Product.product_id).label("count"))
+        .select_from(Product)
+        .join(Category, Product.category_id == Category.category_id)
+    ).group_by(Category.category_title).order_by(None).order_by(func.count(Product.product_id).desc(), Category.category_title)
+    facets = (await db.execute(facets_query)).mappings().all()
+
+    return {"total": total, "items": items, "facets": facets}
+
+# Product import services
+IMPORT_CHUNK_SIZE = 1000
+
+def _import_error(result: dict, row_number: int, detail: str):
+    result["failed"] += 1
+    result["errors"].append({"row": row_number, "detail": detail})
+
+async def _insert_products(products: List[ProductCreate], categories: Dict[str, object], db: AsyncSession):
+    now = utc_now()
+    product_ids = (await db.scalars(
+        insert(Product).returning(Product.product_id, sort_by_parameter_order=True),
+        [
+            {
+                "product_title": product.product_title,
+                "product_description": product.product_description,
+                "category_id": categories[product.category_title].category_id,
+                "price": product.price,
+                "quantity": product.quantity,
+                "created_at": now,
+                "updated_at": now,
+            }
+            for product in products
+        ],
+    )).all()
+    images = [
+        {"product_id": product_id, "image_url": image.image_url}
+        for product_id, product in zip(product_ids, products)
+        for image in product.images or []
+    ]
+    if images:
+        await db.execute(insert(ProductImage), images)
+    deltas = {}
+    for product in products:
+        path = categories[product.category_title].path
+        deltas[path] = deltas.get(path, 0) + 1
+    await _add_to_product_counts(deltas, db)
+    await record_events(db, [catalog_event("product", product_id, "created") for product_id in product_ids])
+
+async def _import_product_chunk(chunk: List[Tuple[int, object]], categories: Dict[str, object], result: dict, db: AsyncSession):
+    valid = []
+    for row_number, row in chunk:
+        if isinstance(row, BadRequestException):
+            _import_error(result, row_number, str(row))
+            continue
+        try:
+            product = ProductCreate.model_validate(row)
+        except ValidationError as error:
+            _import_error(result, row_number, "; ".join(
+                f"{'.'.join(map(str, e['loc']))}: {e['msg']}" if e["loc"] else e["msg"] for e in error.errors()
+            ))
+            continue
+        if len(product.images or []) > MAX_PRODUCT_IMAGES:
+            _import_error(result, row_number, f"You can upload a maximum of {MAX_PRODUCT_IMAGES} images")
+            continue
+        valid.append((row_number, product))
+
+    # Titles already resolved by earlier chunks are not queried again
+    unknown_titles = {product.category_title for _, product in valid} - categories.keys()
+    if unknown_titles:
+        rows = await db.execute(
+            select(Category.category_title, Category.category_id, Category.path).filter(Category.category_title.in_(unknown_titles))
+        )
+        categories.update((row.category_title, row) for row in rows)
+    resolved = []
+    for row_number, product in valid:
+        if product.category_title not in categories:
+            _import_error(result, row_number, f"Category with title '{product.category_title}' not found")
+            continue
+        resolved.append((row_number, product))
+    if not resolved:
+        return
+
+    try:
+        await _insert_products([product for _, product in resolved], categories, db)
+        await db.commit()
+        result["created"] += len(resolved)
+        return
+    except SQLAlchemyError:
+        await db.rollback()
+    # A row the database rejected failed the chunk: retry row by row to isolate it
+    for row_number, product in resolved:
+        try:
+            await _insert_products([product], categories, db)
+            await db.commit()
+            result["created"] += 1
+        except SQLAlchemyError as error:
+            await db.rollback()
+            _import_error(result, row_number, f"Database error: {getattr(error, 'orig', None) or error}")
+
+async def import_products(rows: AsyncIterator[Tuple[int, object]], db: AsyncSession):
+    result = {"created": 0, "failed": 0, "errors": []}
+    categories = {}
+    chunk = []
+    async for row in rows:
+        chunk.append(row)
+        if len(chunk) == IMPORT_CHUNK_SIZE:
+            await _import_product_chunk(chunk, categories, result, db)
+            chunk = []
+    if chunk:
+        await _import_product_chunk(chunk, categories, result, db)
+    result["errors"].sort(key=lambda error: error["row"])
+    return result
+
+# Product bulk update services
+# Products updated per transaction, each chunk commits on its own
+BULK_UPDATE_CHUNK_SIZE = int(os.getenv("BULK_UPDATE_CHUNK_SIZE", "1000"))
+MAX_BULK_UPDATE_SIZE = int(os.getenv("MAX_BULK_UPDATE_SIZE", "10000"))
+
+# Run with one parameter set per product (executemany), null binds keep the column
+_products = Product.__table__
+BULK_UPDATE_STATEMENT = (
+    update(_products)
+    .where(_products.c.product_id == bindparam("b_product_id"))
+    .values(
+        price=func.coalesce(bindparam("b_price", type_=Float), _products.c.price),
+        quantity=func.coalesce(bindparam("b_quantity", type_=Integer), _products.c.quantity),
+        version=_products.c.version + 1,
+        updated_at=bindparam("b_updated_at"),
+    )
+)
+
+async def _bulk_update_chunk(chunk: List[Tuple[int, ProductBulkUpdateItem]], statuses: Dict[int, Tuple[str, Optional[str]]], db: AsyncSession):
+    # Locked in ID order, like stock reservations, so concurrent batches cannot deadlock
+    current = {
+        row.product_id: row
+        for row in await db.execute(
+            select(Product.product_id, Product.price, Product.quantity)
+            .filter(Product.product_id.in_([product_id for product_id, _ in chunk]))
+            .order_by(Product.product_id)
+            .with_for_update()
+        )
+    }
+    now = utc_now()
+    parameters = []
+    for product_id, item in chunk:
+        row = current.get(product_id)
+        if row is None:
+            statuses[product_id] = ("not_found", None)
+        elif (item.price is None or item.price == row.price) and (item.quantity is None or item.quantity == row.quantity):
+            # Repricing feeds resend most prices unchanged, skip their writes, events and invalidations
+            statuses[product_id] = ("unchanged", None)
+        else:
+            parameters.append({"b_product_id": product_id, "b_price": item.price, "b_quantity": item.quantity, "b_updated_at": now})
+    if not parameters:
+        # Nothing to write, end the transaction and its locks
+        await db.rollback()
+        return
+    parameters.sort(key=lambda parameter: parameter["b_product_id"])
+    updated_ids = [parameter["b_product_id"] for parameter in parameters]
+    try:
+        await db.execute(BULK_UPDATE_STATEMENT, parameters)
+        await record_events(db, [catalog_event("product", product_id, "updated") for product_id in updated_ids])
+        await db.commit()
+    except SQLAlchemyError as error:
+        await db.rollback()
+        detail = f"Database error: {getattr(error, 'orig', None) or error}"
+        statuses.update((product_id, ("failed", detail)) for product_id in updated_ids)
+        return
+    statuses.update((product_id, ("updated", None)) for product_id in updated_ids)
+    await cache.delete(map(product_key, updated_ids))
+
+async def bulk_update_products(updates: Dict[int, ProductBulkUpdateItem], db: AsyncSession):
+    """Apply sparse price and stock changes in chunked transactions, reporting the outcome per product ID."""
+    if len(updates) > MAX_BULK_UPDATE_SIZE:
+        raise EntityTooLargeException(f"You can update a maximum of {MAX_BULK_UPDATE_SIZE} products at once")
+    items = list(updates.items())
+    statuses = {}
+    for start in range(0, len(items), BULK_UPDATE_CHUNK_SIZE):
+        await _bulk_update_chunk(items[start:start + BULK_UPDATE_CHUNK_SIZE], statuses, db)
+    summary = {"updated": 0, "unchanged": 0, "not_found": 0, "failed": 0}
+    results = []
+    for product_id in updates:
+        status, detail = statuses[product_id]
+        summary[status] += 1
+        results.append({"product_id": product_id, "status": status, "detail": detail})
+    return {**summary, "results": results}
+
 # Product Image service
-def retrieve_product_images(product_id: int, db: Session):
-    images = db.query(ProductImage).filter(ProductImage.product_id == product_id).all()
+async def _touch_product(product_id: int, db: AsyncSession) -> Optional[int]:
+    # Images are part of the product representation, so they version the product
+    return await db.scalar(
+        update(Product)
+        .filter(Product.product_id == product_id)
+        .values(version=Product.version + 1, updated_at=utc_now())
+        .returning(Product.product_id)
+    )
+
+async def retrieve_product_images(product_id: int, db: AsyncSession):
+    images = (await db.scalars(
+        select(ProductImage).options(selectinload(ProductImage.variants)).filter(ProductImage.product_id == product_id)
+    )).all()
     return images
 
-def retrieve_product_image(product_id: int, image_id:int, db: Session):
-    image = db.query(ProductImage).filter(ProductImage.product_id == product_id, ProductImage.image_id == image_id).first()
+async def retrieve_product_images_etag(product_id: int, db: AsyncSession) -> Optional[str]:
+    version = await db.scalar(select(Product.version).filter(Product.product_id == product_id))
+    return None if version is None else make_etag("images", product_id, version)
+
+async def retrieve_product_image(product_id: int, image_id:int, db: AsyncSession):
+    image = await db.scalar(
+        select(ProductImage)
+        .options(selectinload(ProductImage.variants))
+        .filter(ProductImage.product_id == product_id, ProductImage.image_id == image_id)
+    )
     if image is None:
         raise NotFoundException(f"Product image with ID {image_id} not found")
     return image
 
-def create_product_image(product_id: int, product_image: ProductImageCreate, db: Session):
-    product = db.query(Product).filter(Product.product_id == product_id).first()
-    if product is None:
+async def retrieve_product_image_url(product_id: int, image_id: int, width: Optional[int], accepts_webp: bool, db: AsyncSession) -> str:
+    """URL of the variant of an image best suited to the requested width and formats, or of the original."""
+    image = await retrieve_product_image(product_id=product_id, image_id=image_id, db=db)
+    variant = choose_variant(image.variants, width, accepts_webp)
+    return image.image_url if variant is None else variant.url
+
+async def create_product_image(
+    product_id: int,
+    product_image: ProductImageCreate,
+    db: AsyncSession,
+    idempotency_key: Optional[str] = None,
+) -> Tuple[bytes, bool]:
+    """Serialized schemas.ProductImage of the new image, and whether it replays an earlier request."""
+    request_hash = fingerprint(product_id, product_image.model_dump_json())
+    if idempotency_key is not None:
+        stored = await replay_idempotent("product_image", idempotency_key, request_hash, db)
+        if stored is not None:
+            return stored, True
+    # Touching the product locks its row, so concurrent uploads cannot both pass the cap check
+    if await _touch_product(product_id, db) is None:
         raise NotFoundException(f"Product with ID {product_id} not found")
-    if len(product.images) == 5:
-        raise EntityTooLargeException("You can upload a maximum of 5 images")
+    image_count = await db.scalar(select(func.count()).select_from(ProductImage).filter(ProductImage.product_id == product_id))
+    if image_count >= MAX_PRODUCT_IMAGES:
+        await db.rollback()
+        raise EntityTooLargeException(f"You can upload a maximum of {MAX_PRODUCT_IMAGES} images")
     db_image = ProductImage(
         image_url = product_image.image_url,
-        product_id = product.product_id
+        product_id = product_id,
+        variants = []
     )
 
     db.add(db_image)
-    db.commit()
-    db.refresh(db_image)
+    await db.flush()
+    payload = ProductImageSchema.model_validate(db_image).model_dump_json().encode()
+    await record_events(db, [catalog_event("product_image", db_image.image_id, "created", product_id)])
+    payload, replayed = await commit_idempotent("product_image", idempotency_key, request_hash, payload, db)
+    if not replayed:
+        await cache.delete([product_key(product_id)])
 
-    return db_image
+    return payload, replayed
 
-def update_product_image(product_id: int, image_id: int, updated_attributes: ProductImageCreate, db: Session):
-    db_image = db.query(ProductImage).filter(ProductImage.product_id == product_id, ProductImage.image_id == image_id).first()
+async def _delete_stored_image(db_image: ProductImage, db: AsyncSession) -> List[str]:
+    """Delete the variant rows of an uploaded image, returns the object keys to remove after commit."""
+    if db_image.storage_key is None:
+        return []
+    variant_keys = (await db.scalars(
+        delete(ProductImageVariant).filter(ProductImageVariant.image_id == db_image.image_id).returning(ProductImageVariant.storage_key)
+    )).all()
+    return [db_image.storage_key, *variant_keys]
+
+async def update_product_image(product_id: int, image_id: int, updated_attributes: ProductImageCreate, db: AsyncSession):
+    db_image = await db.scalar(
+        select(ProductImage).filter(ProductImage.product_id == product_id, ProductImage.image_id == image_id).with_for_update()
+    )
     if db_image is None:
         raise NotFoundException(f"Product image with ID {image_id} not found")
+    # A new URL replaces an uploaded original together with its variants
+    stored_keys = await _delete_stored_image(db_image, db)
     db_image.image_url = updated_attributes.image_url
+    db_image.storage_key = None
+    await _touch_product(product_id, db)
 
-    db.commit()
-    db.refresh(db_image)
+    await record_events(db, [catalog_event("product_image", image_id, "updated", product_id)])
+    await db.commit()
+    await db.refresh(db_image)
+    set_committed_value(db_image, "variants", [])
+    await cache.delete([product_key(product_id)])
+    await image_store.delete(stored_keys)
 
     return db_image
 
-def delete_product_image(product_id: int, image_id: int, db: Session):
-    db_image = db.query(ProductImage).filter(ProductImage.product_id == product_id, ProductImage.image_id == image_id).first()
+async def delete_product_image(product_id: int, image_id: int, db: AsyncSession):
+    db_image = await db.scalar(
+        select(ProductImage).filter(ProductImage.product_id == product_id, ProductImage.image_id == image_id).with_for_update()
+    )
     if db_image is None:
         raise NotFoundException(f"Product image with ID {image_id} not found")
-    db.delete(db_image)
-    db.commit()
-    return {"success": True, "message": f"Product Image with ID {image_id} deleted successfully"}
\ No newline at end of file
+    stored_keys = await _delete_stored_image(db_image, db)
+    await db.delete(db_image)
+    await _touch_product(product_id, db)
+    await record_events(db, [catalog_event("product_image", image_id, "deleted", product_id)])
+    await db.commit()
+    await cache.delete([product_key(product_id)])
+    await image_store.delete(stored_keys)
+    return {"success": True, "message": f"Product Image with ID {image_id} deleted successfully"}
+
+# Uploads are rejected as soon as they grow past this size
+MAX_IMAGE_UPLOAD_BYTES = int(os.getenv("MAX_IMAGE_UPLOAD_BYTES", str(10 * 1024 * 1024)))
+
+async def _limit_size(stream: AsyncIterator[bytes], max_bytes: int) -> AsyncIterator[bytes]:
+    size = 0
+    async for chunk in stream:
+        size += len(chunk)
+        if size > max_bytes:
+            raise EntityTooLargeException(f"Images can be at most {max_bytes} bytes")
+        yield chunk
+
+async def upload_product_image(product_id: int, content_type: Optional[str], stream: AsyncIterator[bytes], db: AsyncSession):
+    """Check an image body decodes, store it and add it to the product, variants follow in the background."""
+    media_type = (content_type or "").split(";")[0].strip().lower()
+    extension = IMAGE_CONTENT_TYPES.get(media_type)
+    if extension is None:
+        raise UnsupportedMediaTypeException(f"Unsupported image type '{media_type}', use one of: {', '.join(IMAGE_CONTENT_TYPES)}")
+    if await db.scalar(select(Product.product_id).filter(Product.product_id == product_id)) is None:
+        raise NotFoundException(f"Product with ID {product_id} not found")
+    # No transaction stays open while the body is received
+    await db.rollback()
+
+    # Held in memory, at most MAX_IMAGE_UPLOAD_BYTES, so that nothing is
+    # stored unless the whole image decodes
+    data = b"".join([chunk async for chunk in _limit_size(stream, MAX_IMAGE_UPLOAD_BYTES)])
+    if not data:
+        raise BadRequestException("The image body is empty")
+    try:
+        detected_type = await inspect_image_in_pool(data)
+    except ValueError as error:
+        raise BadRequestException(str(error))
+    if detected_type != media_type:
+        raise UnsupportedMediaTypeException(f"The image body is not {media_type}")
+    key = f"products/{product_id}/{uuid.uuid4().hex}.{extension}"
+    await image_store.put_bytes(key, data)
+    try:
+        # Same lock and cap as create_product_image
+        if await _touch_product(product_id, db) is None:
+            raise NotFoundException(f"Product with ID {product_id} not found")
+        image_count = await db.scalar(select(func.count()).select_from(ProductImage).filter(ProductImage.product_id == product_id))
+        if image_count >= MAX_PRODUCT_IMAGES:
+            raise EntityTooLargeException(f"You can upload a maximum of {MAX_PRODUCT_IMAGES} images")
+        db_image = ProductImage(image_url=image_store.url(key), storage_key=key, product_id=product_id, variants=[])
+        db.add(db_image)
+        await db.flush()
+        await record_events(db, [catalog_event("product_image", db_image.image_id, "created", product_id)])
+        await db.commit()
+    except BaseException:
+        await db.rollback()
+        await image_store.delete([key])
+        raise
+    await cache.delete([product_key(product_id)])
+
+    return db_image
+
+async def generate_image_variants(image_id: int, db: AsyncSession) -> int:
+    """Render the variants of an uploaded image in the image pool and store them, returns how many were added."""
+    storage_key = await db.scalar(select(ProductImage.storage_key).filter(ProductImage.image_id == image_id))
+    await db.rollback()
+    if storage_key is None:
+        return 0
+    rendered = await render_variants_in_pool(await image_store.get(storage_key))
+    stem = storage_key.rsplit(".", 1)[0]
+    variants = []
+    for width, height, format, data in rendered:
+        key = f"{stem}_{width}w.{VARIANT_EXTENSIONS[format]}"
+        await image_store.put_bytes(key, data)
+        variants.append({
+            "image_id": image_id,
+            "width": width,
+            "height": height,
+            "format": format,
+            "storage_key": key,
+            "url": image_store.url(key),
+            "size": len(data),
+        })
+    variant_keys = [variant["storage_key"] for variant in variants]
+
+    # Locks the image before its product, in the order delete_product_image does
+    image = (await db.execute(
+        select(ProductImage.product_id, ProductImage.storage_key).filter(ProductImage.image_id == image_id).with_for_update()
+    )).first()
+    if image is None or image.storage_key != storage_key:
+        # Deleted or replaced while rendering
+        await db.rollback()
+        await image_store.delete(variant_keys)
+        return 0
+    await db.execute(delete(ProductImageVariant).filter(ProductImageVariant.image_id == image_id))
+    await db.execute(insert(ProductImageVariant), variants)
+    await _touch_product(image.product_id, db)
+    await record_events(db, [catalog_event("product_image", image_id, "updated", image.product_id)])
+    await db.commit()
+    await cache.delete([product_key(image.product_id)])
+    return len(variants)
+
+# Inventory services
+RESERVATION_SWEEP_BATCH_SIZE = 100
+
+async def _take_stock(quantities: Dict[int, int], db: AsyncSession):
+    """Atomically decrement stock, one conditional UPDATE per product."""
+    now = utc_now()
+    # Always lock products in ID order so concurrent multi-item reservations cannot deadlock
+    for product_id in sorted(quantities):
+        quantity = quantities[product_id]
+        result = await db.execute(
+            update(Product)
+            .filter(Product.product_id == product_id, Product.quantity >= quantity)
+            .values(quantity=Product.quantity - quantity, version=Product.version + 1, updated_at=now)
+            .execution_options(synchronize_session=False)
+        )
+        if result.rowcount != 1:
+            await db.rollback()
+            if await db.scalar(select(Product.product_id).filter(Product.product_id == product_id)) is None:
+                raise NotFoundException(f"Product with ID {product_id} not found")
+            raise InsufficientStockException(f"Not enough stock for product with ID {product_id}")
+
+async def _record_stock_events(product_ids: Iterable[int], db: AsyncSession):
+    # Stock is part of the product representation, the feed reports it as a product update
+    await record_events(db, [catalog_event("product", product_id, "updated") for product_id in sorted(product_ids)])
+
+async def _retrieve_reservation_for_update(reservation_id: str, db: AsyncSession):
+    reservation = await db.scalar(
+        select(StockReservation)
+        .options(selectinload(StockReservation.items))
+        .filter(StockReservation.reservation_id == reservation_id)
+        .with_for_update()
+    )
+    if reservation is None:
+        raise NotFoundException(f"Reservation with ID {reservation_id} not found")
+    return reservation
+
+async def _return_reserved_stock(reservation: StockReservation, status: str, db: AsyncSession):
+    now = utc_now()
+    for item in sorted(reservation.items, key=lambda item: item.product_id):
+        await db.execute(
+            update(Product)
+            .filter(Product.product_id == item.product_id)
+            .values(quantity=Product.quantity + item.quantity, version=Product.version + 1, updated_at=now)
+            .execution_options(synchronize_session=False)
+        )
+    reservation.status = status
+
+async def reserve_stock(reservation: StockReservationCreate, db: AsyncSession):
+    quantities = {}
+    for item in reservation.items:
+        quantities[item.product_id] = quantities.get(item.product_id, 0) + item.quantity
+    await _take_stock(quantities, db)
+
+    db_reservation = StockReservation(
+        reservation_id=str(uuid.uuid4()),
+        status="pending",
+        created_at=utc_now(),
+        expires_at=utc_now() + timedelta(seconds=reservation.ttl_seconds),
+        items=[StockReservationItem(product_id=product_id, quantity=quantity) for product_id, quantity in quantities.items()],
+    )
+    db.add(db_reservation)
+    await _record_stock_events(quantities, db)
+    await db.commit()
+    await cache.delete(map(product_key, quantities))
+
+    return db_reservation
+
+async def retrieve_reservation(reservation_id: str, db: AsyncSession):
+    reservation = await db.scalar(
+        select(StockReservation)
+        .options(selectinload(StockReservation.items))
+        .filter(StockReservation.reservation_id == reservation_id)
+    )
+    if reservation is None:
+        raise NotFoundException(f"Reservation with ID {reservation_id} not found")
+    return reservation
+
+async def commit_reservation(reservation_id: str, db: AsyncSession):
+    reservation = await _retrieve_reservation_for_update(reservation_id, db)
+    if reservation.status != "pending":
+        raise ReservationStateException(f"Reservation with ID {reservation_id} is {reservation.status}")
+    if reservation.expires_at <= utc_now():
+        await _return_reserved_stock(reservation, "expired", db)
+        await _record_stock_events([item.product_id for item in reservation.items], db)
+        await db.commit()
+        await cache.delete([product_key(item.product_id) for item in reservation.items])
+        raise ReservationStateException(f"Reservation with ID {reservation_id} is expired")
+    # The stock was taken when reserving, committing only makes it permanent
+    reservation.status = "committed"
+    await db.commit()
+    return reservation
+
+async def release_reservation(reservation_id: str, db: AsyncSession):
+    reservation = await _retrieve_reservation_for_update(reservation_id, db)
+    if reservation.status != "pending":
+        raise ReservationStateException(f"Reservation with ID {reservation_id} is {reservation.status}")
+    await _return_reserved_stock(reservation, "released", db)
+    await _record_stock_events([item.product_id for item in reservation.items], db)
+    await db.commit()
+    await cache.delete([product_key(item.product_id) for item in reservation.items])
+    return reservation
+
+async def release_expired_reservations(db: AsyncSession, limit: int = RESERVATION_SWEEP_BATCH_SIZE) -> int:
+    reservations = (await db.scalars(
+        select(StockReservation)
+        .options(selectinload(StockReservation.items))
+        .filter(StockReservation.status == "pending", StockReservation.expires_at <= utc_now())
+        .order_by(StockReservation.expires_at)
+        .limit(limit)
+        .with_for_update(skip_locked=True)
+    )).all()
+    product_ids = set()
+    for reservation in reservations:
+        await _return_reserved_stock(reservation, "expired", db)
+        product_ids.update(item.product_id for item in reservation.items)
+    await _record_stock_events(product_ids, db)
+    await db.commit()
+    await cache.delete(map(product_key, product_ids))
+    return len(reservations)
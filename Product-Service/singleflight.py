@@ -0,0 +1,104 @@
+import asyncio
+import os
+from typing import Any, Awaitable, Callable, Dict, Hashable, Iterable, Optional, Tuple
+from .exceptions import FetchTimeoutException
+
+# Concurrent reads of the same key wait for one fetch and share its result
+# instead of each running the same queries. "false" disables the coalescing.
+SINGLE_FLIGHT_ENABLED = os.getenv("SINGLE_FLIGHT_ENABLED", "true").lower() == "true"
+# Seconds a shared fetch may take before it is abandoned and all of its waiters fail
+SINGLE_FLIGHT_TIMEOUT = float(os.getenv("SINGLE_FLIGHT_TIMEOUT", "10"))
+
+class Flight:
+    """A fetch in progress. `forgotten` is set when a write invalidated its key meanwhile."""
+    __slots__ = ("task", "forgotten")
+
+    def __init__(self):
+        self.task: Optional[asyncio.Task] = None
+        self.forgotten = False
+
+class SingleFlight:
+    """Coalesces concurrent loads of a key into one in-flight fetch, in process.
+
+    Only fetches in progress are shared: once a fetch finishes, successfully
+    or not, the next caller starts a new one, so errors and timeouts are
+    propagated to the callers that waited and never remembered.
+    """
+
+    def __init__(self, timeout: float = SINGLE_FLIGHT_TIMEOUT, enabled: bool = SINGLE_FLIGHT_ENABLED):
+        self.timeout = timeout
+        self.enabled = enabled
+        self._flights: Dict[Tuple[Hashable, Hashable], Flight] = {}
+        self.leaders = 0
+        self.shared = 0
+        self.errors = 0
+        self.timeouts = 0
+
+    def current(self, key: Hashable, variant: Hashable = None) -> Optional[Flight]:
+        return self._flights.get((key, variant))
+
+    async def do(
+        self,
+        key: Hashable,
+        loader: Callable[[], Awaitable[Any]],
+        variant: Hashable = None,
+        timeout: Optional[float] = None,
+    ) -> Any:
+        """The result of loader(), or of the fetch of (key, variant) already in flight.
+
+        Variants are flights of the same key that cannot share results, such
+        as narrowed fieldsets of a product, forget(key) drops them all.
+        """
+        if not self.enabled:
+            return await self._load(loader, self.timeout if timeout is None else timeout)
+        flight = self._flights.get((key, variant))
+        if flight is None:
+            self.leaders += 1
+            flight = Flight()
+            # Registered before the fetch starts, so the loader finds its flight with current()
+            self._flights[(key, variant)] = flight
+            flight.task = asyncio.ensure_future(self._fly(key, variant, flight, loader, self.timeout if timeout is None else timeout))
+            # Retrieve the outcome even when every waiter went away, so it is not logged as unhandled
+            flight.task.add_done_callback(lambda task: task.cancelled() or task.exception())
+        else:
+            self.shared += 1
+        # Shielded: a waiter that is cancelled leaves the fetch running for the others
+        return await asyncio.shield(flight.task)
+
+    async def _fly(self, key: Hashable, variant: Hashable, flight: Flight, loader, timeout: float):
+        try:
+            return await self._load(loader, timeout)
+        except FetchTimeoutException:
+            self.timeouts += 1
+            raise
+        except Exception:
+            self.errors += 1
+            raise
+        finally:
+            if self._flights.get((key, variant)) is flight:
+                del self._flights[(key, variant)]
+
+    @staticmethod
+    async def _load(loader, timeout: float):
+        try:
+            return await asyncio.wait_for(loader(), timeout)
+        except asyncio.TimeoutError:
+            raise FetchTimeoutException(f"The read did not complete within {timeout:g} seconds")
+
+    def forget(self, keys: Iterable[Hashable]):
+        """Detach the flights of invalidated keys: callers arriving after a write start a fresh fetch."""
+        keys = set(keys)
+        for flight_key in [flight_key for flight_key in self._flights if flight_key[0] in keys]:
+            self._flights.pop(flight_key).forgotten = True
+
+    def stats(self) -> dict:
+        return {
+            "enabled": self.enabled,
+            "in_flight": len(self._flights),
+            "leaders": self.leaders,
+            "shared": self.shared,
+            "errors": self.errors,
+            "timeouts": self.timeouts,
+        }
+
+flights = SingleFlight()
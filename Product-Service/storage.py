@@ -0,0 +1,92 @@
+import asyncio
+import os
+import uuid
+from typing import AsyncIterator, Iterable
+
+# IMAGE_STORE selects where uploaded images and their variants are kept,
+# "local" writes them below IMAGE_STORE_PATH and serves them from
+# IMAGE_BASE_URL (mounted by main.py when it is a path).
+IMAGE_STORE = os.getenv("IMAGE_STORE", "local")
+IMAGE_STORE_PATH = os.getenv("IMAGE_STORE_PATH", "media")
+IMAGE_BASE_URL = os.getenv("IMAGE_BASE_URL", "/media/")
+
+class ObjectStore:
+    """Flat key/value store for binary objects, each reachable at a public URL."""
+    name = "base"
+
+    async def put(self, key: str, chunks: AsyncIterator[bytes]) -> int:
+        """Store the streamed object under key, returns its size in bytes."""
+        raise NotImplementedError
+
+    async def put_bytes(self, key: str, data: bytes):
+        async def single():
+            yield data
+        await self.put(key, single())
+
+    async def get(self, key: str) -> bytes:
+        raise NotImplementedError
+
+    async def delete(self, keys: Iterable[str]):
+        raise NotImplementedError
+
+    def url(self, key: str) -> str:
+        raise NotImplementedError
+
+class LocalFileStore(ObjectStore):
+    """Objects as files below a directory, file IO runs in worker threads."""
+    name = "local"
+
+    def __init__(self, root: str = IMAGE_STORE_PATH, base_url: str = IMAGE_BASE_URL):
+        self.root = os.path.abspath(root)
+        self.base_url = base_url.rstrip("/") + "/"
+
+    def path(self, key: str) -> str:
+        path = os.path.abspath(os.path.join(self.root, key))
+        if not path.startswith(self.root + os.sep):
+            raise ValueError(f"Object key '{key}' escapes the store directory")
+        return path
+
+    async def put(self, key: str, chunks: AsyncIterator[bytes]) -> int:
+        path = self.path(key)
+        await asyncio.to_thread(os.makedirs, os.path.dirname(path), exist_ok=True)
+        # Readers never see a partial file: write aside and rename into place
+        partial = f"{path}.{uuid.uuid4().hex}.partial"
+        file = await asyncio.to_thread(open, partial, "wb")
+        size = 0
+        try:
+            async for chunk in chunks:
+                await asyncio.to_thread(file.write, chunk)
+                size += len(chunk)
+            await asyncio.to_thread(file.close)
+            await asyncio.to_thread(os.replace, partial, path)
+        except BaseException:
+            file.close()
+            await asyncio.to_thread(_remove, partial)
+            raise
+        return size
+
+    async def get(self, key: str) -> bytes:
+        def read():
+            with open(self.path(key), "rb") as file:
+                return file.read()
+        return await asyncio.to_thread(read)
+
+    async def delete(self, keys: Iterable[str]):
+        paths = [self.path(key) for key in keys]
+        await asyncio.to_thread(lambda: [_remove(path) for path in paths])
+
+    def url(self, key: str) -> str:
+        return self.base_url + key
+
+def _remove(path: str):
+    try:
+        os.remove(path)
+    except FileNotFoundError:
+        pass
+
+def store_from_env() -> ObjectStore:
+    if IMAGE_STORE == "local":
+        return LocalFileStore()
+    raise RuntimeError(f"Unknown IMAGE_STORE '{IMAGE_STORE}'")
+
+image_store = store_from_env()
@@ -0,0 +1,80 @@
+import asyncio
+import os
+import traceback
+from datetime import timedelta
+from .db import AsyncSessionLocal
+from .idempotency import delete_expired_idempotency_keys
+from .outbox import delete_old_events, recorded_notifier, sequence_events
+from .replicas import REPLICA_HEALTH_CHECK_INTERVAL, replica_router
+from .services import generate_image_variants, release_expired_reservations, RESERVATION_SWEEP_BATCH_SIZE
+
+# Seconds between sweeps returning the stock of expired reservations
+RESERVATION_SWEEP_INTERVAL = float(os.getenv("RESERVATION_SWEEP_INTERVAL", "30"))
+# Idempotency keys are replayable for this long after their request
+IDEMPOTENCY_KEY_TTL = timedelta(hours=float(os.getenv("IDEMPOTENCY_KEY_TTL_HOURS", "24")))
+IDEMPOTENCY_SWEEP_INTERVAL = float(os.getenv("IDEMPOTENCY_SWEEP_INTERVAL", "3600"))
+# Change feed consumers must resume within this window, older events are pruned
+CATALOG_EVENT_RETENTION = timedelta(hours=float(os.getenv("CATALOG_EVENT_RETENTION_HOURS", "168")))
+CATALOG_EVENT_SWEEP_INTERVAL = float(os.getenv("CATALOG_EVENT_SWEEP_INTERVAL", "3600"))
+# Seconds between relay runs when no local commit wakes it, bounds the delay
+# for events of instances that stopped before numbering them
+CATALOG_EVENT_RELAY_INTERVAL = float(os.getenv("CATALOG_EVENT_RELAY_INTERVAL", "1"))
+CATALOG_EVENT_RELAY_BATCH_SIZE = int(os.getenv("CATALOG_EVENT_RELAY_BATCH_SIZE", "1000"))
+
+async def sweep_expired_reservations():
+    while True:
+        try:
+            async with AsyncSessionLocal() as db:
+                while await release_expired_reservations(db=db) == RESERVATION_SWEEP_BATCH_SIZE:
+                    pass
+        except Exception as e:
+            print(e)
+            print(traceback.format_exc())
+        await asyncio.sleep(RESERVATION_SWEEP_INTERVAL)
+
+async def sweep_expired_idempotency_keys():
+    while True:
+        try:
+            async with AsyncSessionLocal() as db:
+                await delete_expired_idempotency_keys(db=db, max_age=IDEMPOTENCY_KEY_TTL)
+        except Exception as e:
+            print(e)
+            print(traceback.format_exc())
+        await asyncio.sleep(IDEMPOTENCY_SWEEP_INTERVAL)
+
+async def sweep_old_catalog_events():
+    while True:
+        try:
+            async with AsyncSessionLocal() as db:
+                await delete_old_events(db=db, max_age=CATALOG_EVENT_RETENTION)
+        except Exception as e:
+            print(e)
+            print(traceback.format_exc())
+        await asyncio.sleep(CATALOG_EVENT_SWEEP_INTERVAL)
+
+async def relay_catalog_events():
+    """Numbers committed catalog events for the change feed, woken by the commits of this process."""
+    while True:
+        seen = recorded_notifier.notifications
+        try:
+            async with AsyncSessionLocal() as db:
+                while await sequence_events(db=db, limit=CATALOG_EVENT_RELAY_BATCH_SIZE) == CATALOG_EVENT_RELAY_BATCH_SIZE:
+                    pass
+        except Exception as e:
+            print(e)
+            print(traceback.format_exc())
+        await recorded_notifier.wait(CATALOG_EVENT_RELAY_INTERVAL, seen=seen)
+
+async def process_uploaded_image(image_id: int):
+    """Background task of an upload: renders and stores the variants of the image."""
+    try:
+        async with AsyncSessionLocal() as db:
+            await generate_image_variants(image_id=image_id, db=db)
+    except Exception as e:
+        print(e)
+        print(traceback.format_exc())
+
+async def check_replicas():
+    while True:
+        await replica_router.check()
+        await asyncio.sleep(REPLICA_HEALTH_CHECK_INTERVAL)
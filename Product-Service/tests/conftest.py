@@ -0,0 +1,90 @@
+"""Fixtures running the app in process against a scratch SQLite database.
+
+Run from the repository root: python -m pytest Product-Service/tests
+The suite needs pytest on top of the requirements. The Redis cache test
+runs when fakeredis is installed, and is skipped otherwise.
+"""
+import importlib
+import os
+import sys
+import tempfile
+import pytest
+from sqlalchemy import event
+
+# Settings are read at import time, so they are set before the app is imported
+_scratch = tempfile.mkdtemp(prefix="product-tests-")
+os.environ["DATABASE_URL"] = f"sqlite:///{os.path.join(_scratch, 'products.db')}"
+os.environ["IMAGE_STORE_PATH"] = os.path.join(_scratch, "media")
+# One client sends every request of the suite
+os.environ["RATE_LIMIT_BACKEND"] = "none"
+os.environ["ADMISSION_MAX_CONCURRENCY"] = "0"
+# Writes are open, test_auth.py installs a verifier where it tests tokens
+os.environ.pop("AUTH_JWKS_URL", None)
+os.environ.pop("AUTH_PUBLIC_KEY", None)
+os.environ["AUTH_DISABLED"] = "1"
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__)))))
+PACKAGE = "Product-Service"
+
+def service_module(name: str):
+    return importlib.import_module(f"{PACKAGE}.{name}")
+
+@pytest.fixture()
+def app_db():
+    """Fresh schema and cache for each test."""
+    db = service_module("db")
+    service_module("models")
+    services = service_module("services")
+    cache = service_module("cache")
+    db.Base.metadata.drop_all(db.engine)
+    db.Base.metadata.create_all(db.engine)
+    services.cache = cache.LRUCache()
+    yield db
+    db.Base.metadata.drop_all(db.engine)
+
+@pytest.fixture()
+def client(app_db):
+    from fastapi.testclient import TestClient
+    return TestClient(service_module("main").app)
+
+class StatementCounter:
+    def __init__(self):
+        self.statements = []
+
+    def __call__(self, conn, cursor, statement, parameters, context, executemany):
+        self.statements.append(statement)
+
+    @property
+    def count(self) -> int:
+        return len(self.statements)
+
+    def reset(self):
+        self.statements.clear()
+
+@pytest.fixture()
+def statements(app_db):
+    """Statements run on the primary engine, recorded by a before_cursor_execute listener."""
+    counter = StatementCounter()
+    engine = app_db.async_engine.sync_engine
+    event.listen(engine, "before_cursor_execute", counter)
+    yield counter
+    event.remove(engine, "before_cursor_execute", counter)
+
+@pytest.fixture()
+def catalog(client):
+    """Two categories with products carrying two images each, returns the product IDs."""
+    for title in ("Books", "Games"):
+        assert client.post("/api/category/create/", json={"category_title": title}).status_code == 201
+    product_ids = []
+    for index in range(30):
+        response = client.post("/api/product/create/", json={
+            "product_title": f"Product {index}",
+            "product_description": "A product",
+            "price": 10 + index,
+            "quantity": 5,
+            "category_title": "Books" if index % 2 else "Games",
+            "images": [{"image_url": f"https://images.example/{index}/{image}.png"} for image in range(2)],
+        })
+        assert response.status_code == 201, response.text
+        product_ids.append(response.json()["product_id"])
+    return product_ids
@@ -0,0 +1,136 @@
+"""Admission: 429 for clients over their rate, 503 when saturated, clients told apart by the trusted X-Forwarded-For entry."""
+import asyncio
+import httpx
+import pytest
+from .conftest import service_module
+
+admission = service_module("admission")
+product_router = service_module("routers.product_router")
+
+def install(monkeypatch, store=None, limiter=None, route_limits=(), rate=0.001, burst=3):
+    """Replace the app's admission with these limits, rates low enough that no token comes back during a test."""
+    installed = admission.Admission(
+        store=store or admission.MemoryRateLimitStore(),
+        limiter=limiter or admission.ConcurrencyLimiter(max_concurrency=0),
+        route_limits=list(route_limits), rate=rate, burst=burst,
+    )
+    monkeypatch.setattr(admission, "admission", installed)
+    return installed
+
+def test_clients_over_their_burst_get_429(client, monkeypatch):
+    installed = install(monkeypatch)
+    statuses = [client.get("/api/categories/").status_code for _ in range(4)]
+    assert statuses == [200, 200, 200, 429]
+    response = client.get("/api/categories/")
+    assert response.json() == {"detail": "Rate limit exceeded"}
+    # About 1000 seconds until the next token at 0.001 per second
+    assert 990 <= int(response.headers["Retry-After"]) <= 1000
+    assert installed.stats()["limited_client"] == 2
+
+def test_route_limits_apply_to_their_route_only(client, monkeypatch):
+    install(monkeypatch, route_limits=admission.parse_route_limits("GET /api/product/{product_id}/=0.001:2"), burst=100)
+    # The template matches every product ID, they share one budget
+    assert [client.get(f"/api/product/{product_id}/").status_code for product_id in (1, 2, 3)] == [404, 404, 429]
+    assert client.get("/api/categories/").status_code == 200
+    assert admission.admission.limited_route == 1
+
+def test_diagnostics_are_never_limited(client, monkeypatch):
+    install(monkeypatch, burst=1)
+    assert client.get("/api/categories/").status_code == 200
+    assert client.get("/api/categories/").status_code == 429
+    assert client.get("/api/diagnostics/admission/").status_code == 200
+
+def test_store_failures_admit_requests(client, monkeypatch):
+    class BrokenStore(admission.RateLimitStore):
+        name = "broken"
+
+        async def acquire(self, key, rate, burst):
+            raise ConnectionError("store is down")
+    installed = install(monkeypatch, store=BrokenStore(), burst=1)
+    assert [client.get("/api/categories/").status_code for _ in range(3)] == [200] * 3
+    assert installed.store_errors == 3
+
+def test_saturated_service_sheds_with_503(client, monkeypatch):
+    install(monkeypatch, limiter=admission.ConcurrencyLimiter(max_concurrency=1, queue_budget=0.05), burst=100)
+
+    async def slow_payload(product_id, fieldset):
+        await asyncio.sleep(0.3)
+        return '"etag"', b"{}"
+    monkeypatch.setattr(product_router, "retrieve_product_payload", slow_payload)
+
+    async def send():
+        transport = httpx.ASGITransport(app=service_module("main").app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://test") as async_client:
+            return await asyncio.gather(*(async_client.get("/api/product/1/") for _ in range(3)))
+    responses = asyncio.run(send())
+    assert sorted(response.status_code for response in responses) == [200, 503, 503]
+    shed = [response for response in responses if response.status_code == 503]
+    assert all(response.headers["Retry-After"] == "1" for response in shed)
+    assert admission.admission.limiter.shed == 2
+    assert admission.admission.limiter.in_flight == 0
+
+def test_queued_requests_get_a_freed_slot():
+    limiter = admission.ConcurrencyLimiter(max_concurrency=1, queue_budget=1)
+
+    async def run():
+        assert await limiter.acquire()
+        queued = asyncio.ensure_future(limiter.acquire())
+        await asyncio.sleep(0.01)
+        assert limiter.queued == 1
+        limiter.release()
+        return await queued
+    assert asyncio.run(run())
+    assert (limiter.in_flight, limiter.queued, limiter.shed) == (1, 0, 0)
+
+def scope(*forwarded, client=("10.0.0.1", 5000)) -> dict:
+    return {"headers": [(b"x-forwarded-for", value.encode()) for value in forwarded], "client": client}
+
+@pytest.mark.parametrize("trusted_proxies, forwarded, expected", [
+    # The proxy appends the address it saw, entries to its left came from the client
+    (1, ["198.51.100.9, 203.0.113.7"], "203.0.113.7"),
+    (1, ["203.0.113.7"], "203.0.113.7"),
+    (2, ["198.51.100.9, 203.0.113.7, 10.0.0.2"], "203.0.113.7"),
+    # Repeated headers are read as one list
+    (2, ["198.51.100.9", "203.0.113.7", "10.0.0.2"], "203.0.113.7"),
+    # Fewer entries than proxies: the leftmost one
+    (3, ["203.0.113.7, 10.0.0.2"], "203.0.113.7"),
+    # Counted as one proxy
+    (0, ["198.51.100.9, 203.0.113.7"], "203.0.113.7"),
+    # No header: the address of the connection
+    (1, [], "10.0.0.1"),
+])
+def test_client_key_is_read_right_to_left(monkeypatch, trusted_proxies, forwarded, expected):
+    monkeypatch.setattr(admission, "RATE_LIMIT_CLIENT_HEADER", "X-Forwarded-For")
+    monkeypatch.setattr(admission, "RATE_LIMIT_TRUSTED_PROXIES", trusted_proxies)
+    assert admission._client_key(scope(*forwarded)) == expected
+
+def test_forwarded_header_is_ignored_unless_configured(monkeypatch):
+    monkeypatch.setattr(admission, "RATE_LIMIT_CLIENT_HEADER", "")
+    assert admission._client_key(scope("203.0.113.7")) == "10.0.0.1"
+
+def test_spoofed_entries_do_not_escape_the_limit(client, monkeypatch):
+    monkeypatch.setattr(admission, "RATE_LIMIT_CLIENT_HEADER", "X-Forwarded-For")
+    monkeypatch.setattr(admission, "RATE_LIMIT_TRUSTED_PROXIES", 1)
+    install(monkeypatch, burst=2)
+    statuses = [
+        client.get("/api/categories/", headers={"X-Forwarded-For": f"198.51.100.{index}, 203.0.113.7"}).status_code
+        for index in range(3)
+    ]
+    assert statuses == [200, 200, 429]
+    other = client.get("/api/categories/", headers={"X-Forwarded-For": "203.0.113.8"})
+    assert other.status_code == 200
+
+@pytest.mark.parametrize("store", ["memory", "redis"])
+def test_stores_allow_the_burst_then_refuse(store):
+    if store == "redis":
+        fakeredis = pytest.importorskip("fakeredis")
+        rate_store = admission.RedisRateLimitStore(fakeredis.FakeAsyncRedis())
+    else:
+        rate_store = admission.MemoryRateLimitStore()
+
+    async def run():
+        return [await rate_store.acquire("client:a", 0.001, 3) for _ in range(4)] + [await rate_store.acquire("client:b", 0.001, 3)]
+    waits = asyncio.run(run())
+    assert waits[:3] == [0.0] * 3
+    assert 990 <= waits[3] <= 1000
+    assert waits[4] == 0.0
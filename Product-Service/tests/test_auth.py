@@ -0,0 +1,109 @@
+"""Tokens signed by User-Service's key ring verify against its JWKS, with a local key pair."""
+import asyncio
+import importlib
+import time
+import jwt
+import pytest
+from .conftest import service_module
+
+auth = service_module("auth")
+user_keys = importlib.import_module("User-Service.keys")
+
+@pytest.fixture()
+def key_ring(tmp_path):
+    ring = user_keys.KeyRing(directory=str(tmp_path))
+    ring.load()
+    return ring
+
+def sign(ring, **claims) -> str:
+    # What User-Service's issue_access_token signs
+    key = ring.active
+    now = int(time.time())
+    payload = {"iss": user_keys.JWT_ISSUER, "aud": user_keys.JWT_AUDIENCE, "sub": "42", "iat": now, "exp": now + 60, **claims}
+    return jwt.encode(payload, key.private_key, algorithm=user_keys.JWT_ALGORITHM, headers={"kid": key.kid})
+
+def verify(verifier, token):
+    return asyncio.run(verifier.verify(token))
+
+def test_token_round_trips_through_the_jwks(key_ring):
+    verifier = auth.TokenVerifier(keys=auth.keys_from_jwks(key_ring.jwks()))
+    claims = verify(verifier, sign(key_ring, roles=["catalog_admin"]))
+    assert claims["sub"] == "42"
+    assert claims["roles"] == ["catalog_admin"]
+    # Verifying the same token again is served by the cache
+    token = sign(key_ring, jti="repeated")
+    verify(verifier, token)
+    hits = verifier.hits
+    verify(verifier, token)
+    assert verifier.hits == hits + 1
+
+@pytest.mark.parametrize("claims", [
+    {"exp": int(time.time()) - 3600},
+    {"aud": "another-audience"},
+    {"iss": "another-issuer"},
+])
+def test_invalid_claims_are_rejected(key_ring, claims):
+    verifier = auth.TokenVerifier(keys=auth.keys_from_jwks(key_ring.jwks()))
+    with pytest.raises(auth.UnauthorizedException):
+        verify(verifier, sign(key_ring, **claims))
+
+def test_tampered_and_foreign_tokens_are_rejected(key_ring, tmp_path):
+    verifier = auth.TokenVerifier(keys=auth.keys_from_jwks(key_ring.jwks()))
+    header, payload, signature = sign(key_ring).split(".")
+    with pytest.raises(auth.UnauthorizedException):
+        verify(verifier, f"{header}.{payload}.{signature[::-1]}")
+    other_ring = user_keys.KeyRing(directory=str(tmp_path / "other"))
+    other_ring.load()
+    with pytest.raises(auth.UnauthorizedException):
+        verify(verifier, sign(other_ring))
+
+def test_tokens_of_pruned_keys_are_rejected(key_ring):
+    verifier = auth.TokenVerifier(keys=auth.keys_from_jwks(key_ring.jwks()))
+    token = sign(key_ring)
+    verify(verifier, token)
+    retired_kid = key_ring.active.kid
+    key_ring.rotate()
+    key_ring.rotate_if_due(now=time.time() + 365 * 24 * 3600)
+    assert retired_kid not in key_ring.keys
+    verifier.keys = auth.keys_from_jwks(key_ring.jwks())
+    with pytest.raises(auth.UnauthorizedException):
+        verify(verifier, token)
+
+def test_rotated_keys_are_published_before_they_sign(key_ring):
+    first = key_ring.active
+    second = key_ring.rotate()
+    # Verifiers caching the JWKS fetched now must accept the tokens of both keys
+    verifier = auth.TokenVerifier(keys=auth.keys_from_jwks(key_ring.jwks()))
+    assert key_ring.active is first
+    assert key_ring.signing_key(now=second.created_at + user_keys.JWKS_MAX_AGE) is first
+    assert key_ring.signing_key(now=second.activates_at) is second
+    assert first.retired_at == second.activates_at
+    payload = {"iss": user_keys.JWT_ISSUER, "aud": user_keys.JWT_AUDIENCE, "sub": "42", "exp": int(time.time()) + 60}
+    token = jwt.encode(payload, second.private_key, algorithm=user_keys.JWT_ALGORITHM, headers={"kid": second.kid})
+    assert verify(verifier, token)["sub"] == "42"
+
+def test_catalog_writes_require_the_writer_role(client, key_ring, monkeypatch):
+    monkeypatch.setattr(auth, "token_verifier", auth.TokenVerifier(keys=auth.keys_from_jwks(key_ring.jwks())))
+    body = {"category_title": "Books"}
+    missing = client.post("/api/category/create/", json=body)
+    assert missing.status_code == 401
+    assert missing.headers["WWW-Authenticate"] == "Bearer"
+    customer = {"Authorization": f"Bearer {sign(key_ring, roles=['customer'])}"}
+    assert client.post("/api/category/create/", json=body, headers=customer).status_code == 403
+    admin = {"Authorization": f"Bearer {sign(key_ring, roles=['catalog_admin'])}"}
+    assert client.post("/api/category/create/", json=body, headers=admin).status_code == 201
+    # Reads stay open
+    assert client.get("/api/categories/").status_code == 200
+
+def test_writes_are_refused_without_a_key(client, monkeypatch):
+    monkeypatch.setattr(auth, "token_verifier", None)
+    monkeypatch.setattr(auth, "AUTH_DISABLED", False)
+    assert client.post("/api/category/create/", json={"category_title": "Books"}).status_code == 503
+    assert client.get("/api/categories/").json() == []
+    monkeypatch.setattr(auth, "AUTH_DISABLED", True)
+    assert client.post("/api/category/create/", json={"category_title": "Books"}).status_code == 201
+
+def test_a_configured_key_is_enforced_even_when_disabled(client, key_ring, monkeypatch):
+    monkeypatch.setattr(auth, "token_verifier", auth.TokenVerifier(keys=auth.keys_from_jwks(key_ring.jwks())))
+    monkeypatch.setattr(auth, "AUTH_DISABLED", True)
+    assert client.post("/api/category/create/", json={"category_title": "Books"}).status_code == 401
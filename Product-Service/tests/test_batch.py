@@ -0,0 +1,37 @@
+"""Batch reads: the requested order, each product once, unknown IDs reported instead of failing."""
+from .conftest import service_module
+
+services = service_module("services")
+
+def batch(client, ids):
+    return client.get("/api/products/batch/", params={"ids": ids})
+
+def test_products_come_back_in_the_requested_order(client, catalog):
+    ids = [catalog[5], catalog[0], catalog[17], catalog[3]]
+    response = batch(client, ids)
+    assert response.status_code == 200
+    assert [product["product_id"] for product in response.json()["products"]] == ids
+    assert response.json()["missing"] == []
+
+def test_products_match_their_detail_representation(client, catalog):
+    product = batch(client, [catalog[2]]).json()["products"][0]
+    assert product == client.get(f"/api/product/{catalog[2]}/").json()
+
+def test_unknown_ids_are_reported_as_missing(client, catalog):
+    unknown = max(catalog) + 1
+    response = batch(client, [unknown, catalog[1], unknown + 1])
+    assert response.status_code == 200
+    assert [product["product_id"] for product in response.json()["products"]] == [catalog[1]]
+    assert response.json()["missing"] == [unknown, unknown + 1]
+
+def test_repeated_ids_are_returned_once(client, catalog):
+    response = batch(client, [catalog[4], catalog[4], catalog[1], catalog[4]])
+    assert [product["product_id"] for product in response.json()["products"]] == [catalog[4], catalog[1]]
+
+def test_oversized_batches_are_rejected(client, catalog, monkeypatch):
+    monkeypatch.setattr(services, "MAX_BATCH_SIZE", 3)
+    assert batch(client, catalog[:4]).status_code == 422
+    assert batch(client, catalog[:3]).status_code == 200
+
+def test_ids_are_required(client, catalog):
+    assert client.get("/api/products/batch/").status_code == 422
@@ -0,0 +1,63 @@
+"""Bulk price and stock updates: a status per product in request order, invalid batches rejected whole."""
+import pytest
+from sqlalchemy.exc import OperationalError
+from .conftest import service_module
+
+services = service_module("services")
+
+def bulk(client, updates: dict):
+    return client.patch("/api/products/bulk/", json={str(product_id): item for product_id, item in updates.items()})
+
+def product(client, product_id: int) -> dict:
+    return client.get(f"/api/product/{product_id}/").json()
+
+def test_each_product_gets_its_status_in_request_order(client, catalog):
+    unknown = max(catalog) + 1
+    response = bulk(client, {
+        catalog[3]: {"price": 99.5},
+        unknown: {"price": 1.0},
+        catalog[0]: {"price": 10.0, "quantity": 5},
+        catalog[1]: {"quantity": 0},
+    })
+    assert response.status_code == 200
+    body = response.json()
+    assert [(result["product_id"], result["status"]) for result in body["results"]] == [
+        (catalog[3], "updated"), (unknown, "not_found"), (catalog[0], "unchanged"), (catalog[1], "updated"),
+    ]
+    assert (body["updated"], body["unchanged"], body["not_found"], body["failed"]) == (2, 1, 1, 0)
+
+def test_fields_left_out_keep_their_value(client, catalog):
+    product(client, catalog[3])
+    bulk(client, {catalog[3]: {"price": 99.5}, catalog[4]: {"quantity": 42}})
+    # The cached representations were dropped
+    assert (product(client, catalog[3])["price"], product(client, catalog[3])["quantity"]) == (99.5, 5)
+    assert (product(client, catalog[4])["price"], product(client, catalog[4])["quantity"]) == (14.0, 42)
+
+def test_updates_span_several_chunks(client, catalog, monkeypatch):
+    monkeypatch.setattr(services, "BULK_UPDATE_CHUNK_SIZE", 4)
+    response = bulk(client, {product_id: {"quantity": 7} for product_id in catalog[:10]})
+    assert response.json()["updated"] == 10
+    assert {product(client, product_id)["quantity"] for product_id in catalog[:10]} == {7}
+
+@pytest.mark.parametrize("item", [{"price": -1.0}, {"quantity": -1}, {"price": None}, {"quantity": "many"}])
+def test_invalid_items_reject_the_whole_batch(client, catalog, item):
+    response = bulk(client, {catalog[0]: {"price": 1.0}, catalog[1]: item})
+    assert response.status_code == 422
+    assert product(client, catalog[0])["price"] == 10.0
+
+def test_oversized_batches_are_rejected(client, catalog, monkeypatch):
+    monkeypatch.setattr(services, "MAX_BULK_UPDATE_SIZE", 3)
+    response = bulk(client, {product_id: {"quantity": 1} for product_id in catalog[:4]})
+    assert response.status_code == 422
+    assert "maximum of 3" in response.json()["detail"]
+    assert bulk(client, {product_id: {"quantity": 1} for product_id in catalog[:3]}).status_code == 200
+
+def test_failed_chunks_are_reported_and_rolled_back(client, catalog, monkeypatch):
+    async def failing_record_events(db, events):
+        raise OperationalError("INSERT INTO catalog_events", {}, Exception("disk I/O error"))
+    monkeypatch.setattr(services, "record_events", failing_record_events)
+    body = bulk(client, {catalog[0]: {"price": 1.0}, catalog[1]: {"price": 11.0}}).json()
+    assert [(result["status"], result["detail"]) for result in body["results"]] == [
+        ("failed", "Database error: disk I/O error"), ("unchanged", None),
+    ]
+    assert product(client, catalog[0])["price"] == 10.0
@@ -0,0 +1,47 @@
+"""Cache backends, the Redis one on an in-process fake, and invalidation on writes."""
+import asyncio
+import pytest
+from .conftest import service_module
+
+cache = service_module("cache")
+
+def read_through(backend, key, value):
+    loads = []
+
+    async def loader():
+        loads.append(key)
+        return value
+    return asyncio.run(backend.read_through(key, loader)), loads
+
+def test_lru_cache_reads_through_and_evicts():
+    backend = cache.LRUCache(max_size=2, ttl=60)
+    assert read_through(backend, "a", b"1") == (b"1", ["a"])
+    assert read_through(backend, "a", b"other") == (b"1", [])
+    read_through(backend, "b", b"2")
+    read_through(backend, "c", b"3")
+    assert asyncio.run(backend.get("a")) is None
+    stats = asyncio.run(backend.stats())
+    assert (stats["hits"], stats["misses"], stats["evictions"]) == (1, 3, 1)
+
+def test_lru_cache_expires_entries():
+    backend = cache.LRUCache(ttl=0)
+    read_through(backend, "a", b"1")
+    assert read_through(backend, "a", b"2") == (b"2", ["a"])
+
+def test_redis_cache_on_a_fake_client():
+    fakeredis = pytest.importorskip("fakeredis")
+    backend = cache.RedisCache(fakeredis.FakeAsyncRedis(), ttl=60)
+    assert read_through(backend, "product:1", b"1") == (b"1", ["product:1"])
+    assert read_through(backend, "product:1", b"other") == (b"1", [])
+    asyncio.run(backend.delete(iter(["product:1"])))
+    assert read_through(backend, "product:1", b"2") == (b"2", ["product:1"])
+
+def test_writes_invalidate_cached_products(client, catalog):
+    product_id = catalog[0]
+    before = client.get(f"/api/product/{product_id}/")
+    assert client.patch(f"/api/product/{product_id}/", json={"price": 99.5}).status_code == 200
+    after = client.get(f"/api/product/{product_id}/")
+    assert after.json()["price"] == 99.5
+    assert after.headers["ETag"] != before.headers["ETag"]
+    client.patch("/api/products/bulk/", json={str(product_id): {"quantity": 0}})
+    assert client.get(f"/api/product/{product_id}/").json()["quantity"] == 0
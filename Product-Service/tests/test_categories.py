@@ -0,0 +1,81 @@
+"""Category tree: titles stay unique and subtree product counts follow every write."""
+import json
+import pytest
+
+PRODUCT = {"product_description": "In the tree", "price": 1.0, "quantity": 1, "images": []}
+
+@pytest.fixture()
+def tree_ids(client):
+    """Electronics > Phones > Android, and Home at the root."""
+    ids = {}
+    for title, parent in (("Electronics", None), ("Phones", "Electronics"), ("Android", "Phones"), ("Home", None)):
+        response = client.post("/api/category/create/", json={"category_title": title, "parent_title": parent})
+        assert response.status_code == 201
+        ids[title] = response.json()["category_id"]
+    return ids
+
+def add_product(client, title: str, category_title: str) -> int:
+    response = client.post("/api/product/create/", json={**PRODUCT, "product_title": title, "category_title": category_title})
+    assert response.status_code == 201
+    return response.json()["product_id"]
+
+def counts(client) -> dict:
+    def walk(nodes):
+        for node in nodes:
+            yield node["category_title"], node["product_count"]
+            yield from walk(node["children"])
+    return dict(walk(client.get("/api/categories/tree/").json()))
+
+def test_renaming_to_a_taken_title_is_a_conflict(client, tree_ids):
+    response = client.patch(f"/api/category/{tree_ids['Home']}/", json={"category_title": "Phones"})
+    assert response.status_code == 409
+    assert client.get("/api/category/Home/").status_code == 200
+    # Keeping its own title is not a conflict
+    assert client.patch(f"/api/category/{tree_ids['Home']}/", json={"category_title": "Home"}).status_code == 200
+
+def test_creating_a_taken_title_is_a_conflict(client, tree_ids):
+    assert client.post("/api/category/create/", json={"category_title": "Android"}).status_code == 409
+
+def test_counts_include_descendants_after_create(client, tree_ids):
+    add_product(client, "Pixel", "Android")
+    add_product(client, "Charger", "Phones")
+    add_product(client, "Lamp", "Home")
+    assert counts(client) == {"Electronics": 2, "Phones": 2, "Android": 1, "Home": 1}
+
+def test_counts_follow_moved_categories(client, tree_ids):
+    add_product(client, "Pixel", "Android")
+    add_product(client, "Charger", "Phones")
+    moved = client.patch(f"/api/category/{tree_ids['Phones']}/", json={"category_title": "Phones", "parent_title": "Home"})
+    assert moved.status_code == 200
+    assert counts(client) == {"Electronics": 0, "Home": 2, "Phones": 2, "Android": 1}
+    # A category cannot move under its own subtree
+    loop = client.patch(f"/api/category/{tree_ids['Phones']}/", json={"category_title": "Phones", "parent_title": "Android"})
+    assert loop.status_code == 400
+    assert counts(client) == {"Electronics": 0, "Home": 2, "Phones": 2, "Android": 1}
+
+def test_counts_follow_moved_and_deleted_products(client, tree_ids):
+    pixel = add_product(client, "Pixel", "Android")
+    lamp = add_product(client, "Lamp", "Home")
+    assert client.patch(f"/api/product/{lamp}/", json={"category_title": "Android"}).status_code == 200
+    assert counts(client) == {"Electronics": 2, "Phones": 2, "Android": 2, "Home": 0}
+    assert client.delete(f"/api/product/{pixel}/").status_code == 204
+    assert counts(client) == {"Electronics": 1, "Phones": 1, "Android": 1, "Home": 0}
+
+def test_counts_include_imported_products(client, tree_ids):
+    rows = [
+        {**PRODUCT, "product_title": "Imported phone", "category_title": "Android"},
+        {**PRODUCT, "product_title": "Imported case", "category_title": "Phones"},
+        {**PRODUCT, "product_title": "Lost", "category_title": "Nowhere"},
+    ]
+    response = client.post("/api/products/import/", content=json.dumps(rows), headers={"content-type": "application/json"})
+    assert response.json()["created"] == 2
+    assert response.json()["failed"] == 1
+    assert counts(client) == {"Electronics": 2, "Phones": 2, "Android": 1, "Home": 0}
+
+def test_deleting_an_empty_leaf_keeps_the_counts(client, tree_ids):
+    add_product(client, "Charger", "Phones")
+    assert client.delete(f"/api/category/{tree_ids['Android']}/").status_code == 204
+    assert counts(client) == {"Electronics": 1, "Phones": 1, "Home": 0}
+    # Categories with products or subcategories stay
+    assert client.delete(f"/api/category/{tree_ids['Phones']}/").status_code == 400
+    assert client.delete(f"/api/category/{tree_ids['Electronics']}/").status_code == 400
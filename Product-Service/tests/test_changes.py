@@ -0,0 +1,111 @@
+"""Change feed: events are numbered in commit order, and a consumer resuming from its last seq misses none."""
+import asyncio
+import threading
+import time
+from datetime import timedelta
+from sqlalchemy import insert, text
+from .conftest import service_module
+
+outbox = service_module("outbox")
+models = service_module("models")
+
+def run(operation):
+    async def with_session():
+        async with service_module("db").AsyncSessionLocal() as db:
+            return await operation(db)
+    return asyncio.run(with_session())
+
+def sequence(limit: int = 1000) -> int:
+    return run(lambda db: outbox.sequence_events(db=db, limit=limit))
+
+def record(*event_ids: int):
+    """Commit events with the given IDs, like writers that took them and committed in this order."""
+    async def insert_events(db):
+        await db.execute(insert(models.CatalogEvent), [
+            {"event_id": event_id, **outbox.catalog_event("product", event_id, "updated")} for event_id in event_ids
+        ])
+        await db.commit()
+    run(insert_events)
+
+def feed(client, **params) -> dict:
+    response = client.get("/api/changes/", params=params)
+    assert response.status_code == 200
+    return response.json()
+
+def test_events_are_hidden_until_numbered(client, app_db):
+    record(1, 2)
+    assert feed(client)["events"] == []
+    assert sequence() == 2
+    body = feed(client)
+    assert [(event["seq"], event["entity_id"]) for event in body["events"]] == [(1, 1), (2, 2)]
+    assert body["last_seq"] == 2
+    assert sequence() == 0
+
+def test_late_commits_come_after_what_was_read(client, app_db):
+    # Event 3 belongs to a transaction that started first but committed last
+    record(4, 5)
+    sequence()
+    last_seq = feed(client)["last_seq"]
+    record(3)
+    sequence()
+    assert [(event["seq"], event["entity_id"]) for event in feed(client, after=last_seq)["events"]] == [(3, 3)]
+
+def test_resuming_pages_through_every_event_once(client, app_db):
+    record(*range(1, 26))
+    assert sequence(limit=10) == 10
+    assert sequence(limit=10) == 10
+    assert sequence(limit=10) == 5
+    seen, after = [], None
+    while True:
+        body = feed(client, **({"after": after} if after is not None else {}), limit=7)
+        if not body["events"]:
+            break
+        seen += [event["seq"] for event in body["events"]]
+        after = body["last_seq"]
+    assert seen == list(range(1, 26))
+    assert after == 25
+
+def test_writes_show_up_in_order(client, app_db):
+    client.post("/api/category/create/", json={"category_title": "Feed"})
+    product = client.post("/api/product/create/", json={
+        "product_title": "Fed", "product_description": "Watched", "price": 1.0,
+        "quantity": 3, "category_title": "Feed", "images": [],
+    }).json()
+    client.patch(f"/api/product/{product['product_id']}/", json={"price": 2.0})
+    client.delete(f"/api/product/{product['product_id']}/")
+    sequence()
+    events = feed(client)["events"]
+    assert [(event["entity"], event["action"]) for event in events] == [
+        ("category", "created"), ("product", "created"), ("product", "updated"), ("product", "deleted"),
+    ]
+    assert [event["seq"] for event in events] == [1, 2, 3, 4]
+
+def test_pruning_keeps_the_numbering_going(client, app_db):
+    record(1, 2, 3)
+    sequence()
+    record(4)
+    assert run(lambda db: outbox.delete_old_events(db=db, max_age=timedelta(seconds=-1))) == 2
+    # The last numbered event and the unnumbered one stay
+    assert sequence() == 1
+    assert [event["seq"] for event in feed(client)["events"]] == [3, 4]
+
+def test_the_relay_wakes_long_polling_readers(app_db):
+    from fastapi.testclient import TestClient
+    with TestClient(service_module("main").app) as client:
+        def write():
+            time.sleep(0.3)
+            client.post("/api/category/create/", json={"category_title": "Woken"})
+        writer = threading.Thread(target=write)
+        writer.start()
+        started = time.monotonic()
+        body = feed(client, wait=10)
+        writer.join()
+    assert time.monotonic() - started < 5
+    assert [(event["entity"], event["action"]) for event in body["events"]] == [("category", "created")]
+
+def test_the_feed_reads_by_the_seq_index(app_db):
+    with app_db.engine.connect() as connection:
+        rows = connection.execute(text(
+            "EXPLAIN QUERY PLAN SELECT event_id FROM catalog_events WHERE seq > 10 ORDER BY seq LIMIT 100"
+        )).all()
+    assert "ix_catalog_events_seq" in "\n".join(row[-1] for row in rows)
@@ -0,0 +1,54 @@
+"""Conditional GETs: a matching If-None-Match gets a 304, every change gets a new ETag."""
+import pytest
+
+def revalidate(client, url: str, etag: str):
+    return client.get(url, headers={"If-None-Match": etag})
+
+@pytest.mark.parametrize("url", ["/api/product/{id}/", "/api/products/?limit=5", "/api/product/{id}/images/", "/api/category/Books/"])
+def test_matching_etags_get_304(client, catalog, url):
+    url = url.format(id=catalog[1])
+    response = client.get(url)
+    assert response.status_code == 200
+    etag = response.headers["ETag"]
+    not_modified = revalidate(client, url, etag)
+    assert not_modified.status_code == 304
+    assert not_modified.content == b""
+    assert not_modified.headers["ETag"] == etag
+
+@pytest.mark.parametrize("header", ["W/{etag}", '"other", {etag}', "*"])
+def test_if_none_match_uses_weak_comparison_and_lists(client, catalog, header):
+    url = f"/api/product/{catalog[0]}/"
+    etag = client.get(url).headers["ETag"]
+    assert revalidate(client, url, header.format(etag=etag)).status_code == 304
+
+def test_stale_etags_get_the_new_representation(client, catalog):
+    url = f"/api/product/{catalog[0]}/"
+    etag = client.get(url).headers["ETag"]
+    assert client.patch(url, json={"price": 99.0}).status_code == 200
+    response = revalidate(client, url, etag)
+    assert response.status_code == 200
+    assert response.json()["price"] == 99.0
+    assert response.headers["ETag"] != etag
+
+def test_list_etag_changes_with_its_products(client, catalog):
+    url = "/api/products/?limit=5"
+    etag = client.get(url).headers["ETag"]
+    assert client.post(f"/api/product/{catalog[2]}/image/", json={"image_url": "https://images.example/new.png"}).status_code == 201
+    assert revalidate(client, url, etag).status_code == 200
+
+def test_product_etag_changes_with_its_category(client, catalog):
+    # Products embed their category, a rename changes their representation
+    url = f"/api/product/{catalog[1]}/"
+    etag = client.get(url).headers["ETag"]
+    category_id = client.get("/api/category/Books/").json()["category_id"]
+    assert client.patch(f"/api/category/{category_id}/", json={"category_title": "Novels"}).status_code == 200
+    response = revalidate(client, url, etag)
+    assert response.status_code == 200
+    assert response.json()["category"]["category_title"] == "Novels"
+
+def test_sparse_representations_have_their_own_etag(client, catalog):
+    url = f"/api/product/{catalog[0]}/"
+    full = client.get(url).headers["ETag"]
+    sparse = client.get(url, params={"fields": "product_title"}).headers["ETag"]
+    assert full != sparse
+    assert client.get(url, params={"fields": "product_title"}, headers={"If-None-Match": full}).status_code == 200
@@ -0,0 +1,58 @@
+"""Sparse fieldsets: fields= and include= trim the response to the keys asked for, in schema order."""
+import pytest
+
+FULL_PRODUCT = ["product_title", "product_description", "price", "quantity", "product_id", "category", "images", "created_at", "updated_at"]
+
+def test_everything_is_returned_by_default(client, catalog):
+    product = client.get(f"/api/product/{catalog[0]}/").json()
+    assert list(product) == FULL_PRODUCT
+    assert list(client.get("/api/products/").json()[0]) == FULL_PRODUCT
+
+def test_fields_pick_scalars_and_keep_the_id(client, catalog):
+    product = client.get(f"/api/product/{catalog[0]}/", params={"fields": "price,product_title"}).json()
+    # Schema order, whatever the order asked for
+    assert list(product) == ["product_title", "price", "product_id", "category", "images"]
+
+def test_include_picks_relations(client, catalog):
+    product = client.get(f"/api/product/{catalog[1]}/", params={"fields": "price", "include": "category"}).json()
+    assert list(product) == ["price", "product_id", "category"]
+    assert product["category"]["category_title"] == "Books"
+    bare = client.get(f"/api/product/{catalog[1]}/", params={"fields": "price", "include": ""}).json()
+    assert list(bare) == ["price", "product_id"]
+
+def test_list_and_category_products_are_trimmed_alike(client, catalog):
+    params = {"fields": "quantity", "include": "images", "limit": 5}
+    products = client.get("/api/products/", params=params).json()
+    assert [list(product) for product in products] == [["quantity", "product_id", "images"]] * 5
+    assert all(len(product["images"]) == 2 for product in products)
+    books = client.get("/api/category/Books/products/", params=params).json()
+    assert [list(product) for product in books] == [["quantity", "product_id", "images"]] * 5
+
+def test_trimmed_values_match_the_full_representation(client, catalog):
+    full = client.get(f"/api/product/{catalog[2]}/").json()
+    sparse = client.get(f"/api/product/{catalog[2]}/", params={"fields": "price,quantity", "include": "images"}).json()
+    assert sparse == {key: full[key] for key in sparse}
+
+def test_categories_are_trimmed(client, catalog):
+    categories = client.get("/api/categories/", params={"fields": "category_title"}).json()
+    assert [list(category) for category in categories] == [["category_title", "category_id"]] * 2
+    category = client.get("/api/category/Games/", params={"fields": "updated_at"}).json()
+    assert list(category) == ["category_id", "updated_at"]
+
+def test_sparse_responses_have_their_own_etag(client, catalog):
+    full = client.get(f"/api/product/{catalog[0]}/")
+    sparse = client.get(f"/api/product/{catalog[0]}/", params={"fields": "price"})
+    assert full.headers["etag"] != sparse.headers["etag"]
+
+@pytest.mark.parametrize("url, params", [
+    ("/api/products/", {"fields": "price,colour"}),
+    ("/api/products/", {"include": "reviews"}),
+    ("/api/product/{id}/", {"fields": "category"}),
+    ("/api/category/Books/products/", {"include": "price"}),
+    ("/api/categories/", {"fields": "product_title"}),
+    ("/api/category/Books/", {"fields": "nope"}),
+])
+def test_unknown_names_are_rejected(client, catalog, url, params):
+    response = client.get(url.format(id=catalog[0]), params=params)
+    assert response.status_code == 400
+    assert "Unknown" in response.json()["detail"]
@@ -0,0 +1,88 @@
+"""Idempotency keys: a retried create replays the first response, a reused key with another body is rejected."""
+import asyncio
+from datetime import timedelta
+import httpx
+import pytest
+from .conftest import service_module
+
+idempotency = service_module("idempotency")
+REPLAYED = idempotency.IDEMPOTENT_REPLAYED_HEADER
+
+@pytest.fixture()
+def product_body(client):
+    assert client.post("/api/category/create/", json={"category_title": "Retries"}).status_code == 201
+    return {
+        "product_title": "Retried", "product_description": "Sent twice", "price": 3.5,
+        "quantity": 2, "category_title": "Retries", "images": [],
+    }
+
+def product_count(client) -> int:
+    return len(client.get("/api/category/Retries/products/", params={"limit": 100}).json())
+
+def test_retried_product_create_replays_the_response(client, product_body):
+    headers = {"Idempotency-Key": "order-1"}
+    first = client.post("/api/product/create/", json=product_body, headers=headers)
+    assert first.status_code == 201
+    assert REPLAYED not in first.headers
+    retry = client.post("/api/product/create/", json=product_body, headers=headers)
+    assert retry.status_code == 201
+    assert retry.headers[REPLAYED] == "true"
+    assert retry.content == first.content
+    assert product_count(client) == 1
+
+def test_a_key_reused_with_another_body_is_rejected(client, product_body):
+    headers = {"Idempotency-Key": "order-2"}
+    assert client.post("/api/product/create/", json=product_body, headers=headers).status_code == 201
+    response = client.post("/api/product/create/", json={**product_body, "price": 4.0}, headers=headers)
+    assert response.status_code == 422
+    assert "order-2" in response.json()["detail"]
+    assert product_count(client) == 1
+
+def test_requests_without_a_key_are_not_deduplicated(client, product_body):
+    assert client.post("/api/product/create/", json=product_body).status_code == 201
+    assert client.post("/api/product/create/", json=product_body).status_code == 201
+    assert product_count(client) == 2
+
+def test_keys_are_scoped_per_endpoint(client, product_body):
+    headers = {"Idempotency-Key": "shared"}
+    product = client.post("/api/product/create/", json=product_body, headers=headers).json()
+    image = client.post(f"/api/product/{product['product_id']}/image/", json={"image_url": "https://images.example/a.png"}, headers=headers)
+    assert image.status_code == 201
+    assert REPLAYED not in image.headers
+
+def test_retried_image_create_replays_the_response(client, product_body):
+    product_id = client.post("/api/product/create/", json=product_body).json()["product_id"]
+    url, headers = f"/api/product/{product_id}/image/", {"Idempotency-Key": "image-1"}
+    first = client.post(url, json={"image_url": "https://images.example/a.png"}, headers=headers)
+    retry = client.post(url, json={"image_url": "https://images.example/a.png"}, headers=headers)
+    assert retry.headers[REPLAYED] == "true"
+    assert retry.content == first.content
+    assert len(client.get(f"/api/product/{product_id}/").json()["images"]) == 1
+    conflict = client.post(url, json={"image_url": "https://images.example/b.png"}, headers=headers)
+    assert conflict.status_code == 422
+
+def test_concurrent_retries_create_once(client, product_body):
+    async def send():
+        transport = httpx.ASGITransport(app=service_module("main").app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://test") as async_client:
+            return await asyncio.gather(*(
+                async_client.post("/api/product/create/", json=product_body, headers={"Idempotency-Key": "race"})
+                for _ in range(8)
+            ))
+    responses = asyncio.run(send())
+    assert {response.status_code for response in responses} == {201}
+    assert len({response.content for response in responses}) == 1
+    assert sum(REPLAYED in response.headers for response in responses) == 7
+    assert product_count(client) == 1
+
+def test_expired_keys_are_swept(client, product_body):
+    assert client.post("/api/product/create/", json=product_body, headers={"Idempotency-Key": "old"}).status_code == 201
+
+    async def sweep(max_age):
+        async with service_module("db").AsyncSessionLocal() as db:
+            return await idempotency.delete_expired_idempotency_keys(db=db, max_age=max_age)
+    assert asyncio.run(sweep(timedelta(hours=1))) == 0
+    assert asyncio.run(sweep(timedelta(seconds=-1))) == 1
+    # The key is free again, the retry creates a second product
+    assert client.post("/api/product/create/", json=product_body, headers={"Idempotency-Key": "old"}).status_code == 201
+    assert product_count(client) == 2
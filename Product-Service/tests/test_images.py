@@ -0,0 +1,54 @@
+"""Uploads are checked before they are stored, and their files go with their product."""
+import io
+import os
+import pytest
+from PIL import Image
+from .conftest import service_module
+
+imaging = service_module("imaging")
+storage = service_module("storage")
+
+def encode(format: str, size=(640, 480)) -> bytes:
+    buffer = io.BytesIO()
+    Image.new("RGB", size, (200, 30, 30)).save(buffer, format)
+    return buffer.getvalue()
+
+def stored_files(product_id: int) -> list:
+    directory = storage.image_store.path(f"products/{product_id}")
+    return sorted(os.listdir(directory)) if os.path.isdir(directory) else []
+
+@pytest.fixture()
+def product_id(client):
+    assert client.post("/api/category/create/", json={"category_title": "Books"}).status_code == 201
+    response = client.post("/api/product/create/", json={
+        "product_title": "Product", "product_description": "A product", "price": 9.5,
+        "quantity": 3, "category_title": "Books", "images": [],
+    })
+    return response.json()["product_id"]
+
+@pytest.mark.parametrize("body, content_type, status", [
+    (encode("PNG")[:200], "image/png", 400),
+    (b"not an image", "image/jpeg", 400),
+    (encode("PNG"), "image/jpeg", 415),
+])
+def test_invalid_uploads_are_not_stored(client, product_id, body, content_type, status):
+    response = client.post(f"/api/product/{product_id}/image/upload/", content=body, headers={"content-type": content_type})
+    assert response.status_code == status
+    assert stored_files(product_id) == []
+
+def test_images_above_the_pixel_limit_are_rejected(monkeypatch):
+    monkeypatch.setattr(imaging, "MAX_IMAGE_PIXELS", 640 * 480 - 1)
+    # Between the limit and twice the limit Pillow only warns
+    with pytest.raises(ValueError):
+        imaging.inspect_image(encode("PNG"))
+    with pytest.raises(Image.DecompressionBombWarning):
+        imaging.render_variants(encode("PNG"))
+    assert imaging.inspect_image(encode("PNG", size=(64, 48))) == "image/png"
+
+def test_deleting_a_product_removes_its_stored_images(client, product_id):
+    response = client.post(f"/api/product/{product_id}/image/upload/", content=encode("JPEG"), headers={"content-type": "image/jpeg"})
+    assert response.status_code == 201
+    # The original and the variants rendered by the background task
+    assert len(stored_files(product_id)) > 1
+    assert client.delete(f"/api/product/{product_id}/").status_code == 204
+    assert stored_files(product_id) == []
@@ -0,0 +1,49 @@
+"""The indexes added for foreign keys and hot filters are the ones SQLite plans with."""
+import pytest
+from sqlalchemy import text
+
+def query_plan(engine, sql: str, **parameters) -> str:
+    with engine.connect() as connection:
+        rows = connection.execute(text(f"EXPLAIN QUERY PLAN {sql}"), parameters).all()
+    return "\n".join(row[-1] for row in rows)
+
+@pytest.mark.parametrize("sql, parameters, index", [
+    (
+        "SELECT product_id FROM products WHERE category_id = :category_id ORDER BY product_id LIMIT 20",
+        {"category_id": 1},
+        "ix_products_category_id_product_id",
+    ),
+    (
+        "SELECT product_id FROM products WHERE category_id = :category_id AND price BETWEEN :low AND :high",
+        {"category_id": 1, "low": 10, "high": 20},
+        "ix_products_category_id_price",
+    ),
+    (
+        "SELECT image_id FROM product_images WHERE product_id = :product_id ORDER BY image_id",
+        {"product_id": 1},
+        "ix_product_images_product_id_image_id",
+    ),
+    (
+        "SELECT category_id FROM categories WHERE parent_id = :parent_id",
+        {"parent_id": 1},
+        "ix_categories_parent_id",
+    ),
+    (
+        "SELECT reservation_id FROM stock_reservations WHERE status = 'pending' AND expires_at < :now",
+        {"now": "2030-01-01"},
+        "ix_stock_reservations_status_expires_at",
+    ),
+    (
+        "SELECT created_at FROM idempotency_keys WHERE created_at < :cutoff",
+        {"cutoff": "2030-01-01"},
+        "ix_idempotency_keys_created_at",
+    ),
+    (
+        "SELECT seq FROM catalog_events WHERE created_at < :cutoff",
+        {"cutoff": "2030-01-01"},
+        "ix_catalog_events_created_at",
+    ),
+])
+def test_query_uses_index(app_db, sql, parameters, index):
+    plan = query_plan(app_db.engine, sql, **parameters)
+    assert index in plan, plan
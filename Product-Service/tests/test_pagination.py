@@ -0,0 +1,52 @@
+"""Keyset pages: X-Next-Cursor walks a list once, in ID order, however it changes meanwhile."""
+import pytest
+from .conftest import service_module
+
+pagination = service_module("pagination")
+
+def walk(client, url: str, limit: int, on_page=None) -> list:
+    ids, cursor = [], None
+    while True:
+        response = client.get(url, params={"limit": limit, **({"cursor": cursor} if cursor else {})})
+        assert response.status_code == 200
+        page = response.json()
+        ids += [item.get("product_id", item.get("category_id")) for item in page]
+        cursor = response.headers.get(pagination.NEXT_CURSOR_HEADER)
+        if cursor is None:
+            return ids
+        assert len(page) == limit
+        if on_page is not None:
+            on_page()
+
+def test_cursor_pages_cover_the_products_once(client, catalog):
+    assert walk(client, "/api/products/", limit=7) == sorted(catalog)
+
+def test_cursor_pages_do_not_shift_when_rows_change(client, catalog):
+    removed = []
+
+    def delete_seen_product():
+        # An offset page would now skip a product
+        if not removed:
+            removed.append(catalog[0])
+            assert client.delete(f"/api/product/{catalog[0]}/").status_code == 204
+
+    assert walk(client, "/api/products/", limit=5, on_page=delete_seen_product) == sorted(catalog)
+
+def test_full_last_page_ends_with_an_empty_page(client, catalog):
+    response = client.get("/api/products/", params={"limit": len(catalog)})
+    cursor = response.headers[pagination.NEXT_CURSOR_HEADER]
+    last = client.get("/api/products/", params={"limit": len(catalog), "cursor": cursor})
+    assert last.json() == []
+    assert pagination.NEXT_CURSOR_HEADER not in last.headers
+
+def test_category_lists_page_by_cursor(client, catalog):
+    books = [product_id for index, product_id in enumerate(catalog) if index % 2]
+    assert walk(client, "/api/category/Books/products/", limit=4) == books
+    assert len(walk(client, "/api/categories/", limit=1)) == 2
+
+@pytest.mark.parametrize("cursor", ["not-a-cursor", pagination.encode_cursor(1)[:-2], "eyJhZnRlciI6ICJ4In0"])
+def test_invalid_cursors_are_rejected(client, catalog, cursor):
+    assert client.get("/api/products/", params={"cursor": cursor}).status_code == 400
+
+def test_cursor_round_trip():
+    assert pagination.decode_cursor(pagination.encode_cursor(12345)) == 12345
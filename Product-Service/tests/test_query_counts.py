@@ -0,0 +1,55 @@
+"""Statements per request on the read paths, so that N+1 regressions fail the build."""
+import pytest
+from .conftest import service_module
+
+@pytest.fixture()
+def uncached(app_db):
+    services = service_module("services")
+    cache = service_module("cache")
+    services.cache = cache.NullCache()
+
+def test_product_list_statements_do_not_grow_with_page_size(client, catalog, statements):
+    statements.reset()
+    assert len(client.get("/api/products/?limit=5").json()) == 5
+    small_page = statements.count
+    statements.reset()
+    assert len(client.get("/api/products/?limit=30").json()) == 30
+    assert statements.count == small_page
+    # The ETag of the page, products with their categories, their images
+    assert statements.count <= 3
+
+def test_product_detail_statements(client, catalog, statements, uncached):
+    statements.reset()
+    response = client.get(f"/api/product/{catalog[0]}/")
+    assert response.status_code == 200
+    assert len(response.json()["images"]) == 2
+    assert statements.count <= 2
+
+def test_cached_product_detail_runs_no_statements(client, catalog, statements):
+    client.get(f"/api/product/{catalog[0]}/")
+    statements.reset()
+    assert client.get(f"/api/product/{catalog[0]}/").status_code == 200
+    assert statements.count == 0
+
+def test_product_batch_statements(client, catalog, statements):
+    query = "&".join(f"ids={product_id}" for product_id in catalog[:20])
+    statements.reset()
+    batch = client.get(f"/api/products/batch/?{query}&ids=999999").json()
+    assert len(batch["products"]) == 20
+    assert batch["missing"] == [999999]
+    assert statements.count <= 2
+
+def test_category_products_statements(client, catalog, statements):
+    statements.reset()
+    products = client.get("/api/category/Books/products/?limit=15").json()
+    assert len(products) == 15
+    # The category, its products, their images
+    assert statements.count <= 3
+
+def test_bulk_update_statements_do_not_grow_with_batch_size(client, catalog, statements):
+    statements.reset()
+    updates = {str(product_id): {"price": 1.5} for product_id in catalog}
+    result = client.patch("/api/products/bulk/", json=updates).json()
+    assert result["updated"] == len(catalog)
+    # Lock and read, one executemany UPDATE, the outbox insert
+    assert statements.count <= 3
@@ -0,0 +1,45 @@
+"""Read routing, with a second engine on the SQLite file standing in for a replica."""
+import asyncio
+import pytest
+from sqlalchemy import event
+from .conftest import StatementCounter, service_module
+
+replicas = service_module("replicas")
+
+@pytest.fixture()
+def replica(app_db, monkeypatch):
+    router = replicas.ReplicaRouter([str(app_db.engine.url)])
+    monkeypatch.setattr(replicas, "replica_router", router)
+    monkeypatch.setattr(replicas, "recent_writers", replicas.RecentWriters())
+    stand_in = router.replicas[0]
+    counter = StatementCounter()
+    event.listen(stand_in.engine.sync_engine, "before_cursor_execute", counter)
+    yield stand_in, counter
+    asyncio.run(stand_in.engine.dispose())
+
+def test_reads_go_to_the_replica(client, catalog, statements, replica):
+    _, replica_statements = replica
+    statements.reset()
+    assert len(client.get("/api/products/?limit=10").json()) == 10
+    assert replica_statements.count > 0
+    assert statements.count == 0
+
+def test_clients_read_their_writes_from_the_primary(client, catalog, statements, replica):
+    _, replica_statements = replica
+    writer = {"X-Client-ID": "writer"}
+    assert client.patch(f"/api/product/{catalog[0]}/", json={"price": 1.0}, headers=writer).status_code == 200
+    statements.reset()
+    client.get("/api/products/", headers=writer)
+    assert statements.count > 0
+    replica_statements.reset()
+    client.cookies.clear()
+    client.get("/api/products/", headers={"X-Client-ID": "reader"})
+    assert replica_statements.count > 0
+
+def test_unhealthy_replicas_fall_back_to_the_primary(client, catalog, statements, replica):
+    stand_in, replica_statements = replica
+    stand_in.healthy = False
+    statements.reset()
+    client.get("/api/products/")
+    assert statements.count > 0
+    assert replica_statements.count == 0
@@ -0,0 +1,72 @@
+"""Stock reservations: concurrent orders never sell more than the stock, releases give it back."""
+import asyncio
+import httpx
+import pytest
+from .conftest import service_module
+
+@pytest.fixture()
+def products(client):
+    assert client.post("/api/category/create/", json={"category_title": "Sale"}).status_code == 201
+    ids = []
+    for title, quantity in (("Hot item", 10), ("Side item", 5)):
+        response = client.post("/api/product/create/", json={
+            "product_title": title, "product_description": "On sale", "price": 5.0,
+            "quantity": quantity, "category_title": "Sale", "images": [],
+        })
+        ids.append(response.json()["product_id"])
+    return ids
+
+def stock(client, product_ids) -> list:
+    products = client.get("/api/products/batch/", params={"ids": product_ids}).json()["products"]
+    return [product["quantity"] for product in products]
+
+def reserve_concurrently(bodies: list) -> list:
+    async def send():
+        transport = httpx.ASGITransport(app=service_module("main").app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://test") as client:
+            return await asyncio.gather(*(client.post("/api/inventory/reservations/", json=body) for body in bodies))
+    return asyncio.run(send())
+
+def test_concurrent_reservations_never_oversell(client, products):
+    hot_id = products[0]
+    responses = reserve_concurrently([{"items": [{"product_id": hot_id, "quantity": 1}]}] * 40)
+    statuses = [response.status_code for response in responses]
+    assert statuses.count(201) == 10
+    assert statuses.count(409) == 30
+    assert stock(client, [hot_id]) == [0]
+
+def test_multi_item_reservations_in_either_order_never_oversell(client, products):
+    hot_id, side_id = products
+    forward = {"items": [{"product_id": hot_id, "quantity": 1}, {"product_id": side_id, "quantity": 1}]}
+    backward = {"items": [{"product_id": side_id, "quantity": 1}, {"product_id": hot_id, "quantity": 1}]}
+    responses = reserve_concurrently([forward, backward] * 8)
+    statuses = [response.status_code for response in responses]
+    # The side item runs out after five, a failed reservation takes nothing
+    assert statuses.count(201) == 5
+    assert statuses.count(409) == 11
+    assert stock(client, products) == [5, 0]
+
+def test_release_restores_the_stock(client, products):
+    hot_id = products[0]
+    reservation = client.post("/api/inventory/reservations/", json={"items": [{"product_id": hot_id, "quantity": 4}]}).json()
+    assert stock(client, [hot_id]) == [6]
+    released = client.post(f"/api/inventory/reservations/{reservation['reservation_id']}/release/")
+    assert released.json()["status"] == "released"
+    assert stock(client, [hot_id]) == [10]
+    # A reservation is released or committed once
+    assert client.post(f"/api/inventory/reservations/{reservation['reservation_id']}/release/").status_code == 409
+    assert client.post(f"/api/inventory/reservations/{reservation['reservation_id']}/commit/").status_code == 409
+
+def test_committed_reservations_keep_the_stock(client, products):
+    hot_id = products[0]
+    reservation = client.post("/api/inventory/reservations/", json={"items": [{"product_id": hot_id, "quantity": 3}]}).json()
+    assert client.post(f"/api/inventory/reservations/{reservation['reservation_id']}/commit/").json()["status"] == "committed"
+    assert stock(client, [hot_id]) == [7]
+
+def test_unknown_products_and_excess_quantities_take_nothing(client, products):
+    hot_id, side_id = products
+    unknown = {"items": [{"product_id": hot_id, "quantity": 1}, {"product_id": side_id + 100, "quantity": 1}]}
+    assert client.post("/api/inventory/reservations/", json=unknown).status_code == 404
+    excess = {"items": [{"product_id": hot_id, "quantity": 1}, {"product_id": side_id, "quantity": 6}]}
+    assert client.post("/api/inventory/reservations/", json=excess).status_code == 409
+    assert stock(client, products) == [10, 5]
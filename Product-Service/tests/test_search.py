@@ -0,0 +1,67 @@
+"""Full-text search: relevance order, filters, facets and inputs that are not search syntax."""
+import pytest
+
+PRODUCTS = [
+    # title, description, category, price, quantity
+    ("Desk lamp", "A lamp for the desk", "Lighting", 30.0, 4),
+    ("Lamp shade", "Fits any lamp, lamp not included", "Lighting", 12.0, 0),
+    ("Floor lamp", "Tall", "Lighting", 80.0, 2),
+    ("Reading light", "Clips onto a book, no lamp needed", "Books", 15.0, 9),
+    ("Cookbook", "Recipes", "Books", 25.0, 3),
+]
+
+@pytest.fixture()
+def products(client):
+    for title in ("Lighting", "Books"):
+        assert client.post("/api/category/create/", json={"category_title": title}).status_code == 201
+    ids = {}
+    for title, description, category, price, quantity in PRODUCTS:
+        response = client.post("/api/product/create/", json={
+            "product_title": title, "product_description": description, "price": price,
+            "quantity": quantity, "category_title": category, "images": [],
+        })
+        assert response.status_code == 201, response.text
+        ids[title] = response.json()["product_id"]
+    return ids
+
+def search(client, **params) -> dict:
+    response = client.get("/api/products/search/", params=params)
+    assert response.status_code == 200, response.text
+    return response.json()
+
+def titles(result: dict) -> list:
+    return [item["product_title"] for item in result["items"]]
+
+def test_matches_are_ordered_by_relevance(client, products):
+    result = search(client, q="lamp")
+    assert result["total"] == 4
+    # Three mentions in a short text rank above one in a long one
+    assert titles(result)[0] == "Lamp shade"
+    assert titles(result)[-1] == "Reading light"
+    assert "Cookbook" not in titles(result)
+
+def test_every_term_must_match(client, products):
+    assert titles(search(client, q="desk lamp")) == ["Desk lamp"]
+
+def test_filters_narrow_the_matches(client, products):
+    assert set(titles(search(client, q="lamp", category="Lighting"))) == {"Desk lamp", "Lamp shade", "Floor lamp"}
+    assert set(titles(search(client, q="lamp", min_price=13, max_price=50))) == {"Desk lamp", "Reading light"}
+    assert "Lamp shade" not in titles(search(client, q="lamp", in_stock=True))
+
+def test_facets_count_every_category_of_the_matches(client, products):
+    result = search(client, q="lamp", category="Books")
+    assert titles(result) == ["Reading light"]
+    assert result["facets"] == [{"category_title": "Lighting", "count": 3}, {"category_title": "Books", "count": 1}]
+
+def test_pages_split_the_ranked_matches(client, products):
+    ranked = titles(search(client, q="lamp"))
+    assert titles(search(client, q="lamp", skip=1, limit=2)) == ranked[1:3]
+
+@pytest.mark.parametrize("q", ["", "   ", "\t"])
+def test_blank_queries_list_everything(client, products, q):
+    result = search(client, q=q, in_stock=True)
+    assert result["total"] == 4
+
+@pytest.mark.parametrize("q", ['lamp"', "lamp OR", "NEAR(lamp", "*", "-lamp", "!!!"])
+def test_search_syntax_is_taken_literally(client, products, q):
+    search(client, q=q)
@@ -0,0 +1,37 @@
+"""The fast read path and the response_model path write the same bytes for the same row."""
+import re
+import pytest
+
+PRICES = [1e16, 1e22, 1.7976931348623157e308, 1e-7, 5e-324, 0.1, 19.99, 123456789.125, 3.0]
+
+@pytest.fixture()
+def product_id(client):
+    assert client.post("/api/category/create/", json={"category_title": "Edge cases"}).status_code == 201
+    response = client.post("/api/product/create/", json={
+        "product_title": "Überlänge   \"quoted\"", "product_description": "float edge cases", "price": 1.0,
+        "quantity": 1, "category_title": "Edge cases", "images": [{"image_url": "https://images.example/1.png"}],
+    })
+    return response.json()["product_id"]
+
+def price_token(body: bytes) -> bytes:
+    return re.search(rb'"price":([^,}]+)', body).group(1)
+
+@pytest.mark.parametrize("price", PRICES)
+def test_both_paths_render_floats_alike(client, product_id, price):
+    # PATCH answers through the response_model, GET detail through the fast path
+    patched = client.patch(f"/api/product/{product_id}/", json={"price": price})
+    assert patched.status_code == 200
+    detail = client.get(f"/api/product/{product_id}/")
+    assert patched.content == detail.content
+    assert detail.json()["price"] == price
+    others = [
+        client.get("/api/products/").content,
+        client.get("/api/products/batch/", params={"ids": [product_id]}).content,
+        client.get("/api/products/search/", params={"q": "float"}).content,
+        client.get("/api/category/Edge cases/products/").content,
+    ]
+    assert {price_token(body) for body in others} == {price_token(detail.content)}
+
+def test_both_paths_render_text_alike(client, product_id):
+    patched = client.patch(f"/api/product/{product_id}/", json={"product_description": "Ünïcode \u2028 \\ / \t"})
+    assert patched.content == client.get(f"/api/product/{product_id}/").content
@@ -0,0 +1,151 @@
+"""Single-flight: concurrent reads of a key share one load, and a caller going away does not fail the others."""
+import asyncio
+import httpx
+import pytest
+from .conftest import service_module
+
+singleflight = service_module("singleflight")
+services = service_module("services")
+exceptions = service_module("exceptions")
+
+class Loader:
+    """Counts its calls, each takes `delay` seconds and returns the call number or raises `error`."""
+
+    def __init__(self, delay: float = 0.05, error: Exception = None):
+        self.delay = delay
+        self.error = error
+        self.calls = 0
+
+    async def __call__(self):
+        self.calls += 1
+        call = self.calls
+        await asyncio.sleep(self.delay)
+        if self.error is not None:
+            raise self.error
+        return call
+
+def test_concurrent_loads_of_a_key_share_one_call():
+    flights, loader = singleflight.SingleFlight(), Loader()
+
+    async def run():
+        return await asyncio.gather(*(flights.do("product:1", loader) for _ in range(10)))
+    assert asyncio.run(run()) == [1] * 10
+    assert loader.calls == 1
+    assert flights.stats() == {"enabled": True, "in_flight": 0, "leaders": 1, "shared": 9, "errors": 0, "timeouts": 0}
+
+def test_finished_loads_are_not_remembered():
+    flights, loader = singleflight.SingleFlight(), Loader(delay=0)
+
+    async def run():
+        return [await flights.do("product:1", loader), await flights.do("product:1", loader)]
+    assert asyncio.run(run()) == [1, 2]
+
+def test_variants_and_keys_load_separately():
+    flights, loader = singleflight.SingleFlight(), Loader()
+
+    async def run():
+        return await asyncio.gather(
+            flights.do("product:1", loader), flights.do("product:1", loader, variant=("price",)), flights.do("product:2", loader),
+        )
+    assert sorted(asyncio.run(run())) == [1, 2, 3]
+
+def test_errors_reach_every_waiter_once():
+    flights, loader = singleflight.SingleFlight(), Loader(error=ValueError("boom"))
+
+    async def run():
+        return await asyncio.gather(*(flights.do("product:1", loader) for _ in range(3)), return_exceptions=True)
+    assert [type(result) for result in asyncio.run(run())] == [ValueError] * 3
+    assert loader.calls == 1
+    assert flights.errors == 1
+    # The next caller tries again
+    loader.error = None
+    assert asyncio.run(flights.do("product:1", loader)) == 2
+
+def test_slow_loads_time_out_for_every_waiter():
+    flights, loader = singleflight.SingleFlight(timeout=0.02), Loader(delay=1)
+
+    async def run():
+        return await asyncio.gather(*(flights.do("product:1", loader) for _ in range(3)), return_exceptions=True)
+    assert [type(result) for result in asyncio.run(run())] == [exceptions.FetchTimeoutException] * 3
+    assert flights.timeouts == 1
+    assert flights.stats()["in_flight"] == 0
+
+def test_a_cancelled_leader_leaves_the_load_to_its_waiters():
+    flights, loader = singleflight.SingleFlight(), Loader()
+
+    async def run():
+        leader = asyncio.ensure_future(flights.do("product:1", loader))
+        await asyncio.sleep(0)
+        waiter = asyncio.ensure_future(flights.do("product:1", loader))
+        await asyncio.sleep(0.01)
+        leader.cancel()
+        return await waiter, leader.cancelled()
+    assert asyncio.run(run()) == (1, True)
+    assert loader.calls == 1
+
+def test_forgotten_keys_start_a_fresh_load():
+    flights, loader = singleflight.SingleFlight(), Loader()
+
+    async def run():
+        before = asyncio.ensure_future(flights.do("product:1", loader))
+        await asyncio.sleep(0.01)
+        flight = flights.current("product:1")
+        flights.forget(["product:1"])
+        after = await flights.do("product:1", loader)
+        return await before, after, flight.forgotten
+    assert asyncio.run(run()) == (1, 2, True)
+
+def test_disabled_flights_load_every_time():
+    flights, loader = singleflight.SingleFlight(enabled=False), Loader()
+
+    async def run():
+        return await asyncio.gather(*(flights.do("product:1", loader) for _ in range(3)))
+    assert sorted(asyncio.run(run())) == [1, 2, 3]
+    assert flights.stats()["leaders"] == 0
+
+@pytest.fixture()
+def counted_loads(monkeypatch):
+    """Counts the product loads reaching the database, slowed so that concurrent requests overlap."""
+    calls = []
+    fetch_product_rows = services.fetch_product_rows
+
+    async def slow_fetch(*args, **kwargs):
+        calls.append(args)
+        await asyncio.sleep(0.05)
+        return await fetch_product_rows(*args, **kwargs)
+    monkeypatch.setattr(services, "fetch_product_rows", slow_fetch)
+    return calls
+
+def get_concurrently(urls: list) -> list:
+    async def send():
+        transport = httpx.ASGITransport(app=service_module("main").app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://test") as client:
+            return await asyncio.gather(*(client.get(url) for url in urls))
+    return asyncio.run(send())
+
+def test_concurrent_product_reads_share_one_query(client, catalog, counted_loads):
+    responses = get_concurrently([f"/api/product/{catalog[0]}/"] * 8 + [f"/api/product/{catalog[0]}/?fields=price"] * 4)
+    assert {response.status_code for response in responses} == {200}
+    assert len({response.content for response in responses[:8]}) == 1
+    # One load for the full representation, one for the narrowed one
+    assert len(counted_loads) == 2
+
+def test_a_cancelled_leader_request_still_serves_its_waiters(client, catalog, counted_loads):
+    # The load reads in a session of its own, not in the leader's, which closes when the leader goes away
+    async def run():
+        leader = asyncio.ensure_future(services.retrieve_product_payload(product_id=catalog[0]))
+        await asyncio.sleep(0.01)
+        waiters = [asyncio.ensure_future(services.retrieve_product_payload(product_id=catalog[0])) for _ in range(3)]
+        await asyncio.sleep(0.01)
+        leader.cancel()
+        return await asyncio.gather(*waiters)
+    payloads = asyncio.run(run())
+    assert len(set(payloads)) == 1
+    assert len(counted_loads) == 1
+    assert payloads[0][1] == client.get(f"/api/product/{catalog[0]}/").content
+
+def test_timed_out_reads_answer_503(client, catalog, counted_loads, monkeypatch):
+    monkeypatch.setattr(services.flights, "timeout", 0.01)
+    response = client.get(f"/api/product/{catalog[0]}/")
+    assert response.status_code == 503
+    assert response.headers["Retry-After"] == "1"
@@ -0,0 +1,10 @@
+"""Benchmarks for User-Service.
+
+Run from the repository root:
+
+    python -m User-Service.benchmarks login --workers 1,2,4,8 --requests 400
+
+Each pool size serves the same login load through the ASGI app in process,
+against a temporary SQLite database and signing key, so the throughput per
+worker count shows how password verification scales with cores.
+"""
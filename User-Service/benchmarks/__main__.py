@@ -0,0 +1,114 @@
+import argparse
+import asyncio
+import importlib
+import json
+import os
+import platform
+import statistics
+import tempfile
+import time
+from typing import List
+
+def latency_summary(latencies: List[float]) -> dict:
+    """Latency percentiles in milliseconds."""
+    milliseconds = sorted(latency * 1000 for latency in latencies)
+    cuts = statistics.quantiles(milliseconds, n=100, method="inclusive") if len(milliseconds) > 1 else milliseconds * 99
+    return {
+        "mean": round(statistics.fmean(milliseconds), 3),
+        "p50": round(cuts[49], 3),
+        "p95": round(cuts[94], 3),
+        "p99": round(cuts[98], 3),
+        "max": round(milliseconds[-1], 3),
+    }
+
+async def run_logins(app, users: int, requests: int, concurrency: int) -> dict:
+    import httpx
+    latencies = []
+    statuses = {}
+    indexes = iter(range(requests))
+
+    async def worker(client):
+        for index in indexes:
+            body = {"email": f"user{index % users}@example.com", "password": f"password-{index % users}"}
+            started_at = time.perf_counter()
+            response = await client.post("/api/auth/login/", json=body)
+            latencies.append(time.perf_counter() - started_at)
+            statuses[response.status_code] = statuses.get(response.status_code, 0) + 1
+
+    async with httpx.AsyncClient(transport=httpx.ASGITransport(app=app), base_url="http://benchmark") as client:
+        started_at = time.perf_counter()
+        await asyncio.gather(*(worker(client) for _ in range(concurrency)))
+        elapsed = time.perf_counter() - started_at
+    return {
+        "requests": requests,
+        "concurrency": concurrency,
+        "statuses": {str(status): count for status, count in sorted(statuses.items())},
+        "throughput_rps": round(requests / elapsed, 1),
+        "latency_ms": latency_summary(latencies),
+    }
+
+def login(args) -> dict:
+    scratch = tempfile.mkdtemp(prefix="user-benchmark-")
+    os.environ["DATABASE_URL"] = f"sqlite:///{os.path.join(scratch, 'users.db')}"
+    os.environ["JWT_KEYS_DIR"] = os.path.join(scratch, "keys")
+    # Modules read their settings at import time
+    package = __package__.rsplit(".", 1)[0]
+    main = importlib.import_module(f"{package}.main")
+    services = importlib.import_module(f"{package}.services")
+    passwords = importlib.import_module(f"{package}.passwords")
+    db = importlib.import_module(f"{package}.db")
+    schemas = importlib.import_module(f"{package}.schemas")
+    importlib.import_module(f"{package}.keys").key_ring.load()
+
+    async def measure():
+        async with db.AsyncSessionLocal() as session:
+            for index in range(args.users):
+                await services.register_user(
+                    schemas.UserCreate(email=f"user{index}@example.com", password=f"password-{index}"), session
+                )
+        results = {}
+        for workers in args.workers:
+            # Admit every concurrent login so the run measures hashing, not shedding
+            services.password_pool = passwords.PasswordHasherPool(workers=workers, max_pending=max(workers, args.concurrency))
+            results[str(workers)] = await run_logins(main.app, args.users, args.requests, args.concurrency)
+            services.password_pool.shutdown()
+        await db.async_engine.dispose()
+        return results
+
+    results = asyncio.run(measure())
+    baseline = results[str(args.workers[0])]["throughput_rps"]
+    for result in results.values():
+        result["speedup"] = round(result["throughput_rps"] / baseline, 2)
+    return {
+        "meta": {
+            "cpu_count": os.cpu_count(),
+            "python": platform.python_version(),
+            "argon2": {
+                "time_cost": passwords.ARGON2_TIME_COST,
+                "memory_cost": passwords.ARGON2_MEMORY_COST,
+                "parallelism": passwords.ARGON2_PARALLELISM,
+            },
+        },
+        "login": results,
+    }
+
+def main():
+    parser = argparse.ArgumentParser(prog="python -m User-Service.benchmarks", description="User-Service benchmarks")
+    commands = parser.add_subparsers(dest="command", required=True)
+    login_parser = commands.add_parser("login", help="Login throughput per password hashing pool size")
+    login_parser.add_argument("--workers", type=lambda value: [int(size) for size in value.split(",")], default=[1, 2, 4, 8])
+    login_parser.add_argument("--users", type=int, default=20)
+    login_parser.add_argument("--requests", type=int, default=400, help="Logins per pool size")
+    login_parser.add_argument("--concurrency", type=int, default=32)
+    login_parser.add_argument("--output", help="Write the JSON report here instead of stdout")
+    args = parser.parse_args()
+    report = json.dumps(login(args), indent=2)
+    if args.output:
+        with open(args.output, "w") as output:
+            output.write(report + "\n")
+    else:
+        print(report)
+
+# Guarded so that importing the module never starts a run
+if __name__ == "__main__":
+    main()
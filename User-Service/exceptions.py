@@ -7,4 +7,22 @@ class NotFoundException(Exception):
 class BadRequestException(Exception):
     def __init__(self, message: str ="The server cannot or will not process the request due to something that is perceived to be a client error"):
         self.message = message
-        super().__init__(self.message)
\ No newline at end of file
+        super().__init__(self.message)
+
+
+class EmailAlreadyRegisteredException(Exception):
+    def __init__(self, message: str = "Email already registered"):
+        self.message = message
+        super().__init__(self.message)
+
+
+class InvalidCredentialsException(Exception):
+    def __init__(self, message: str = "Invalid email or password"):
+        self.message = message
+        super().__init__(self.message)
+
+
+class ServiceBusyException(Exception):
+    def __init__(self, message: str = "The service is busy, retry shortly"):
+        self.message = message
+        super().__init__(self.message)
@@ -0,0 +1,143 @@
+import math
+import os
+import threading
+import time
+import uuid
+from typing import Dict, Optional
+import jwt
+from cryptography.hazmat.primitives import serialization
+from cryptography.hazmat.primitives.asymmetric import rsa
+
+# Signing keys are RSA private keys stored as <kid>.pem in JWT_KEYS_DIR, which
+# instances of the service share. A new key is published in the JWKS before it
+# signs, the newest published long enough signs, and older keys stay published
+# until every token they signed has expired.
+JWT_KEYS_DIR = os.getenv("JWT_KEYS_DIR", "keys")
+JWT_ALGORITHM = "RS256"
+JWT_ISSUER = os.getenv("JWT_ISSUER", "user-service")
+JWT_AUDIENCE = os.getenv("JWT_AUDIENCE", "e-commerce")
+JWT_KEY_SIZE = int(os.getenv("JWT_KEY_SIZE", "2048"))
+JWT_ACCESS_TOKEN_TTL = int(os.getenv("JWT_ACCESS_TOKEN_TTL", "900"))
+# Seconds a key signs before a new one replaces it, 0 disables rotation
+JWT_KEY_ROTATION_INTERVAL = int(os.getenv("JWT_KEY_ROTATION_INTERVAL", str(7 * 24 * 3600)))
+# Seconds between checks for keys added, rotated or removed by other instances
+JWT_KEY_CHECK_INTERVAL = float(os.getenv("JWT_KEY_CHECK_INTERVAL", "60"))
+# Seconds verifiers may cache the JWKS
+JWKS_MAX_AGE = int(os.getenv("JWKS_MAX_AGE", "300"))
+# Seconds a new key is published before it signs: verifiers holding a JWKS
+# cached before it appeared, or fetched from an instance yet to load it, would
+# reject its tokens until they refresh
+JWT_KEY_PUBLISH_DELAY = JWKS_MAX_AGE + math.ceil(JWT_KEY_CHECK_INTERVAL)
+# Retired keys stay published until the tokens they signed expired, with one
+# JWKS max-age of margin for clock skew between instances and verifiers
+JWT_KEY_RETENTION = JWT_ACCESS_TOKEN_TTL + JWKS_MAX_AGE
+
+class SigningKey:
+    def __init__(self, kid: str, private_key: rsa.RSAPrivateKey, created_at: float):
+        self.kid = kid
+        self.private_key = private_key
+        self.created_at = created_at
+        # Published from creation, may sign once the publish delay passed
+        self.activates_at = created_at + JWT_KEY_PUBLISH_DELAY
+        # Set once a newer key is due to take over signing
+        self.retired_at: Optional[float] = None
+        jwk = jwt.algorithms.RSAAlgorithm.to_jwk(private_key.public_key(), as_dict=True)
+        self.public_jwk = {**jwk, "kid": kid, "use": "sig", "alg": JWT_ALGORITHM}
+
+class KeyRing:
+    """Signing keys of the service, loaded from and rotated in a directory."""
+
+    def __init__(self, directory: str = JWT_KEYS_DIR):
+        self.directory = directory
+        self.keys: Dict[str, SigningKey] = {}
+        self._lock = threading.Lock()
+
+    @property
+    def active(self) -> SigningKey:
+        return self.signing_key()
+
+    def signing_key(self, now: Optional[float] = None) -> SigningKey:
+        """The newest key published for the publish delay, or the oldest key while none was."""
+        now = time.time() if now is None else now
+        ordered = sorted(self.keys.values(), key=lambda key: key.created_at)
+        published = [key for key in ordered if key.activates_at <= now]
+        # Only when the ring was just created: no verifier could hold an older JWKS yet
+        return published[-1] if published else ordered[0]
+
+    def load(self):
+        """Read the keys of the directory, generating the first one when it is empty."""
+        with self._lock:
+            os.makedirs(self.directory, exist_ok=True)
+            keys = {}
+            for name in os.listdir(self.directory):
+                if not name.endswith(".pem"):
+                    continue
+                kid = name[:-len(".pem")]
+                path = os.path.join(self.directory, name)
+                known = self.keys.get(kid)
+                if known is not None:
+                    keys[kid] = known
+                    continue
+                with open(path, "rb") as file:
+                    private_key = serialization.load_pem_private_key(file.read(), password=None)
+                keys[kid] = SigningKey(kid, private_key, os.path.getmtime(path))
+            self.keys = keys
+            if not self.keys:
+                self._generate()
+            self._mark_retired()
+
+    def rotate(self) -> SigningKey:
+        with self._lock:
+            key = self._generate()
+            self._mark_retired()
+            return key
+
+    def rotate_if_due(self, now: Optional[float] = None):
+        """Add the next key once the newest is as old as the rotation interval, drop keys past their retention.
+
+        The next key only signs after its publish delay, so each key signs for
+        about the rotation interval, starting one delay after its creation.
+        """
+        now = time.time() if now is None else now
+        self.load()
+        newest = max(self.keys.values(), key=lambda key: key.created_at)
+        if JWT_KEY_ROTATION_INTERVAL and now - newest.created_at >= JWT_KEY_ROTATION_INTERVAL:
+            self.rotate()
+        with self._lock:
+            for key in list(self.keys.values()):
+                if key.retired_at is not None and now - key.retired_at >= JWT_KEY_RETENTION:
+                    try:
+                        os.remove(os.path.join(self.directory, f"{key.kid}.pem"))
+                    except FileNotFoundError:
+                        # Another instance pruned it first
+                        pass
+                    del self.keys[key.kid]
+
+    def jwks(self) -> dict:
+        return {"keys": [key.public_jwk for key in sorted(self.keys.values(), key=lambda key: key.created_at, reverse=True)]}
+
+    def _generate(self) -> SigningKey:
+        private_key = rsa.generate_private_key(public_exponent=65537, key_size=JWT_KEY_SIZE)
+        created_at = time.time()
+        kid = f"{time.strftime('%Y%m%d%H%M%S', time.gmtime(created_at))}-{uuid.uuid4().hex[:8]}"
+        path = os.path.join(self.directory, f"{kid}.pem")
+        pem = private_key.private_bytes(
+            serialization.Encoding.PEM, serialization.PrivateFormat.PKCS8, serialization.NoEncryption()
+        )
+        # Written aside and renamed, other instances may be listing the directory
+        partial = f"{path}.partial"
+        with open(os.open(partial, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o600), "wb") as file:
+            file.write(pem)
+        os.replace(partial, path)
+        key = SigningKey(kid, private_key, os.path.getmtime(path))
+        self.keys[kid] = key
+        return key
+
+    def _mark_retired(self):
+        # A key retires when its successor starts signing, which the file times record
+        ordered = sorted(self.keys.values(), key=lambda key: key.created_at)
+        for key, successor in zip(ordered, ordered[1:]):
+            key.retired_at = successor.activates_at
+        ordered[-1].retired_at = None
+
+key_ring = KeyRing()
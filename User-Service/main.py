@@ -1,6 +1,23 @@
+import asyncio
+from contextlib import asynccontextmanager
 from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
 from .db import Base, engine
+from .keys import key_ring
+from .passwords import password_pool
+from .routers.auth_router import auth_router
+from .routers.user_router import user_router
+from .tasks import rotate_signing_keys
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # Loads the signing keys, creating the first one on a fresh deployment
+    await asyncio.to_thread(key_ring.rotate_if_due)
+    rotator = asyncio.create_task(rotate_signing_keys())
+    yield
+    rotator.cancel()
+    password_pool.shutdown()
 
 
 app = FastAPI(
@@ -11,7 +28,8 @@ app = FastAPI(
         "name": "API Support",
         "url": "https://github.com/AlifHossain27/E-commerce-Microservices",
         "email": "alifh044@gmail.com"
-    }
+    },
+    lifespan=lifespan
 )
 
 Base.metadata.create_all(bind=engine)
@@ -22,4 +40,9 @@ app.add_middleware(
     allow_methods=["*"],
     allow_headers=["*"],
     allow_credentials=True,
-)
\ No newline at end of file
+)
+
+# User router
+app.include_router(user_router, tags=["Users"], prefix="/api")
+# JWKS endpoint
+app.include_router(auth_router, tags=["Auth"])
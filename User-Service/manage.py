@@ -0,0 +1,32 @@
+import argparse
+import asyncio
+from .db import AsyncSessionLocal
+from .exceptions import NotFoundException
+from .services import set_user_role
+
+# Administration commands, run from the repository root. Registration always
+# creates customers; Product-Service only accepts catalog writes from tokens
+# carrying its AUTH_WRITE_ROLE (catalog_admin by default), granted with:
+#   python -m User-Service.manage set-role alice@example.com catalog_admin
+# The user logs in again to get a token with the new role.
+
+async def set_role(email: str, role: str) -> str:
+    async with AsyncSessionLocal() as db:
+        user = await set_user_role(email=email, role=role, db=db)
+    return f"{user.email} now has the role {user.role}"
+
+def main():
+    parser = argparse.ArgumentParser(prog="python -m User-Service.manage", description="User-Service administration")
+    commands = parser.add_subparsers(dest="command", required=True)
+    role_parser = commands.add_parser("set-role", help="Set the role of a registered user, e.g. catalog_admin or customer")
+    role_parser.add_argument("email")
+    role_parser.add_argument("role")
+    args = parser.parse_args()
+    try:
+        print(asyncio.run(set_role(args.email, args.role)))
+    except NotFoundException as error:
+        parser.exit(1, f"{error}\n")
+
+# Guarded so that importing the module never runs a command
+if __name__ == "__main__":
+    main()
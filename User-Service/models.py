@@ -0,0 +1,23 @@
+from sqlalchemy import Boolean, Column, DateTime, Integer, String
+from .db import Base
+from datetime import datetime, timezone
+
+
+def utc_now():
+    # Columns are TIMESTAMP WITHOUT TIME ZONE holding UTC; asyncpg rejects aware values for them
+    return datetime.now(tz=timezone.utc).replace(tzinfo=None)
+
+
+class User(Base):
+    __tablename__ = "users"
+    user_id = Column(Integer, primary_key=True)
+    # Stored lowercased, logins match it exactly
+    email = Column(String(320), unique=True, index=True, nullable=False)
+    full_name = Column(String(150))
+    # Encoded argon2 hash, its parameters included, see passwords.py
+    password_hash = Column(String(255), nullable=False)
+    # Put in the "roles" claim of access tokens, e.g. customer or catalog_admin
+    role = Column(String(32), nullable=False, default="customer")
+    is_active = Column(Boolean, nullable=False, default=True)
+    created_at = Column(DateTime, default=utc_now)
+    updated_at = Column(DateTime, default=utc_now)
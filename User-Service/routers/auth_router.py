@@ -0,0 +1,17 @@
+import traceback
+from fastapi import APIRouter, HTTPException, Response
+from ..keys import JWKS_MAX_AGE
+from ..services import retrieve_jwks
+
+auth_router = APIRouter()
+
+# Public keys verifying the access tokens, fetched and cached by the other services
+@auth_router.get("/.well-known/jwks.json", status_code=200)
+async def get_jwks_route(response: Response):
+    try:
+        response.headers["Cache-Control"] = f"public, max-age={JWKS_MAX_AGE}"
+        return retrieve_jwks()
+    except Exception as e:
+        print(e)
+        print(traceback.format_exc())
+        raise HTTPException(status_code=500, detail="Internal Server Error")
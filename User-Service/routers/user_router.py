@@ -0,0 +1,39 @@
+import traceback
+from sqlalchemy.ext.asyncio import AsyncSession
+from fastapi import APIRouter, Depends, HTTPException
+from ..db import get_async_db
+from ..schemas import AccessToken, LoginRequest, User, UserCreate
+from ..services import login, register_user
+from ..exceptions import EmailAlreadyRegisteredException, InvalidCredentialsException, ServiceBusyException
+
+user_router = APIRouter()
+
+# Password hashing is shed under overload, clients should back off briefly
+BUSY_RETRY_AFTER = "1"
+
+# User endpoints
+@user_router.post("/auth/register/", response_model=User, status_code=201)
+async def register_route(user: UserCreate, db: AsyncSession = Depends(get_async_db)):
+    try:
+        return await register_user(user=user, db=db)
+    except EmailAlreadyRegisteredException as error:
+        raise HTTPException(status_code=409, detail=str(error))
+    except ServiceBusyException as error:
+        raise HTTPException(status_code=503, detail=str(error), headers={"Retry-After": BUSY_RETRY_AFTER})
+    except Exception as e:
+        print(e)
+        print(traceback.format_exc())
+        raise HTTPException(status_code=500, detail="Internal Server Error")
+
+@user_router.post("/auth/login/", response_model=AccessToken, status_code=200)
+async def login_route(credentials: LoginRequest, db: AsyncSession = Depends(get_async_db)):
+    try:
+        return await login(credentials=credentials, db=db)
+    except InvalidCredentialsException as error:
+        raise HTTPException(status_code=401, detail=str(error), headers={"WWW-Authenticate": "Bearer"})
+    except ServiceBusyException as error:
+        raise HTTPException(status_code=503, detail=str(error), headers={"Retry-After": BUSY_RETRY_AFTER})
+    except Exception as e:
+        print(e)
+        print(traceback.format_exc())
+        raise HTTPException(status_code=500, detail="Internal Server Error")
@@ -0,0 +1,30 @@
+from typing import Optional
+from pydantic import BaseModel, ConfigDict, EmailStr, Field
+from datetime import datetime
+
+# User Schemas
+class UserBase(BaseModel):
+    email: EmailStr
+    full_name: Optional[str] = Field(None, max_length=150)
+
+class UserCreate(UserBase):
+    # Hashing cost grows with the input, hence the upper bound
+    password: str = Field(min_length=8, max_length=128)
+
+class User(UserBase):
+    user_id: int
+    role: str
+    created_at: datetime
+
+    model_config = ConfigDict(from_attributes=True)
+
+# Auth Schemas
+class LoginRequest(BaseModel):
+    email: EmailStr
+    password: str = Field(max_length=128)
+
+class AccessToken(BaseModel):
+    access_token: str
+    token_type: str = "bearer"
+    # Seconds until the token expires
+    expires_in: int
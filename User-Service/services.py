@@ -0,0 +1,84 @@
+import time
+import uuid
+from typing import Optional
+import jwt
+from sqlalchemy import select
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.ext.asyncio import AsyncSession
+from .keys import JWT_ACCESS_TOKEN_TTL, JWT_ALGORITHM, JWT_AUDIENCE, JWT_ISSUER, key_ring
+from .models import User, utc_now
+from .passwords import password_pool
+from .schemas import LoginRequest, UserCreate
+from .exceptions import EmailAlreadyRegisteredException, InvalidCredentialsException, NotFoundException
+
+# User services
+async def register_user(user: UserCreate, db: AsyncSession) -> User:
+    email = user.email.lower()
+    # Checked before hashing, which is the expensive part
+    if await db.scalar(select(User.user_id).filter(User.email == email)) is not None:
+        raise EmailAlreadyRegisteredException(f"Email {email} is already registered")
+    db_user = User(
+        email=email,
+        full_name=user.full_name,
+        password_hash=await password_pool.hash(user.password),
+        role="customer",
+        is_active=True,
+        created_at=utc_now(),
+        updated_at=utc_now(),
+    )
+    db.add(db_user)
+    try:
+        await db.commit()
+    except IntegrityError:
+        # Registered concurrently with the same email
+        await db.rollback()
+        raise EmailAlreadyRegisteredException(f"Email {email} is already registered")
+    return db_user
+
+async def authenticate_user(credentials: LoginRequest, db: AsyncSession) -> User:
+    user = await db.scalar(select(User).filter(User.email == credentials.email.lower()))
+    if user is None or not user.is_active:
+        await password_pool.verify_dummy(credentials.password)
+        raise InvalidCredentialsException()
+    if not await password_pool.verify(user.password_hash, credentials.password):
+        raise InvalidCredentialsException()
+    # Hashes made with older cost parameters are upgraded while the password is at hand
+    if password_pool.needs_rehash(user.password_hash):
+        user.password_hash = await password_pool.hash(credentials.password)
+        user.updated_at = utc_now()
+        await db.commit()
+    return user
+
+async def set_user_role(email: str, role: str, db: AsyncSession) -> User:
+    """Change the role put in the user's next access tokens, tokens already issued keep theirs until they expire."""
+    user = await db.scalar(select(User).filter(User.email == email.lower()))
+    if user is None:
+        raise NotFoundException(f"User with email {email.lower()} not found")
+    user.role = role
+    user.updated_at = utc_now()
+    await db.commit()
+    return user
+
+async def login(credentials: LoginRequest, db: AsyncSession) -> dict:
+    user = await authenticate_user(credentials, db)
+    token = issue_access_token(str(user.user_id), {"email": user.email, "roles": [user.role]})
+    return {"access_token": token, "token_type": "bearer", "expires_in": JWT_ACCESS_TOKEN_TTL}
+
+# Token services
+def issue_access_token(subject: str, claims: Optional[dict] = None, ttl: int = JWT_ACCESS_TOKEN_TTL) -> str:
+    """Access token for subject signed with the active key, verified by the other services with the JWKS."""
+    key = key_ring.active
+    now = int(time.time())
+    payload = {
+        "iss": JWT_ISSUER,
+        "aud": JWT_AUDIENCE,
+        "sub": subject,
+        "iat": now,
+        "exp": now + ttl,
+        "jti": uuid.uuid4().hex,
+        **(claims or {}),
+    }
+    return jwt.encode(payload, key.private_key, algorithm=JWT_ALGORITHM, headers={"kid": key.kid})
+
+def retrieve_jwks() -> dict:
+    return key_ring.jwks()
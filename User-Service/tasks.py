@@ -0,0 +1,13 @@
+import asyncio
+import traceback
+from .keys import JWT_KEY_CHECK_INTERVAL, key_ring
+
+async def rotate_signing_keys():
+    while True:
+        await asyncio.sleep(JWT_KEY_CHECK_INTERVAL)
+        try:
+            # Key generation takes tens of milliseconds, keep it off the event loop
+            await asyncio.to_thread(key_ring.rotate_if_due)
+        except Exception as e:
+            print(e)
+            print(traceback.format_exc())
@@ -0,0 +1,57 @@
+"""Fixtures running the app in process against a scratch SQLite database.
+
+Run from the repository root: python -m pytest User-Service/tests
+The suite needs pytest on top of the requirements.
+"""
+import importlib
+import os
+import sys
+import tempfile
+import pytest
+
+# Settings are read at import time, so they are set before the app is imported
+_scratch = tempfile.mkdtemp(prefix="user-tests-")
+os.environ["DATABASE_URL"] = f"sqlite:///{os.path.join(_scratch, 'users.db')}"
+os.environ["JWT_KEYS_DIR"] = os.path.join(_scratch, "keys")
+# Cheap hashes, the cost parameters are not what the tests are about
+os.environ["ARGON2_TIME_COST"] = "1"
+os.environ["ARGON2_MEMORY_COST"] = "1024"
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__)))))
+PACKAGE = "User-Service"
+
+def service_module(name: str):
+    return importlib.import_module(f"{PACKAGE}.{name}")
+
+@pytest.fixture()
+def app_db():
+    """Fresh schema for each test."""
+    db = service_module("db")
+    service_module("models")
+    db.Base.metadata.drop_all(db.engine)
+    db.Base.metadata.create_all(db.engine)
+    yield db
+    db.Base.metadata.drop_all(db.engine)
+
+@pytest.fixture()
+def password_pool(monkeypatch):
+    """A hashing pool of the test's own, tests may exhaust or replace it."""
+    pool = service_module("passwords").PasswordHasherPool()
+    monkeypatch.setattr(service_module("services"), "password_pool", pool)
+    yield pool
+    pool.shutdown()
+
+@pytest.fixture()
+def client(app_db, password_pool):
+    from fastapi.testclient import TestClient
+    # What the lifespan does on startup
+    service_module("keys").key_ring.load()
+    return TestClient(service_module("main").app)
+
+def register(client, email: str = "ada@example.com", password: str = "correct horse battery", **fields):
+    response = client.post("/api/auth/register/", json={"email": email, "password": password, "full_name": "Ada", **fields})
+    assert response.status_code == 201, response.text
+    return response.json()
+
+def login(client, email: str = "ada@example.com", password: str = "correct horse battery"):
+    return client.post("/api/auth/login/", json={"email": email, "password": password})
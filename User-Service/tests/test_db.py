@@ -0,0 +1,45 @@
+"""Engine options: a pool per instance, or none behind PgBouncer with prepared statements kept unique."""
+from sqlalchemy import pool
+from .conftest import service_module
+
+db = service_module("db")
+
+ASYNC_URL = "postgresql+asyncpg://users@pgbouncer:6432/users"
+SYNC_URL = "postgresql://users@pgbouncer:6432/users"
+
+def test_pooled_options(monkeypatch):
+    monkeypatch.setattr(db, "DB_PGBOUNCER", False)
+    options = db.engine_options(ASYNC_URL, is_async=True)
+    assert options == {
+        "pool_size": db.DB_POOL_SIZE,
+        "max_overflow": db.DB_MAX_OVERFLOW,
+        "pool_timeout": db.DB_POOL_TIMEOUT,
+        "pool_recycle": db.DB_POOL_RECYCLE,
+        "pool_pre_ping": db.DB_POOL_PRE_PING,
+    }
+
+def test_pgbouncer_disables_pooling_and_statement_caches(monkeypatch):
+    monkeypatch.setattr(db, "DB_PGBOUNCER", True)
+    options = db.engine_options(ASYNC_URL, is_async=True)
+    assert options["poolclass"] is pool.NullPool
+    connect_args = options["connect_args"]
+    assert connect_args["statement_cache_size"] == 0
+    assert connect_args["prepared_statement_cache_size"] == 0
+    # Names never repeat, another client's statement may live on the same server connection
+    names = {connect_args["prepared_statement_name_func"]() for _ in range(100)}
+    assert len(names) == 100
+    assert all(name.startswith("__asyncpg_") for name in names)
+
+def test_pgbouncer_sync_engine_only_drops_the_pool(monkeypatch):
+    monkeypatch.setattr(db, "DB_PGBOUNCER", True)
+    assert db.engine_options(SYNC_URL) == {"poolclass": pool.NullPool}
+
+def test_sqlite_keeps_the_defaults(monkeypatch):
+    monkeypatch.setattr(db, "DB_PGBOUNCER", True)
+    assert db.engine_options("sqlite+aiosqlite:///users.db", is_async=True) == {}
+    assert db.engine_options("sqlite:///users.db") == {"connect_args": {"check_same_thread": False}}
+
+def test_async_url_is_derived_from_the_sync_one():
+    assert db.to_async_url(SYNC_URL) == ASYNC_URL
+    assert db.to_async_url("sqlite:///users.db") == "sqlite+aiosqlite:///users.db"
+    assert db.to_async_url("mysql+aiomysql://users@db/users") == "mysql+aiomysql://users@db/users"
@@ -0,0 +1,98 @@
+"""Password hashing: old hashes are upgraded on login, and a full hashing pool sheds requests with a 503."""
+import asyncio
+import threading
+from argon2 import PasswordHasher
+import pytest
+from .conftest import login, register, service_module
+
+passwords = service_module("passwords")
+models = service_module("models")
+
+def stored_hash(app_db, email: str = "ada@example.com") -> str:
+    with app_db.SessionLocal() as db:
+        return db.query(models.User.password_hash).filter(models.User.email == email).scalar()
+
+def test_hashes_with_old_parameters_are_upgraded_on_login(client, app_db, password_pool):
+    register(client)
+    # As if stored before the cost parameters were raised
+    old_hash = PasswordHasher(time_cost=1, memory_cost=512, parallelism=1).hash("correct horse battery")
+    with app_db.SessionLocal() as db:
+        db.query(models.User).update({models.User.password_hash: old_hash})
+        db.commit()
+    assert password_pool.needs_rehash(old_hash)
+    assert login(client).status_code == 200
+    new_hash = stored_hash(app_db)
+    assert new_hash != old_hash
+    assert not password_pool.needs_rehash(new_hash)
+    # The upgraded hash still verifies, and is left alone from now on
+    assert login(client).status_code == 200
+    assert stored_hash(app_db) == new_hash
+
+def test_failed_logins_do_not_rehash(client, app_db):
+    register(client)
+    old_hash = PasswordHasher(time_cost=1, memory_cost=512, parallelism=1).hash("correct horse battery")
+    with app_db.SessionLocal() as db:
+        db.query(models.User).update({models.User.password_hash: old_hash})
+        db.commit()
+    assert login(client, password="wrong password").status_code == 401
+    assert stored_hash(app_db) == old_hash
+
+class BlockedHasher:
+    """Stands in for argon2, hashes wait until released."""
+
+    def __init__(self):
+        self.release = threading.Event()
+
+    def hash(self, password: str) -> str:
+        self.release.wait(5)
+        return "hashed"
+
+def test_jobs_beyond_max_pending_are_shed():
+    hasher = BlockedHasher()
+    pool = passwords.PasswordHasherPool(workers=1, max_pending=2, queue_timeout=0.05, hasher=hasher)
+
+    async def run():
+        admitted = [asyncio.create_task(pool.hash("password")) for _ in range(2)]
+        await asyncio.sleep(0.01)
+        assert pool.pending == 2
+        with pytest.raises(passwords.ServiceBusyException):
+            await pool.hash("password")
+        hasher.release.set()
+        return await asyncio.gather(*admitted)
+    try:
+        assert asyncio.run(run()) == ["hashed", "hashed"]
+    finally:
+        pool.shutdown()
+    assert pool.stats() == {"workers": 1, "max_pending": 2, "pending": 0, "rejected": 1}
+
+def test_waiting_jobs_get_a_slot_when_one_frees():
+    hasher = BlockedHasher()
+    pool = passwords.PasswordHasherPool(workers=1, max_pending=1, queue_timeout=2, hasher=hasher)
+
+    async def run():
+        first = asyncio.create_task(pool.hash("password"))
+        await asyncio.sleep(0.01)
+        second = asyncio.create_task(pool.hash("password"))
+        await asyncio.sleep(0.05)
+        hasher.release.set()
+        return await asyncio.gather(first, second)
+    try:
+        assert asyncio.run(run()) == ["hashed", "hashed"]
+    finally:
+        pool.shutdown()
+    assert pool.rejected == 0
+
+def test_busy_pool_answers_503_with_retry_after(client, monkeypatch):
+    register(client)
+    busy = passwords.PasswordHasherPool(workers=1, max_pending=1, queue_timeout=0.05)
+
+    async def full_slot():
+        raise passwords.ServiceBusyException("Too many logins in progress, retry shortly")
+    monkeypatch.setattr(busy, "_run", lambda *args: full_slot())
+    monkeypatch.setattr(service_module("services"), "password_pool", busy)
+    try:
+        for response in (login(client), client.post("/api/auth/register/", json={"email": "bob@example.com", "password": "long enough"})):
+            assert response.status_code == 503
+            assert response.headers["Retry-After"] == "1"
+    finally:
+        busy.shutdown()
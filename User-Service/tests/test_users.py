@@ -0,0 +1,79 @@
+"""Registration and login: stored argon2 hashes, access tokens verifiable with the JWKS, roles."""
+import asyncio
+import jwt
+import pytest
+from .conftest import login, register, service_module
+
+keys = service_module("keys")
+
+def decode(client, token: str) -> dict:
+    jwks = client.get("/.well-known/jwks.json").json()
+    kid = jwt.get_unverified_header(token)["kid"]
+    key = next(jwt.PyJWK(jwk).key for jwk in jwks["keys"] if jwk["kid"] == kid)
+    return jwt.decode(token, key, algorithms=[keys.JWT_ALGORITHM], audience=keys.JWT_AUDIENCE, issuer=keys.JWT_ISSUER)
+
+def stored_user(app_db, email: str):
+    models = service_module("models")
+    with app_db.SessionLocal() as db:
+        return db.query(models.User).filter(models.User.email == email).one()
+
+def test_register_creates_a_customer(client, app_db):
+    user = register(client, email="Ada@Example.com")
+    assert user["email"] == "ada@example.com"
+    assert user["role"] == "customer"
+    assert "password" not in user and "password_hash" not in user
+    password_hash = stored_user(app_db, "ada@example.com").password_hash
+    assert password_hash.startswith("$argon2id$")
+    assert "correct horse battery" not in password_hash
+
+def test_an_email_registers_once(client):
+    register(client)
+    response = client.post("/api/auth/register/", json={"email": "ADA@example.com", "password": "another password"})
+    assert response.status_code == 409
+
+def test_short_passwords_are_rejected(client):
+    assert client.post("/api/auth/register/", json={"email": "ada@example.com", "password": "short"}).status_code == 422
+
+def test_login_issues_a_token_verified_by_the_jwks(client):
+    user = register(client)
+    response = login(client, email="ADA@example.com")
+    assert response.status_code == 200
+    body = response.json()
+    assert body["token_type"] == "bearer"
+    assert body["expires_in"] == keys.JWT_ACCESS_TOKEN_TTL
+    claims = decode(client, body["access_token"])
+    assert claims["sub"] == str(user["user_id"])
+    assert claims["roles"] == ["customer"]
+    assert claims["exp"] - claims["iat"] == keys.JWT_ACCESS_TOKEN_TTL
+
+@pytest.mark.parametrize("email, password", [
+    ("ada@example.com", "wrong password"),
+    ("nobody@example.com", "correct horse battery"),
+])
+def test_bad_credentials_are_rejected_alike(client, email, password):
+    register(client)
+    response = login(client, email=email, password=password)
+    assert response.status_code == 401
+    assert response.json()["detail"] == "Invalid email or password"
+    assert response.headers["WWW-Authenticate"] == "Bearer"
+
+def test_granted_roles_are_in_the_next_token(client, app_db):
+    register(client)
+    services = service_module("services")
+
+    async def grant():
+        async with app_db.AsyncSessionLocal() as db:
+            return await services.set_user_role(email="ADA@example.com", role="catalog_admin", db=db)
+    assert asyncio.run(grant()).role == "catalog_admin"
+    claims = decode(client, login(client).json()["access_token"])
+    assert claims["roles"] == ["catalog_admin"]
+
+def test_roles_of_unknown_users_are_not_set(client, app_db):
+    services = service_module("services")
+    exceptions = service_module("exceptions")
+
+    async def grant():
+        async with app_db.AsyncSessionLocal() as db:
+            await services.set_user_role(email="nobody@example.com", role="catalog_admin", db=db)
+    with pytest.raises(exceptions.NotFoundException):
+        asyncio.run(grant())